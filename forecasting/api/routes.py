@@ -5,9 +5,12 @@ from flask import Blueprint, jsonify, request
 from services.prediction_service import get_prediction_service
 from database.queries import get_data_fetcher
 from database.connection import get_db
+from models.time_series_model import get_model_loader
+from services.warmup_service import get_warmup_service
+from services.model_server import get_model_server_client
 from config.settings import (
     HTTP_OK, HTTP_BAD_REQUEST, HTTP_NOT_FOUND, 
-    HTTP_SERVER_ERROR, HTTP_SERVICE_UNAVAILABLE
+    HTTP_SERVER_ERROR, HTTP_SERVICE_UNAVAILABLE, MODEL_SERVER_ENABLED
 )
 import logging
 
@@ -32,10 +35,18 @@ def health_check():
     try:
         db = get_db()
         db_status = db.test_connection()
+        read_routing = db.get_read_routing_status()
+        
+        # Replicas that deny the lag probe never take reads: serving, but not as configured
+        status = 'healthy' if db_status else 'unhealthy'
+        if db_status and read_routing['lag_probe_denied']:
+            status = 'degraded'
         
         return jsonify({
-            'status': 'healthy' if db_status else 'unhealthy',
-            'database': 'connected' if db_status else 'disconnected'
+            'status': status,
+            'database': 'connected' if db_status else 'disconnected',
+            'read_routing': read_routing,
+            'engines': db.get_engine_status()
         }), HTTP_OK if db_status else HTTP_SERVICE_UNAVAILABLE
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -45,6 +56,36 @@ def health_check():
         }), HTTP_SERVICE_UNAVAILABLE
 
 
+@api_bp.route("/ready")
+def readiness_check():
+    """
+    Readiness endpoint for load balancers and orchestrators
+    
+    Returns 503 while this worker is still preloading models (PRELOAD_MODELS)
+    and 200 once every active model is loaded and warmed up. With
+    MODEL_SERVER_ENABLED, every model server must also be reachable and done
+    preloading.
+    """
+    try:
+        warmup = get_warmup_service()
+        response = {'warmup': warmup.get_status()}
+        ready = warmup.is_ready()
+        
+        if MODEL_SERVER_ENABLED:
+            servers = get_model_server_client().get_status()
+            response['model_servers'] = servers
+            ready = ready and all(server.get('ready') for server in servers)
+        
+        response['status'] = 'ready' if ready else 'warming'
+        return jsonify(response), HTTP_OK if ready else HTTP_SERVICE_UNAVAILABLE
+    except Exception as e:
+        logger.error(f"Readiness check failed: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), HTTP_SERVICE_UNAVAILABLE
+
+
 @api_bp.route("/api/models", methods=['GET'])
 def get_models():
     """Get all active models"""
@@ -106,7 +147,7 @@ def get_sensors():
         else:
             # Get all active sensors from database
             try:
-                with data_fetcher.db.session_scope() as session:
+                with data_fetcher.db.session_scope(read_only=True) as session:
                     from database.models import MasSensor
                     sensors_query = session.query(MasSensor).filter(
                         MasSensor.is_active == True,
@@ -232,6 +273,95 @@ def predict_sensor(sensor_code):
         }), HTTP_SERVER_ERROR
 
 
+@api_bp.route("/api/cache", methods=['GET'])
+def get_cache_stats():
+    """Get in-process cache statistics"""
+    try:
+        data_fetcher = get_data_fetcher()
+        
+        return jsonify({
+            'status': 'success',
+            'metadata': data_fetcher.metadata_cache.get_stats(),
+            'models': get_model_loader().get_stats(),
+            'prediction_coalescing': get_prediction_service().single_flight.get_stats(),
+            'prediction_results': get_prediction_service().result_cache.get_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error fetching cache stats: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), HTTP_SERVER_ERROR
+
+
+@api_bp.route("/api/cache/invalidate", methods=['POST'])
+def invalidate_cache():
+    """
+    Invalidate cached model/sensor/scaler metadata and stored forecasts
+    
+    Call this after changing mas_models, mas_sensors or mas_scalers so the
+    change is picked up before the cache TTL expires.
+    """
+    try:
+        data_fetcher = get_data_fetcher()
+        data_fetcher.metadata_cache.invalidate()
+        get_prediction_service().result_cache.invalidate()
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Metadata and prediction result caches invalidated'
+        })
+    except Exception as e:
+        logger.error(f"Error invalidating cache: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), HTTP_SERVER_ERROR
+
+
+@api_bp.route("/api/metrics/db", methods=['GET'])
+def get_db_metrics():
+    """
+    Get connection pool and query metrics of this worker process
+    
+    Each gunicorn worker keeps its own pool, so compare pool capacity and
+    peak checked-out connections per worker when sizing DB_POOL_SIZE.
+    """
+    try:
+        db = get_db()
+        metrics = db.metrics.snapshot()
+        metrics['slow_queries'] = db.metrics.get_slow_queries()
+        
+        return jsonify({
+            'status': 'success',
+            'metrics': metrics
+        })
+    except Exception as e:
+        logger.error(f"Error fetching database metrics: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), HTTP_SERVER_ERROR
+
+
+@api_bp.route("/api/metrics/db/reset", methods=['POST'])
+def reset_db_metrics():
+    """Reset connection pool and query metrics of this worker process"""
+    try:
+        get_db().metrics.reset()
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Database metrics reset'
+        })
+    except Exception as e:
+        logger.error(f"Error resetting database metrics: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), HTTP_SERVER_ERROR
+
+
 @api_bp.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
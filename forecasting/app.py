@@ -3,6 +3,8 @@ Flask application for FFWS Forecasting System
 """
 from flask import Flask
 from api.routes import api_bp
+from database.connection import get_db
+from database.queries import get_data_fetcher
 from config.settings import FLASK_DEBUG, LOG_LEVEL
 from utils.helpers import setup_logging
 import warnings
@@ -27,6 +29,12 @@ def create_app():
     # Register blueprints
     app.register_blueprint(api_bp)
     
+    # Report whether the latest-data query path has the index it relies on
+    get_data_fetcher().check_data_indexes()
+    
+    # Refuse to start with replicas that can never pass the lag check
+    get_db().check_replicas()
+    
     logger.info("Flask application created successfully")
     
     return app
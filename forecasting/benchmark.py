@@ -0,0 +1,415 @@
+"""
+Performance benchmarks for FFWS Forecasting System
+Each benchmark is a sub-command; results are printed as a table
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from sqlalchemy import text
+from database.connection import get_db
+from database.queries import build_latest_readings_query
+from utils.helpers import setup_logging
+
+# Setup logging
+setup_logging(log_level='WARNING')
+
+BENCH_TABLE = 'bench_data_actuals'
+
+
+def print_header(title):
+    """Print a formatted header"""
+    print("\n" + "="*70)
+    print(f"  {title}")
+    print("="*70)
+
+
+def time_call(func, repeat):
+    """Run func repeat times and return (median ms, min ms)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), min(timings)
+
+
+def populate_bench_table(engine, n_rows, n_sensors, with_index):
+    """
+    Create and fill the scratch table with synthetic readings
+    
+    Rows are generated server side in batches of one million from a
+    1000 x 1000 cross join, so the client never holds the data.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}"))
+        connection.execute(text(f"""
+            CREATE TABLE {BENCH_TABLE} (
+                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                mas_sensor_code VARCHAR(255) NOT NULL,
+                value DOUBLE NOT NULL,
+                received_at DATETIME NOT NULL,
+                INDEX idx_bench_received (received_at)
+            ) ENGINE=InnoDB
+        """))
+    
+    batch_size = 1000000
+    for batch_start in range(0, n_rows, batch_size):
+        batch_rows = min(batch_size, n_rows - batch_start)
+        with engine.begin() as connection:
+            connection.execute(text(f"""
+                INSERT INTO {BENCH_TABLE} (mas_sensor_code, value, received_at)
+                WITH RECURSIVE seq AS (
+                    SELECT 0 AS n UNION ALL SELECT n + 1 FROM seq WHERE n < 999
+                )
+                SELECT
+                    CONCAT('BENCH_', MOD(t.n, :n_sensors)),
+                    RAND() * 10,
+                    TIMESTAMPADD(MINUTE, t.n DIV :n_sensors, '2000-01-01 00:00:00')
+                FROM (
+                    SELECT :batch_start + a.n * 1000 + b.n AS n FROM seq a CROSS JOIN seq b
+                ) t
+                WHERE t.n < :batch_start + :batch_rows
+            """), {'n_sensors': n_sensors, 'batch_start': batch_start, 'batch_rows': batch_rows})
+        print(f"  inserted {batch_start + batch_rows:,} / {n_rows:,} rows", end='\r')
+    print()
+    
+    if with_index:
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE INDEX idx_bench_sensor_received ON {BENCH_TABLE} (mas_sensor_code, received_at)"
+            ))
+
+
+def bench_latest_query(args):
+    """Compare window vs per-sensor range strategies for latest-N queries"""
+    db = get_db()
+    engine = db.get_engine()
+    sensor_codes = [f'BENCH_{i}' for i in range(args.model_sensors)]
+    
+    print_header("Latest N per sensor: window vs per_sensor_limit")
+    print(f"Sensors in table: {args.sensors}, sensors per query: {args.model_sensors}, "
+          f"n_steps_in: {args.n_steps}, repeats: {args.repeat}")
+    
+    rows_out = []
+    for n_rows in args.rows:
+        print(f"\nPreparing {n_rows:,} rows...")
+        populate_bench_table(engine, n_rows, args.sensors, with_index=not args.no_index)
+        
+        for strategy in ('window', 'per_sensor_limit'):
+            query, params = build_latest_readings_query(
+                sensor_codes, args.n_steps, strategy=strategy, table=BENCH_TABLE
+            )
+            median_ms, min_ms = time_call(lambda: db.execute_query(query, params), args.repeat)
+            rows_out.append((n_rows, strategy, median_ms, min_ms))
+    
+    if not args.keep:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}"))
+    
+    print_header("RESULTS")
+    print(f"{'rows':>14}  {'strategy':<18}{'median ms':>12}{'min ms':>12}")
+    for n_rows, strategy, median_ms, min_ms in rows_out:
+        print(f"{n_rows:>14,}  {strategy:<18}{median_ms:>12.2f}{min_ms:>12.2f}")
+    return 0
+
+
+def build_benchmark_model(args):
+    """Load a stored model, or build an untrained one of the requested architecture"""
+    from models.training import build_lstm_model, build_gru_model, build_tcn_model
+    from tensorflow.keras.models import load_model
+    from models.inference_backends import root_mean_squared_error, get_artifact_path
+    from models.registry import get_model_registry
+    
+    if args.model_code:
+        custom_objects = {'root_mean_squared_error': root_mean_squared_error}
+        try:
+            from keras_tcn import TCN
+            custom_objects['TCN'] = TCN
+        except ImportError:
+            pass
+        
+        version = get_model_registry().resolve(args.model_code)
+        model_path = get_artifact_path(args.model_code, 'keras', version.directory if version else None)
+        model = load_model(str(model_path), custom_objects=custom_objects)
+        _, n_steps_in, n_features = model.input_shape
+        return model, f"{args.model_code} ({model_path.name})", n_steps_in, n_features
+    
+    builders = {'LSTM': build_lstm_model, 'GRU': build_gru_model, 'TCN': build_tcn_model}
+    model = builders[args.model_type](args.n_steps_in, args.n_steps_out, args.features)
+    return model, f"untrained {args.model_type}", args.n_steps_in, args.features
+
+
+def bench_inference(args):
+    """Compare per-call latency of model.predict(), the traced function and the NumPy engine"""
+    import numpy as np
+    import tensorflow as tf
+    from models.inference_backends import build_inference_function
+    from models.numpy_engine import NumpyModel, export_npz, UnsupportedModelError
+    
+    model, label, n_steps_in, n_features = build_benchmark_model(args)
+    
+    print_header("Inference latency: model.predict vs traced tf.function vs NumPy engine")
+    print(f"Model: {label}, input: ({args.batch}, {n_steps_in}, {n_features}), repeats: {args.repeat}")
+    
+    window = np.random.default_rng(0).standard_normal((args.batch, n_steps_in, n_features)).astype(np.float32)
+    infer = build_inference_function(model, n_steps_in, n_features)
+    
+    candidates = [
+        ('model.predict', lambda: model.predict(window, verbose=0)),
+        ('model(x) eager', lambda: model(window, training=False).numpy()),
+        ('tf.function', lambda: infer(tf.convert_to_tensor(window)).numpy()),
+    ]
+    
+    # LSTM/GRU stacks can also run on the pure-NumPy engine
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            npz_path = export_npz(model, Path(work_dir) / 'model.npz')
+            numpy_model = NumpyModel(npz_path)
+            candidates.append(('numpy engine', lambda: numpy_model.predict(window)))
+        except UnsupportedModelError as e:
+            print(f"NumPy engine skipped: {e}")
+    
+    reference = candidates[0][1]()
+    rows_out = []
+    for name, func in candidates:
+        max_diff = float(np.max(np.abs(func() - reference)))
+        median_ms, min_ms = time_call(func, args.repeat)
+        rows_out.append((name, median_ms, min_ms, max_diff))
+    
+    print_header("RESULTS")
+    baseline = rows_out[0][1]
+    print(f"{'path':<18}{'median ms':>12}{'min ms':>12}{'speedup':>10}{'max |diff|':>14}")
+    for name, median_ms, min_ms, max_diff in rows_out:
+        print(f"{name:<18}{median_ms:>12.3f}{min_ms:>12.3f}{baseline / median_ms:>9.1f}x{max_diff:>14.2e}")
+    return 0
+
+
+def run_burst(predict, windows, clients, requests):
+    """
+    Call predict(window) from `clients` threads at once, `requests` times each
+    
+    Returns:
+        (requests per second, list of per-request latencies in ms)
+    """
+    import threading
+    
+    latencies = []
+    latencies_lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+    
+    def client(index):
+        timings = []
+        barrier.wait()
+        for i in range(requests):
+            started = time.perf_counter()
+            predict(windows[(index + i) % len(windows)])
+            timings.append((time.perf_counter() - started) * 1000)
+        with latencies_lock:
+            latencies.extend(timings)
+    
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return clients * requests / (time.perf_counter() - started), latencies
+
+
+def bench_burst(args):
+    """Compare throughput and latency of concurrent single-window predictions with and without micro-batching"""
+    import numpy as np
+    import tensorflow as tf
+    from models.batching import MicroBatcher
+    from models.inference_backends import build_inference_function
+    
+    model, label, n_steps_in, n_features = build_benchmark_model(args)
+    infer = build_inference_function(model, n_steps_in, n_features)
+    
+    def run_batch(batch):
+        return infer(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+    
+    windows = np.random.default_rng(0).standard_normal((64, n_steps_in, n_features)).astype(np.float32)
+    batcher = MicroBatcher(run_batch, window_ms=args.window_ms, max_batch_size=args.max_batch)
+    
+    print_header("Burst load: one forward pass per request vs micro-batching")
+    print(f"Model: {label}, clients: {args.clients}, requests per client: {args.requests}, "
+          f"window: {args.window_ms} ms, max batch: {args.max_batch}")
+    
+    # The traced function accepts any batch size; one full-size call warms up its kernels
+    run_batch(windows[:args.max_batch])
+    
+    candidates = [
+        ('per request', lambda window: run_batch(window[np.newaxis])[0]),
+        ('micro-batched', batcher.predict),
+    ]
+    
+    rows_out = []
+    for name, predict in candidates:
+        throughput, latencies = run_burst(predict, windows, args.clients, args.requests)
+        rows_out.append((name, throughput, np.percentile(latencies, 50), np.percentile(latencies, 99)))
+    
+    print_header("RESULTS")
+    baseline = rows_out[0][1]
+    print(f"{'path':<16}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'speedup':>10}")
+    for name, throughput, p50, p99 in rows_out:
+        print(f"{name:<16}{throughput:>10.1f}{p50:>10.2f}{p99:>10.2f}{throughput / baseline:>9.1f}x")
+    print(f"Batches: {batcher.get_stats()}")
+    return 0
+
+
+def load_model_set(backend_name, models):
+    """
+    Load every model once with one backend (run in a fresh process)
+    
+    Returns:
+        (seconds to import the model code, seconds spent hashing registry files,
+        list of (code, backend used or error, seconds))
+    """
+    started = time.perf_counter()
+    from models.time_series_model import TimeSeriesModel
+    from models.registry import get_model_registry
+    import_seconds = time.perf_counter() - started
+    
+    results = []
+    for model in models:
+        started = time.perf_counter()
+        try:
+            loaded = TimeSeriesModel(
+                model['code'], model['type'], model['n_steps_in'], model['n_steps_out'],
+                model['n_features'], inference_backend=backend_name
+            )
+            results.append((model['code'], loaded.backend.name, time.perf_counter() - started))
+        except Exception as e:
+            results.append((model['code'], f"error: {e}", None))
+    return import_seconds, get_model_registry().get_verify_stats()['seconds'], results
+
+
+def bench_coldload(args):
+    """Measure cold-load time of the full model set, one fresh process per backend"""
+    import multiprocessing
+    from database.queries import get_data_fetcher
+    
+    data_fetcher = get_data_fetcher()
+    models = []
+    for model in data_fetcher.get_active_models():
+        if args.models and model['code'] not in args.models:
+            continue
+        n_features = len(data_fetcher.get_sensors_for_model(model['code']))
+        models.append(dict(model, n_features=n_features))
+    
+    if not models:
+        print("No active models to load")
+        return 1
+    
+    print_header("Cold load of all active models")
+    print(f"Models: {len(models)}, backends: {', '.join(args.backends)}")
+    print("Each backend runs in a new process; the OS page cache stays warm between runs")
+    
+    # spawn, not fork: the child must import TensorFlow/NumPy itself like a new worker would
+    context = multiprocessing.get_context('spawn')
+    rows_out = []
+    for backend_name in args.backends:
+        with context.Pool(1) as pool:
+            started = time.perf_counter()
+            import_seconds, verify_seconds, results = pool.apply(load_model_set, (backend_name, models))
+            total_seconds = time.perf_counter() - started
+        rows_out.append((backend_name, total_seconds, import_seconds, verify_seconds, results))
+        
+        for code, used, seconds in results:
+            if seconds is None:
+                print(f"  {backend_name}: {code} {used}")
+            elif used != backend_name:
+                print(f"  {backend_name}: {code} fell back to {used}")
+    
+    print_header("RESULTS")
+    baseline = rows_out[0][1]
+    print(f"{'backend':<10}{'total s':>10}{'import s':>10}{'loads s':>10}{'verify s':>10}{'max ms':>10}"
+          f"{'loaded':>8}{'speedup':>10}")
+    for backend_name, total_seconds, import_seconds, verify_seconds, results in rows_out:
+        timings = [seconds for _, _, seconds in results if seconds is not None]
+        print(f"{backend_name:<10}{total_seconds:>10.2f}{import_seconds:>10.2f}{sum(timings):>10.2f}"
+              f"{verify_seconds:>10.2f}{max(timings, default=0) * 1000:>10.1f}{len(timings):>8}"
+              f"{baseline / total_seconds:>9.1f}x")
+    return 0
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description='FFWS forecasting performance benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    
+    latest = subparsers.add_parser(
+        'latest-query',
+        help='Compare latest-N-per-sensor query strategies on a scratch table'
+    )
+    latest.add_argument('--rows', type=int, nargs='+',
+                        default=[1000000, 10000000, 100000000],
+                        help='Table sizes to benchmark (default: 1M 10M 100M)')
+    latest.add_argument('--sensors', type=int, default=200,
+                        help='Distinct sensors in the table')
+    latest.add_argument('--model-sensors', type=int, default=10,
+                        help='Sensors requested per query (one model)')
+    latest.add_argument('--n-steps', type=int, default=24,
+                        help='Readings per sensor (n_steps_in)')
+    latest.add_argument('--repeat', type=int, default=20,
+                        help='Timed repetitions per strategy')
+    latest.add_argument('--no-index', action='store_true',
+                        help='Skip the (mas_sensor_code, received_at) index')
+    latest.add_argument('--keep', action='store_true',
+                        help=f'Keep the {BENCH_TABLE} table afterwards')
+    latest.set_defaults(func=bench_latest_query)
+    
+    inference = subparsers.add_parser(
+        'inference',
+        help='Compare model.predict() with the traced function and the NumPy engine'
+    )
+    inference.add_argument('--model-code',
+                           help='Benchmark a trained model from storage/models instead of an untrained one')
+    inference.add_argument('--model-type', choices=['LSTM', 'GRU', 'TCN'], default='LSTM',
+                           help='Architecture of the untrained model')
+    inference.add_argument('--n-steps-in', type=int, default=24, help='Input timesteps')
+    inference.add_argument('--n-steps-out', type=int, default=24, help='Output timesteps')
+    inference.add_argument('--features', type=int, default=5, help='Input features (sensors)')
+    inference.add_argument('--batch', type=int, default=1, help='Windows per call')
+    inference.add_argument('--repeat', type=int, default=200,
+                           help='Timed repetitions per path')
+    inference.set_defaults(func=bench_inference)
+    
+    burst = subparsers.add_parser(
+        'burst',
+        help='Measure concurrent single-window predictions with and without micro-batching'
+    )
+    burst.add_argument('--model-code',
+                       help='Stored model to benchmark (default: build an untrained model)')
+    burst.add_argument('--model-type', choices=['LSTM', 'GRU', 'TCN'], default='LSTM',
+                       help='Architecture of the untrained model')
+    burst.add_argument('--n-steps-in', type=int, default=24, help='Input timesteps')
+    burst.add_argument('--n-steps-out', type=int, default=24, help='Output timesteps')
+    burst.add_argument('--features', type=int, default=5, help='Input features (sensors)')
+    burst.add_argument('--clients', type=int, default=16, help='Concurrent client threads')
+    burst.add_argument('--requests', type=int, default=50, help='Requests per client')
+    burst.add_argument('--window-ms', type=float, default=10, help='Micro-batching window')
+    burst.add_argument('--max-batch', type=int, default=32, help='Largest micro-batch')
+    burst.set_defaults(func=bench_burst)
+    
+    coldload = subparsers.add_parser(
+        'coldload',
+        help='Compare cold-load time of all active models across backends (e.g. keras vs bundle)'
+    )
+    coldload.add_argument('--backends', nargs='+', default=['keras', 'bundle'],
+                          help='Backends to compare, the first is the baseline (default: keras bundle)')
+    coldload.add_argument('--models', nargs='+',
+                          help='Model codes to load (default: all active models)')
+    coldload.set_defaults(func=bench_coldload)
+    
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
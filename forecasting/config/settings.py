@@ -34,11 +34,13 @@ DB_URL = f"mysql+mysqldb://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFI
 STORAGE_DIR = BASE_DIR / 'storage'
 MODELS_DIR = STORAGE_DIR / 'models'
 SCALERS_DIR = STORAGE_DIR / 'scalers'
+MODEL_REGISTRY_DIR = STORAGE_DIR / 'registry'
 LOGS_DIR = BASE_DIR / 'logs'
 
 # Ensure directories exist
 MODELS_DIR.mkdir(parents=True, exist_ok=True)
 SCALERS_DIR.mkdir(parents=True, exist_ok=True)
+MODEL_REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
 LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Flask Configuration
@@ -50,6 +52,34 @@ FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
 DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
 DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))
 DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))  # 1 hour
+DB_WRITE_CHUNK_SIZE = int(os.getenv('DB_WRITE_CHUNK_SIZE', 500))  # Rows per multi-row INSERT
+DB_STREAM_CHUNK_SIZE = int(os.getenv('DB_STREAM_CHUNK_SIZE', 10000))  # Rows per server-side cursor fetch
+
+# Read Replica Configuration
+# Comma-separated replica hosts (host or host:port) sharing the primary's credentials and database;
+# DataFetcher reads are routed to them while writes always go to the primary
+# The database user needs REPLICATION CLIENT for the lag check; startup fails without it
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+DB_REPLICA_URLS = [
+    f"mysql+mysqldb://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{host.partition(':')[0]}:{host.partition(':')[2] or DB_CONFIG['port']}/{DB_CONFIG['database']}?charset={DB_CONFIG['charset']}"
+    for host in DB_REPLICA_HOSTS
+]
+DB_READ_ROUTING = os.getenv('DB_READ_ROUTING', 'replica')  # replica: prefer replicas, primary: never use them
+DB_REPLICA_MAX_LAG = int(os.getenv('DB_REPLICA_MAX_LAG', 30))  # Seconds behind the primary before a replica is skipped
+DB_REPLICA_CHECK_INTERVAL = int(os.getenv('DB_REPLICA_CHECK_INTERVAL', 10))  # Seconds between lag checks per replica
+DB_REPLICA_POOL_SIZE = int(os.getenv('DB_REPLICA_POOL_SIZE', DB_POOL_SIZE))
+DB_REPLICA_POOL_MAX_OVERFLOW = int(os.getenv('DB_REPLICA_POOL_MAX_OVERFLOW', DB_POOL_MAX_OVERFLOW))
+
+# Database Instrumentation Configuration
+# Pool checkout waits and per-statement latencies are always recorded (see /api/metrics/db)
+DB_SLOW_QUERY_CAPTURE = os.getenv('DB_SLOW_QUERY_CAPTURE', 'False').lower() == 'true'  # Keep a log of slow statements
+DB_SLOW_QUERY_MS = int(os.getenv('DB_SLOW_QUERY_MS', 1000))  # Threshold for the slow query log
+DB_SLOW_QUERY_EXPLAIN = os.getenv('DB_SLOW_QUERY_EXPLAIN', 'False').lower() == 'true'  # Store EXPLAIN of slow SELECTs
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv('DB_SLOW_QUERY_LOG_SIZE', 50))  # Most recent slow queries kept
+
+# Metadata Cache Configuration
+# Model/sensor/scaler rows are cached in-process; after the TTL a MAX(updated_at) probe revalidates them
+METADATA_CACHE_TTL = int(os.getenv('METADATA_CACHE_TTL', 60))  # Seconds, 0 disables the cache
 
 # Model Training Configuration
 DEFAULT_EPOCHS = int(os.getenv('DEFAULT_EPOCHS', 50))
@@ -57,6 +87,23 @@ DEFAULT_BATCH_SIZE = int(os.getenv('DEFAULT_BATCH_SIZE', 64))
 TRAINING_DATA_LIMIT = int(os.getenv('TRAINING_DATA_LIMIT', 720))  # Default: 30 days of hourly data
 TEST_SIZE = float(os.getenv('TEST_SIZE', 0.2))  # Train/test split ratio
 
+# Training Data Cache Configuration
+# Keeps per-sensor history on disk and only pulls rows newer than the cached id or the overlap
+SENSOR_HISTORY_CACHE_ENABLED = os.getenv('SENSOR_HISTORY_CACHE_ENABLED', 'False').lower() == 'true'
+SENSOR_HISTORY_CACHE_DIR = STORAGE_DIR / 'cache' / 'sensor_history'
+SENSOR_HISTORY_SYNC_OVERLAP = int(os.getenv('SENSOR_HISTORY_SYNC_OVERLAP', 86400))  # Seconds re-read per sync (late commits, upserts)
+
+# Time Grid Alignment Configuration
+# Readings are snapped to the nearest grid point before building model input
+TIME_GRID_SECONDS = int(os.getenv('TIME_GRID_SECONDS', 3600))  # Must match prediction step (1 hour)
+TIME_GRID_AGGREGATION = os.getenv('TIME_GRID_AGGREGATION', 'mean')  # mean, last, first, max, min, sum
+TIME_GRID_MAX_GAP = int(os.getenv('TIME_GRID_MAX_GAP', 2))  # Empty steps forward-filled per sensor
+
+# Latest Data Query Configuration
+# per_sensor_limit: one indexed range scan per sensor back from its newest reading (needs idx_sensor_received)
+# window: window functions over each sensor's full history
+LATEST_DATA_QUERY_STRATEGY = os.getenv('LATEST_DATA_QUERY_STRATEGY', 'per_sensor_limit')
+
 # Neural Network Architecture Configuration
 # LSTM/GRU Layer Sizes
 LSTM_LAYER_1_SIZE = int(os.getenv('LSTM_LAYER_1_SIZE', 128))
@@ -68,6 +115,67 @@ TCN_NB_FILTERS = int(os.getenv('TCN_NB_FILTERS', 64))
 TCN_KERNEL_SIZE = int(os.getenv('TCN_KERNEL_SIZE', 3))
 TCN_DILATIONS = [int(x) for x in os.getenv('TCN_DILATIONS', '1,2,4,8').split(',')]
 
+# Inference Configuration
+# Run single-window predictions through a traced tf.function instead of Keras model.predict()
+FAST_INFERENCE_ENABLED = os.getenv('FAST_INFERENCE_ENABLED', 'True').lower() == 'true'
+# keras: .h5 through TensorFlow; tflite/onnx/numpy/bundle: exported artifacts without full TensorFlow
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras')
+# Fold input/output scaling into the first/last layer weights of numpy/bundle models
+SCALER_FOLDING_ENABLED = os.getenv('SCALER_FOLDING_ENABLED', 'True').lower() == 'true'
+# Formats written next to the .h5 after training (comma-separated: tflite, onnx, numpy, bundle)
+MODEL_EXPORT_FORMATS = [fmt.strip() for fmt in os.getenv('MODEL_EXPORT_FORMATS', 'tflite,numpy,bundle').split(',') if fmt.strip()]
+
+# Micro-batching Configuration
+# Concurrent single-window predictions of one model share a forward pass; a batch waits at most
+# MICRO_BATCH_WINDOW_MS for more requests, and only while another pass of that model is running
+MICRO_BATCH_ENABLED = os.getenv('MICRO_BATCH_ENABLED', 'True').lower() == 'true'
+MICRO_BATCH_WINDOW_MS = float(os.getenv('MICRO_BATCH_WINDOW_MS', 10))
+MICRO_BATCH_MAX_SIZE = int(os.getenv('MICRO_BATCH_MAX_SIZE', 32))
+
+# Model Cache Configuration
+# Least-recently-used models are evicted from each worker once either budget is exceeded (0 = unlimited)
+MODEL_CACHE_MAX_MODELS = int(os.getenv('MODEL_CACHE_MAX_MODELS', 0))
+MODEL_CACHE_MAX_MB = int(os.getenv('MODEL_CACHE_MAX_MB', 0))  # Estimated from parameter counts / artifact sizes
+# Retrained models are detected by registry version (legacy files: mtime/size) and swapped in after a background load
+MODEL_HOT_RELOAD_ENABLED = os.getenv('MODEL_HOT_RELOAD_ENABLED', 'True').lower() == 'true'
+MODEL_RELOAD_CHECK_INTERVAL = int(os.getenv('MODEL_RELOAD_CHECK_INTERVAL', 10))  # Seconds between checks per model
+MODEL_RELOAD_SETTLE_SECONDS = int(os.getenv('MODEL_RELOAD_SETTLE_SECONDS', 5))  # Legacy files must be unchanged this long
+
+# Model Preload Configuration
+# Load and warm up every active model when a worker starts; /ready answers 503 until it is done
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', 'False').lower() == 'true'
+PRELOAD_CONCURRENCY = int(os.getenv('PRELOAD_CONCURRENCY', 2))  # Models loaded in parallel per worker
+
+# Model Server Configuration
+# Web workers send predictions to a pool of model-server processes over Unix sockets
+# (python serve_models.py) instead of loading TensorFlow and the models themselves
+MODEL_SERVER_ENABLED = os.getenv('MODEL_SERVER_ENABLED', 'False').lower() == 'true'
+MODEL_SERVER_PROCESSES = int(os.getenv('MODEL_SERVER_PROCESSES', 2))  # Initial pool size (serve_models.py --scale N resizes)
+# Sockets, pool file and authkey file; must be owned by this user and not group/world writable
+MODEL_SERVER_SOCKET_DIR = Path(os.getenv('MODEL_SERVER_SOCKET_DIR') or (
+    Path(os.environ['XDG_RUNTIME_DIR']) / 'ffws-model-server' if os.getenv('XDG_RUNTIME_DIR')
+    else STORAGE_DIR / 'run' / 'model-server'
+))
+# Shared secret of servers and clients; when unset, each pool generates a random key into <socket dir>/authkey
+MODEL_SERVER_AUTHKEY = os.getenv('MODEL_SERVER_AUTHKEY', '').encode()
+MODEL_SERVER_TIMEOUT = int(os.getenv('MODEL_SERVER_TIMEOUT', 30))  # Seconds to wait for a prediction
+
+# Model Registry Configuration
+# Trained models are published as immutable versions under storage/registry/<code>/versions
+MODEL_REGISTRY_KEEP_VERSIONS = int(os.getenv('MODEL_REGISTRY_KEEP_VERSIONS', 3))  # Older versions are deleted on publish
+MODEL_REGISTRY_VERIFY = os.getenv('MODEL_REGISTRY_VERIFY', 'True').lower() == 'true'  # Check file hashes before loading
+
+# Prediction Coalescing Configuration
+# Requests for the same model version and last input timestamp share one inference + write,
+# and the stored result answers repeats for PREDICTION_COALESCE_TTL seconds
+PREDICTION_COALESCE_ENABLED = os.getenv('PREDICTION_COALESCE_ENABLED', 'True').lower() == 'true'
+PREDICTION_COALESCE_TTL = int(os.getenv('PREDICTION_COALESCE_TTL', 60))  # Seconds, 0 only coalesces concurrent requests
+
+# Prediction Result Cache Configuration
+# A model's last forecast is returned (no inference, no writes) while its artifact version
+# and the newest reading of each input sensor are unchanged
+PREDICTION_RESULT_CACHE_ENABLED = os.getenv('PREDICTION_RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+
 # Prediction Configuration
 DEFAULT_CONFIDENCE_SCORE = float(os.getenv('DEFAULT_CONFIDENCE_SCORE', 0.85))
 MIN_CONFIDENCE = float(os.getenv('MIN_CONFIDENCE', 0.5))
@@ -75,6 +183,7 @@ VARIANCE_THRESHOLD = float(os.getenv('VARIANCE_THRESHOLD', 10.0))
 
 # Gunicorn Configuration (for production deployment)
 GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', 4))
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 4))  # gthread workers share one model cache per process
 GUNICORN_TIMEOUT = int(os.getenv('GUNICORN_TIMEOUT', 120))
 
 # Logging Configuration
@@ -2,19 +2,33 @@
 Database connection utilities for FFWS Forecasting System
 Connects to the same MySQL database as the Laravel backend
 """
-from sqlalchemy import create_engine, text, pool
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, scoped_session
 from contextlib import contextmanager
+import itertools
 import logging
+import threading
+import time
+import numpy as np
+from database.instrumentation import DatabaseMetrics, InstrumentedQueuePool
 from config.settings import (
-    DB_URL, DB_CONFIG, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_RECYCLE
+    DB_URL, DB_CONFIG, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_RECYCLE,
+    DB_WRITE_CHUNK_SIZE, DB_STREAM_CHUNK_SIZE,
+    DB_REPLICA_HOSTS, DB_REPLICA_URLS, DB_READ_ROUTING, DB_REPLICA_MAX_LAG,
+    DB_REPLICA_CHECK_INTERVAL, DB_REPLICA_POOL_SIZE, DB_REPLICA_POOL_MAX_OVERFLOW
 )
 
 logger = logging.getLogger(__name__)
 
+PRIMARY = 'primary'
+
+# MySQL ER_SPECIFIC_ACCESS_DENIED_ERROR: SHOW REPLICA STATUS needs REPLICATION CLIENT
+ACCESS_DENIED_ERRORS = (1227,)
+
 
 class DatabaseConnection:
-    """Singleton database connection manager"""
+    """Singleton database connection manager with optional read replicas"""
     
     _instance = None
     _engine = None
@@ -26,35 +40,252 @@ class DatabaseConnection:
             cls._instance._initialize()
         return cls._instance
     
+    def _create_engine(self, name, url, pool_size, max_overflow):
+        """Create an instrumented engine with connection pooling"""
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,  # Verify connections before using
+            pool_recycle=DB_POOL_RECYCLE,  # Recycle connections after configured time
+            echo=False
+        )
+        self.metrics.attach(name, engine)
+        return engine
+    
     def _initialize(self):
-        """Initialize database engine and session factory"""
+        """Initialize database engines and session factories"""
         try:
-            # Create engine with connection pooling
-            self._engine = create_engine(
-                DB_URL,
-                poolclass=pool.QueuePool,
-                pool_size=DB_POOL_SIZE,
-                max_overflow=DB_POOL_MAX_OVERFLOW,
-                pool_pre_ping=True,  # Verify connections before using
-                pool_recycle=DB_POOL_RECYCLE,  # Recycle connections after configured time
-                echo=False
-            )
+            self.metrics = DatabaseMetrics()
+            
+            # Primary engine: every write and any read that must see its own writes
+            self._engine = self._create_engine(PRIMARY, DB_URL, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW)
+            self._engines = {PRIMARY: self._engine}
+            self._hosts = {PRIMARY: DB_CONFIG['host']}
             
-            # Create session factory
+            if DB_READ_ROUTING == 'replica':
+                for idx, (host, url) in enumerate(zip(DB_REPLICA_HOSTS, DB_REPLICA_URLS)):
+                    name = f"replica_{idx}"
+                    self._engines[name] = self._create_engine(
+                        name, url, DB_REPLICA_POOL_SIZE, DB_REPLICA_POOL_MAX_OVERFLOW
+                    )
+                    self._hosts[name] = host
+            self._replicas = [name for name in self._engines if name != PRIMARY]
+            
+            # Per-engine health; replicas start unchecked and are probed on first use
+            self._health_lock = threading.Lock()
+            self._health = {name: {
+                'healthy': name == PRIMARY,
+                'lag_seconds': 0 if name == PRIMARY else None,
+                'checked_at': None,
+                'failures': 0,
+                'last_error': None,
+                'lag_probe_denied': False
+            } for name in self._engines}
+            self._replica_cursor = itertools.count()
+            
+            # Create session factories
             self._session_factory = scoped_session(
                 sessionmaker(bind=self._engine, expire_on_commit=False)
             )
+            self._read_session_factory = sessionmaker(expire_on_commit=False)
             
             logger.info(f"Database connection initialized: {DB_CONFIG['database']}@{DB_CONFIG['host']}")
             logger.info(f"Pool config: size={DB_POOL_SIZE}, max_overflow={DB_POOL_MAX_OVERFLOW}, recycle={DB_POOL_RECYCLE}s")
+            if self._replicas:
+                logger.info(
+                    f"Read replicas: {', '.join(DB_REPLICA_HOSTS)} "
+                    f"(max lag {DB_REPLICA_MAX_LAG}s, pool size={DB_REPLICA_POOL_SIZE}, "
+                    f"max_overflow={DB_REPLICA_POOL_MAX_OVERFLOW})"
+                )
         except Exception as e:
             logger.error(f"Failed to initialize database connection: {e}")
             raise
     
     def get_engine(self):
-        """Get SQLAlchemy engine"""
+        """Get SQLAlchemy engine of the primary"""
         return self._engine
     
+    def _check_replica(self, name):
+        """Measure replication lag of a replica and record its health"""
+        lag = None
+        error = None
+        denied = False
+        try:
+            with self._engines[name].connect() as connection:
+                try:
+                    row = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+                    lag_column = 'Seconds_Behind_Source'
+                except OperationalError:
+                    raise
+                except Exception:
+                    # MySQL < 8.0.22 only knows the old syntax
+                    row = connection.execute(text("SHOW SLAVE STATUS")).mappings().first()
+                    lag_column = 'Seconds_Behind_Master'
+            
+            if row is None:
+                error = 'replication is not configured'
+            elif row[lag_column] is None:
+                error = 'replication is stopped'
+            else:
+                lag = int(row[lag_column])
+                if lag > DB_REPLICA_MAX_LAG:
+                    error = f'lag {lag}s exceeds {DB_REPLICA_MAX_LAG}s'
+        except Exception as e:
+            denied = getattr(getattr(e, 'orig', None), 'args', (None,))[0] in ACCESS_DENIED_ERRORS
+            if denied:
+                error = (
+                    "lag probe not permitted: grant REPLICATION CLIENT to the replica user "
+                    "or set DB_READ_ROUTING=primary"
+                )
+            else:
+                error = str(e)
+        
+        with self._health_lock:
+            health = self._health[name]
+            was_healthy = health['healthy']
+            health.update({
+                'healthy': error is None,
+                'lag_seconds': lag,
+                'checked_at': time.monotonic(),
+                'last_error': error,
+                'lag_probe_denied': denied
+            })
+            if error is not None:
+                health['failures'] += 1
+        
+        if denied:
+            logger.error(f"Replica {self._hosts[name]} not used for reads: {error}")
+        elif error is not None and was_healthy is not False:
+            logger.warning(f"Replica {self._hosts[name]} not used for reads: {error}")
+        elif error is None and not was_healthy:
+            logger.info(f"Replica {self._hosts[name]} available for reads (lag {lag}s)")
+    
+    def check_replicas(self):
+        """
+        Probe every replica now (called at startup)
+        
+        An unreachable or lagging replica is only skipped, but a lag probe
+        the database user may not run would silently send every read to the
+        primary for good, so it stops the startup.
+        
+        Raises:
+            RuntimeError: If DB_READ_ROUTING is 'replica' and a replica denies the lag probe
+        """
+        for name in self._replicas:
+            self._check_replica(name)
+        
+        denied = [self._hosts[name] for name in self._replicas if self._health[name]['lag_probe_denied']]
+        if denied:
+            raise RuntimeError(
+                f"Replication lag probe (SHOW REPLICA STATUS) denied on {', '.join(denied)}: "
+                "grant REPLICATION CLIENT to the replica user or set DB_READ_ROUTING=primary"
+            )
+    
+    def get_read_routing_status(self):
+        """Read routing mode, replicas in rotation and replicas whose lag probe is denied"""
+        with self._health_lock:
+            return {
+                'mode': DB_READ_ROUTING,
+                'replicas': len(self._replicas),
+                'healthy_replicas': sum(1 for name in self._replicas if self._health[name]['healthy']),
+                'lag_probe_denied': [
+                    self._hosts[name] for name in self._replicas if self._health[name]['lag_probe_denied']
+                ]
+            }
+    
+    def _replica_is_usable(self, name):
+        """Return the replica's health, re-checking lag once the check interval passed"""
+        with self._health_lock:
+            health = self._health[name]
+            due = (
+                health['checked_at'] is None
+                or time.monotonic() - health['checked_at'] >= DB_REPLICA_CHECK_INTERVAL
+            )
+            if due:
+                # Claim the check so concurrent requests keep using the last result
+                health['checked_at'] = time.monotonic()
+        
+        if due:
+            self._check_replica(name)
+        return self._health[name]['healthy']
+    
+    def _mark_unhealthy(self, name, error):
+        """Take a replica out of rotation until its next lag check"""
+        with self._health_lock:
+            health = self._health[name]
+            health.update({
+                'healthy': False,
+                'checked_at': time.monotonic(),
+                'last_error': str(error)
+            })
+            health['failures'] += 1
+        logger.warning(f"Replica {self._hosts[name]} failed, falling back to primary: {error}")
+    
+    def get_read_engine(self):
+        """
+        Pick the engine for a read that tolerates replication lag
+        
+        Replicas are tried round-robin; one is used only while its last lag
+        check is within DB_REPLICA_MAX_LAG. Without a usable replica the
+        primary serves the read.
+        
+        Returns:
+            Tuple of (engine name, engine)
+        """
+        if not self._replicas:
+            return PRIMARY, self._engine
+        
+        offset = next(self._replica_cursor)
+        for step in range(len(self._replicas)):
+            name = self._replicas[(offset + step) % len(self._replicas)]
+            if self._replica_is_usable(name):
+                return name, self._engines[name]
+        return PRIMARY, self._engine
+    
+    def _run_read(self, operation, read_only):
+        """
+        Run operation(engine) on the primary, or on a replica for read_only calls
+        
+        A replica that fails with a connection-level error is marked
+        unhealthy and the operation is retried once on the primary.
+        """
+        if not read_only:
+            return operation(self._engine)
+        
+        name, engine = self.get_read_engine()
+        if name == PRIMARY:
+            return operation(engine)
+        
+        try:
+            return operation(engine)
+        except OperationalError as e:
+            self._mark_unhealthy(name, e)
+            return operation(self._engine)
+    
+    def get_engine_status(self):
+        """Return health, lag and pool usage of every engine"""
+        status = {}
+        with self._health_lock:
+            for name, engine in self._engines.items():
+                health = self._health[name]
+                engine_pool = engine.pool
+                status[name] = {
+                    'host': self._hosts[name],
+                    'healthy': health['healthy'],
+                    'lag_seconds': health['lag_seconds'],
+                    'failures': health['failures'],
+                    'last_error': health['last_error'],
+                    'lag_probe_denied': health['lag_probe_denied'],
+                    'pool': {
+                        'size': engine_pool.size(),
+                        'checked_out': engine_pool.checkedout(),
+                        'overflow': engine_pool.overflow()
+                    }
+                }
+        return status
+    
     def get_session(self):
         """Get a new database session"""
         return self._session_factory()
@@ -65,29 +296,162 @@ class DatabaseConnection:
             session.close()
     
     @contextmanager
-    def session_scope(self):
-        """Provide a transactional scope for database operations"""
-        session = self.get_session()
+    def session_scope(self, read_only=False):
+        """
+        Provide a transactional scope for database operations
+        
+        Args:
+            read_only: Bind the session to a read replica when one is usable
+        """
+        if read_only:
+            engine_name, engine = self.get_read_engine()
+            session = self._read_session_factory(bind=engine)
+        else:
+            engine_name, session = PRIMARY, self.get_session()
         try:
             yield session
             session.commit()
         except Exception as e:
             session.rollback()
+            if engine_name != PRIMARY and isinstance(e, OperationalError):
+                self._mark_unhealthy(engine_name, e)
             logger.error(f"Database transaction error: {e}")
             raise
         finally:
             self.close_session(session)
     
-    def execute_query(self, query, params=None):
-        """Execute a raw SQL query and return results"""
-        try:
-            with self._engine.connect() as connection:
+    def execute_query(self, query, params=None, read_only=False):
+        """
+        Execute a raw SQL query and return results
+        
+        Args:
+            query: Raw SQL query
+            params: Query parameters
+            read_only: Allow the query to run on a read replica
+        """
+        def run(engine):
+            with engine.connect() as connection:
                 result = connection.execute(text(query), params or {})
                 return result.fetchall(), result.keys()
+        
+        try:
+            return self._run_read(run, read_only)
         except Exception as e:
             logger.error(f"Query execution error: {e}")
             raise
     
+    def stream_arrays(self, query, columns, params=None, expected_rows=None, chunk_size=None,
+                      read_only=False):
+        """
+        Stream a query through a server-side cursor into NumPy arrays
+        
+        Rows are read chunk by chunk and copied column-wise into preallocated
+        arrays, so only one chunk of Python row objects exists at a time and
+        peak memory stays close to the size of the final arrays. Select
+        numeric expressions only (e.g. epoch seconds instead of DATETIME).
+        
+        Args:
+            query: Raw SQL query
+            columns: List of (name, numpy dtype) pairs in SELECT order
+            params: Query parameters
+            expected_rows: Upper bound on the row count, used to size the arrays
+            chunk_size: Rows fetched per round trip (default: DB_STREAM_CHUNK_SIZE)
+            read_only: Allow the query to run on a read replica
+        
+        Returns:
+            Dictionary of column name -> 1-D array
+        """
+        chunk_size = chunk_size or DB_STREAM_CHUNK_SIZE
+        
+        def run(engine):
+            capacity = max(expected_rows or chunk_size, 1)
+            arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in columns}
+            n_rows = 0
+            
+            with engine.connect() as connection:
+                result = connection.execution_options(
+                    stream_results=True, max_row_buffer=chunk_size
+                ).execute(text(query), params or {})
+                
+                for partition in result.partitions(chunk_size):
+                    n_new = len(partition)
+                    if n_rows + n_new > capacity:
+                        capacity = max(capacity * 2, n_rows + n_new)
+                        for name, dtype in columns:
+                            grown = np.empty(capacity, dtype=dtype)
+                            grown[:n_rows] = arrays[name][:n_rows]
+                            arrays[name] = grown
+                    
+                    for idx, (name, dtype) in enumerate(columns):
+                        arrays[name][n_rows:n_rows + n_new] = np.fromiter(
+                            (row[idx] for row in partition), dtype=dtype, count=n_new
+                        )
+                    n_rows += n_new
+            
+            # Give back over-allocated space when the estimate was far off
+            if capacity > n_rows * 5 // 4:
+                return {name: array[:n_rows].copy() for name, array in arrays.items()}
+            return {name: array[:n_rows] for name, array in arrays.items()}
+        
+        try:
+            return self._run_read(run, read_only)
+        except Exception as e:
+            logger.error(f"Streaming query error: {e}")
+            raise
+    
+    def bulk_upsert(self, table, columns, rows, update_columns, chunk_size=None):
+        """
+        Write many rows with multi-row INSERT ... ON DUPLICATE KEY UPDATE
+        
+        All chunks are written on a single connection inside one transaction,
+        so either every row is stored or none is. Always runs on the primary.
+        
+        Args:
+            table: Target table name
+            columns: List of column names, in the order used by each row
+            rows: List of value tuples, one per row
+            update_columns: Columns to overwrite when the row already exists
+            chunk_size: Maximum rows per INSERT statement (default: DB_WRITE_CHUNK_SIZE)
+        
+        Returns:
+            Dictionary with rows written, statements executed and DB time in ms
+        """
+        chunk_size = chunk_size or DB_WRITE_CHUNK_SIZE
+        column_list = ', '.join(columns)
+        update_clause = ', '.join(f"{col} = VALUES({col})" for col in update_columns)
+        
+        statements = 0
+        started = time.perf_counter()
+        try:
+            with self._engine.begin() as connection:
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    placeholders = []
+                    params = {}
+                    for row_idx, row in enumerate(chunk):
+                        names = []
+                        for col_idx, value in enumerate(row):
+                            name = f"p{row_idx}_{col_idx}"
+                            params[name] = value
+                            names.append(f":{name}")
+                        placeholders.append(f"({', '.join(names)})")
+                    
+                    query = (
+                        f"INSERT INTO {table} ({column_list}) VALUES {', '.join(placeholders)} "
+                        f"ON DUPLICATE KEY UPDATE {update_clause}"
+                    )
+                    connection.execute(text(query), params)
+                    statements += 1
+        except Exception as e:
+            logger.error(f"Bulk upsert into {table} failed: {e}")
+            raise
+        
+        return {
+            'rows': len(rows),
+            'statements': statements,
+            'db_time_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    
     def test_connection(self):
         """Test database connection"""
         try:
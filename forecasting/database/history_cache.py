@@ -0,0 +1,295 @@
+"""
+Incremental on-disk cache of per-sensor history from data_actuals
+
+Each sensor is stored as a binary file of fixed-size records (id, epoch
+seconds, value) sorted by time, next to a small JSON file holding the
+high-water mark. A sync pulls rows with an id above the mark plus a short
+trailing overlap, so retraining with years of history reads just the rows
+that arrived or changed since the last run.
+"""
+import json
+import logging
+import os
+import re
+from contextlib import contextmanager
+import numpy as np
+from config.settings import SENSOR_HISTORY_CACHE_DIR, SENSOR_HISTORY_SYNC_OVERLAP
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# One record per reading: data_actuals.id, naive epoch seconds, value
+RECORD_DTYPE = np.dtype([('id', '<i8'), ('ts', '<i8'), ('value', '<f8')])
+
+
+def sensor_index_expression(sensor_codes):
+    """
+    Build a SQL expression mapping mas_sensor_code to its 0-based position
+    
+    Lets streaming queries return the sensor as an integer column instead
+    of one Python string per row.
+    
+    Returns:
+        Tuple of (SQL expression, parameters dict)
+    """
+    params = {f'sensor_{idx}': code for idx, code in enumerate(sensor_codes)}
+    placeholders = ', '.join(f':sensor_{idx}' for idx in range(len(sensor_codes)))
+    return f"FIELD(mas_sensor_code, {placeholders}) - 1", params
+
+
+class SensorHistoryCache:
+    """Columnar per-sensor history cache with an id high-water mark"""
+    
+    def __init__(self, db, cache_dir=SENSOR_HISTORY_CACHE_DIR, overlap=SENSOR_HISTORY_SYNC_OVERLAP):
+        """
+        Args:
+            db: Database connection
+            cache_dir: Directory holding the per-sensor files
+            overlap: Seconds of cached history re-read on every sync
+        """
+        self.db = db
+        self.overlap = overlap
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _paths(self, sensor_code):
+        """Return (records path, meta path) for a sensor"""
+        safe_code = re.sub(r'[^A-Za-z0-9_.-]', '_', sensor_code)
+        return (
+            self.cache_dir / f"{safe_code}.bin",
+            self.cache_dir / f"{safe_code}.json"
+        )
+    
+    @contextmanager
+    def _lock(self):
+        """Serialize cache writers across processes (train.py vs API)"""
+        if fcntl is None:
+            yield
+            return
+        
+        with open(self.cache_dir / '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _read_meta(self, sensor_code):
+        """Read the high-water mark for a sensor"""
+        records_path, meta_path = self._paths(sensor_code)
+        if not meta_path.exists() or not records_path.exists():
+            return {'last_id': 0, 'last_ts': None, 'rows': 0, 'sorted': True}
+        
+        with open(meta_path) as f:
+            return json.load(f)
+    
+    def _write_meta(self, sensor_code, meta):
+        """Atomically replace the meta file"""
+        _, meta_path = self._paths(sensor_code)
+        tmp_path = meta_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+    
+    def _merge(self, sensor_code, records, cutoff):
+        """
+        Replace the cached rows from cutoff on with the re-read ones and add new rows
+        
+        Args:
+            sensor_code: Sensor code
+            records: Rows read by sync: every row from cutoff on, plus rows
+                     above the high-water mark with an older timestamp (backfills)
+            cutoff: Epoch seconds where the re-read overlap starts (None: nothing cached yet)
+        """
+        records_path, _ = self._paths(sensor_code)
+        meta = self._read_meta(sensor_code)
+        
+        # Drop a partially written tail left behind by an interrupted append
+        expected_size = meta['rows'] * RECORD_DTYPE.itemsize
+        if records_path.exists() and records_path.stat().st_size != expected_size:
+            with open(records_path, 'r+b') as f:
+                f.truncate(expected_size)
+        
+        if not meta['sorted']:
+            self._compact(sensor_code, meta)
+        
+        # The file is sorted by timestamp, so the overlap is its tail
+        keep = meta['rows']
+        if cutoff is not None and keep:
+            cached = np.memmap(records_path, dtype=RECORD_DTYPE, mode='r', shape=(keep,))
+            keep = int(np.searchsorted(cached['ts'], cutoff, side='left'))
+            last_kept_ts = int(cached['ts'][keep - 1]) if keep else None
+            del cached
+            with open(records_path, 'r+b') as f:
+                f.truncate(keep * RECORD_DTYPE.itemsize)
+        else:
+            last_kept_ts = meta['last_ts'] if keep else None
+        
+        records = np.sort(records, order=('ts', 'id'))
+        with open(records_path, 'ab') as f:
+            records.tofile(f)
+        
+        # Backfills older than the kept rows break the order until the next compaction
+        still_sorted = last_kept_ts is None or len(records) == 0 or int(records['ts'][0]) >= last_kept_ts
+        last_ts = [ts for ts in (last_kept_ts, int(records['ts'][-1]) if len(records) else None) if ts is not None]
+        self._write_meta(sensor_code, {
+            'last_id': max(int(records['id'].max()) if len(records) else 0, meta['last_id']),
+            'last_ts': max(last_ts) if last_ts else None,
+            'rows': keep + len(records),
+            'sorted': still_sorted
+        })
+    
+    def _compact(self, sensor_code, meta):
+        """Rewrite a sensor file sorted by timestamp (cache lock held)"""
+        records_path, _ = self._paths(sensor_code)
+        records = np.memmap(records_path, dtype=RECORD_DTYPE, mode='r', shape=(meta['rows'],))
+        sorted_records = np.sort(records, order=('ts', 'id'))
+        del records
+        
+        tmp_path = records_path.with_suffix('.bin.tmp')
+        sorted_records.tofile(tmp_path)
+        os.replace(tmp_path, records_path)
+        meta['sorted'] = True
+        self._write_meta(sensor_code, meta)
+        return sorted_records
+    
+    def _load_records(self, sensor_code):
+        """Load all cached records for a sensor, sorted by timestamp"""
+        records_path, _ = self._paths(sensor_code)
+        meta = self._read_meta(sensor_code)
+        if meta['rows'] == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        
+        if meta['sorted']:
+            return np.memmap(records_path, dtype=RECORD_DTYPE, mode='r', shape=(meta['rows'],))
+        
+        # Compact once so later reads are plain memory maps again
+        with self._lock():
+            return self._compact(sensor_code, meta)
+    
+    def sync(self, sensor_codes):
+        """
+        Pull rows that are new or may have changed since the last sync
+        
+        Besides the rows above each sensor's high-water mark, the last
+        SENSOR_HISTORY_SYNC_OVERLAP seconds are read again and replace the
+        cached copy: auto-increment ids do not commit in order, so a row
+        with a lower id can appear after a sync, and upserts change rows in
+        place. The sync reads from the primary, since a lagging replica
+        would widen that gap.
+        
+        Args:
+            sensor_codes: List of sensor codes to bring up to date
+        
+        Returns:
+            Number of rows read across all sensors
+        """
+        with self._lock():
+            metas = {code: self._read_meta(code) for code in sensor_codes}
+            
+            # Per sensor: the overlap (received_at index range) and older rows above the
+            # mark (backfills); each sensor has its own bounds, so a new sensor (mark 0)
+            # does not make the already cached ones rescan their history
+            params = {}
+            branches = []
+            cutoffs = {}
+            for idx, code in enumerate(sensor_codes):
+                meta = metas[code]
+                columns = (
+                    f"id, {idx} AS sensor, "
+                    f"TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', received_at) AS ts, value"
+                )
+                params[f'sensor_{idx}'] = code
+                params[f'mark_{idx}'] = meta['last_id']
+                if meta['last_ts'] is None:
+                    cutoffs[code] = None
+                    branches.append(
+                        f"(SELECT {columns} FROM data_actuals "
+                        f"WHERE mas_sensor_code = :sensor_{idx} AND id > :mark_{idx})"
+                    )
+                    continue
+                
+                cutoffs[code] = meta['last_ts'] - self.overlap
+                params[f'cutoff_{idx}'] = np.datetime64(cutoffs[code], 's').astype(object)
+                branches.append(
+                    f"(SELECT {columns} FROM data_actuals "
+                    f"WHERE mas_sensor_code = :sensor_{idx} AND received_at >= :cutoff_{idx})"
+                )
+                branches.append(
+                    f"(SELECT {columns} FROM data_actuals "
+                    f"WHERE mas_sensor_code = :sensor_{idx} AND id > :mark_{idx} "
+                    f"AND received_at < :cutoff_{idx})"
+                )
+            query = "\nUNION ALL\n".join(branches) + "\nORDER BY id ASC"
+            
+            # Streamed straight into arrays; a first backfill can be millions of rows
+            readings = self.db.stream_arrays(query, [
+                ('id', np.int64), ('sensor', np.int64), ('ts', np.int64), ('value', np.float64)
+            ], params)
+            
+            synced = 0
+            for sensor_idx, code in enumerate(sensor_codes):
+                selected = readings['sensor'] == sensor_idx
+                if not selected.any() and cutoffs[code] is None:
+                    continue
+                
+                records = np.empty(int(selected.sum()), dtype=RECORD_DTYPE)
+                records['id'] = readings['id'][selected]
+                records['ts'] = readings['ts'][selected]
+                records['value'] = readings['value'][selected]
+                self._merge(code, records, cutoffs[code])
+                synced += len(records)
+            
+            logger.info(f"Sensor history cache synced: {synced} rows read for {len(sensor_codes)} sensors")
+            return synced
+    
+    def get_readings(self, sensor_codes, limit):
+        """
+        Get the most recent readings for each sensor after syncing
+        
+        Args:
+            sensor_codes: List of sensor codes
+            limit: Number of most recent records per sensor
+        
+        Returns:
+            Dictionary of arrays: 'sensor' (index into sensor_codes),
+            'ts' (datetime64[s]) and 'value' (float64)
+        """
+        self.sync(sensor_codes)
+        
+        parts = [self._load_records(code)[-limit:] for code in sensor_codes]
+        n_rows = sum(len(part) for part in parts)
+        
+        readings = {
+            'sensor': np.empty(n_rows, dtype=np.int64),
+            'ts': np.empty(n_rows, dtype=np.int64),
+            'value': np.empty(n_rows, dtype=np.float64)
+        }
+        offset = 0
+        for sensor_idx, part in enumerate(parts):
+            end = offset + len(part)
+            readings['sensor'][offset:end] = sensor_idx
+            readings['ts'][offset:end] = part['ts']
+            readings['value'][offset:end] = part['value']
+            offset = end
+        
+        readings['ts'] = readings['ts'].view('datetime64[s]')
+        return readings
+    
+    def invalidate(self, sensor_code=None):
+        """Drop cached history for one sensor, or for all sensors"""
+        with self._lock():
+            if sensor_code is None:
+                targets = list(self.cache_dir.glob('*.bin')) + list(self.cache_dir.glob('*.json'))
+            else:
+                targets = list(self._paths(sensor_code))
+            
+            for path in targets:
+                if path.exists():
+                    path.unlink()
+        
+        logger.info(f"Sensor history cache invalidated: {sensor_code or 'all sensors'}")
@@ -0,0 +1,367 @@
+"""
+Connection pool and query instrumentation for FFWS Forecasting System
+Records checkout wait time, pool saturation and per-statement latency for
+every engine of DatabaseConnection, plus an opt-in slow query log with the
+EXPLAIN plan of each captured statement
+"""
+import logging
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event, pool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from config.settings import (
+    DB_SLOW_QUERY_CAPTURE, DB_SLOW_QUERY_MS, DB_SLOW_QUERY_EXPLAIN, DB_SLOW_QUERY_LOG_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+# Do not EXPLAIN the same statement name more than once per interval
+EXPLAIN_INTERVAL = 60
+
+_COMMENT_PATTERN = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE)\s+`?([A-Za-z_][A-Za-z0-9_.]*)', re.I)
+
+
+def normalize_statement(statement):
+    """
+    Name a SQL statement by its verb and the tables it touches
+    
+    Parameter values and IN-list lengths do not change the name, so every
+    latest-data query is one entry however many sensors it reads.
+    
+    Returns:
+        Name such as 'SELECT data_actuals' or 'INSERT data_predictions'
+    """
+    sql = _COMMENT_PATTERN.sub(' ', statement).strip().lstrip('(').strip()
+    verb = sql.split(None, 1)[0].upper() if sql else 'UNKNOWN'
+    if verb == 'WITH':
+        verb = 'SELECT'
+    
+    tables = []
+    for table in _TABLE_PATTERN.findall(sql):
+        table = table.lower()
+        if table not in tables:
+            tables.append(table)
+    return f"{verb} {'+'.join(tables)}" if tables else verb
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+    
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def observe(self, elapsed_ms):
+        """Add one observation"""
+        for idx, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.counts[idx] += 1
+                break
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        if self.count == 0:
+            return None
+        
+        threshold = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return self.max_ms if bound == float('inf') else bound
+        return self.max_ms
+    
+    def to_dict(self):
+        """Summary with bucket counts keyed by their upper bound"""
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else None,
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {
+                ('inf' if bound == float('inf') else f"le_{bound}"): bucket_count
+                for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.counts)
+            }
+        }
+
+
+class InstrumentedQueuePool(pool.QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection"""
+    
+    checkout_listener = None
+    
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            if self.checkout_listener is not None:
+                self.checkout_listener(self, time.perf_counter() - started, timed_out=True)
+            raise
+        
+        if self.checkout_listener is not None:
+            self.checkout_listener(self, time.perf_counter() - started, timed_out=False)
+        return connection
+    
+    def recreate(self):
+        # Engine.dispose() swaps in a new pool; keep reporting to the same listener
+        new_pool = super().recreate()
+        new_pool.checkout_listener = self.checkout_listener
+        return new_pool
+
+
+class DatabaseMetrics:
+    """Per-engine pool metrics and per-statement latency for one process"""
+    
+    def __init__(self, slow_query_ms=DB_SLOW_QUERY_MS, capture_slow=DB_SLOW_QUERY_CAPTURE,
+                 explain_slow=DB_SLOW_QUERY_EXPLAIN, slow_log_size=DB_SLOW_QUERY_LOG_SIZE):
+        self.slow_query_ms = slow_query_ms
+        self.capture_slow = capture_slow
+        self.explain_slow = explain_slow
+        self._lock = threading.Lock()
+        self._engines = {}
+        self._pools = {}
+        self._statements = {}
+        self._slow_queries = deque(maxlen=slow_log_size)
+        self._explained_at = {}
+        self._explain_queue = None
+        self._explain_dropped = 0
+        self._started_at = datetime.now()
+    
+    def _new_pool_stats(self):
+        return {
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'saturated_checkouts': 0,
+            'peak_checked_out': 0,
+            'checkout_wait': LatencyHistogram()
+        }
+    
+    def attach(self, name, engine):
+        """
+        Start recording metrics for an engine
+        
+        Args:
+            name: Engine name ('primary', 'replica_0', ...)
+            engine: Engine created with InstrumentedQueuePool
+        """
+        with self._lock:
+            self._engines[name] = engine
+            self._pools[name] = self._new_pool_stats()
+        
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.checkout_listener = (
+                lambda engine_pool, waited, timed_out: self._record_checkout(name, engine_pool, waited, timed_out)
+            )
+        
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(
+            engine, 'after_cursor_execute',
+            lambda *args: self._after_cursor_execute(name, engine, *args)
+        )
+    
+    def _record_checkout(self, name, engine_pool, waited, timed_out):
+        """Record one pool checkout and how full the pool was afterwards"""
+        checked_out = engine_pool.checkedout()
+        capacity = engine_pool.size() + max(engine_pool._max_overflow, 0)
+        
+        with self._lock:
+            stats = self._pools[name]
+            stats['checkout_wait'].observe(waited * 1000)
+            if timed_out:
+                stats['checkout_timeouts'] += 1
+                return
+            stats['checkouts'] += 1
+            stats['peak_checked_out'] = max(stats['peak_checked_out'], checked_out)
+            if engine_pool._max_overflow >= 0 and checked_out >= capacity:
+                stats['saturated_checkouts'] += 1
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context so failed statements leave nothing behind
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, name, engine, conn, cursor, statement, parameters,
+                              context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        statement_name = normalize_statement(statement)
+        
+        # Streamed results report -1 here; their rows are not known yet
+        rowcount = getattr(cursor, 'rowcount', -1)
+        is_select = statement_name.startswith('SELECT')
+        
+        with self._lock:
+            stats = self._statements.get(statement_name)
+            if stats is None:
+                stats = self._statements[statement_name] = {
+                    'calls': 0,
+                    'rows': 0,
+                    'latency': LatencyHistogram(),
+                    'engines': {}
+                }
+            stats['calls'] += 1
+            stats['latency'].observe(elapsed_ms)
+            stats['engines'][name] = stats['engines'].get(name, 0) + 1
+            if is_select and rowcount is not None and rowcount >= 0:
+                stats['rows'] += rowcount
+        
+        if self.capture_slow and elapsed_ms >= self.slow_query_ms:
+            self._capture_slow_query(name, engine, statement_name, statement, parameters,
+                                     elapsed_ms, executemany)
+    
+    def _capture_slow_query(self, name, engine, statement_name, statement, parameters,
+                            elapsed_ms, executemany):
+        """Store a slow statement and schedule its EXPLAIN"""
+        entry = {
+            'name': statement_name,
+            'engine': name,
+            'elapsed_ms': round(elapsed_ms, 2),
+            'captured_at': datetime.now().isoformat(),
+            'statement': statement[:4000],
+            'explain': None
+        }
+        logger.warning(f"Slow query on {name}: {statement_name} took {elapsed_ms:.0f}ms")
+        
+        explain_due = False
+        with self._lock:
+            self._slow_queries.append(entry)
+            if self.explain_slow and not executemany and statement_name.startswith('SELECT'):
+                now = time.monotonic()
+                if now - self._explained_at.get(statement_name, -EXPLAIN_INTERVAL) >= EXPLAIN_INTERVAL:
+                    self._explained_at[statement_name] = now
+                    explain_due = True
+        
+        if explain_due:
+            # A streamed result may still be open on this connection, so EXPLAIN
+            # runs later on a connection of its own; never block the query's thread on it
+            try:
+                self._get_explain_queue().put_nowait((engine, statement, parameters, entry))
+            except queue.Full:
+                with self._lock:
+                    self._explain_dropped += 1
+                    entry['explain'] = {'error': 'EXPLAIN queue full, plan not captured'}
+    
+    def _get_explain_queue(self):
+        """Start the EXPLAIN worker thread on first use"""
+        with self._lock:
+            if self._explain_queue is None:
+                self._explain_queue = queue.Queue(maxsize=100)
+                threading.Thread(
+                    target=self._explain_worker, name='db-explain', daemon=True
+                ).start()
+            return self._explain_queue
+    
+    def _explain_worker(self):
+        """Run EXPLAIN for queued slow statements"""
+        while True:
+            engine, statement, parameters, entry = self._explain_queue.get()
+            try:
+                connection = engine.raw_connection()
+                try:
+                    cursor = connection.cursor()
+                    cursor.execute(f"EXPLAIN {statement}", parameters)
+                    columns = [column[0] for column in cursor.description]
+                    plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                    cursor.close()
+                finally:
+                    connection.close()
+                
+                with self._lock:
+                    entry['explain'] = [
+                        {key: (value if isinstance(value, (int, float, type(None))) else str(value))
+                         for key, value in row.items()}
+                        for row in plan
+                    ]
+            except Exception as e:
+                logger.warning(f"EXPLAIN of slow query {entry['name']} failed: {e}")
+                with self._lock:
+                    entry['explain'] = {'error': str(e)}
+    
+    def get_slow_queries(self):
+        """Return captured slow queries, newest first"""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._slow_queries)]
+    
+    def snapshot(self):
+        """
+        Return all metrics as a JSON-serializable dictionary
+        
+        Pool usage is read live from each engine; statement latencies are
+        sorted by total time spent, the biggest consumer first.
+        """
+        with self._lock:
+            pools = {}
+            for name, stats in self._pools.items():
+                engine_pool = self._engines[name].pool
+                capacity = None
+                if isinstance(engine_pool, pool.QueuePool) and engine_pool._max_overflow >= 0:
+                    capacity = engine_pool.size() + engine_pool._max_overflow
+                checked_out = engine_pool.checkedout() if hasattr(engine_pool, 'checkedout') else None
+                
+                pools[name] = {
+                    'capacity': capacity,
+                    'checked_out': checked_out,
+                    'utilization': (
+                        round(checked_out / capacity, 3) if capacity and checked_out is not None else None
+                    ),
+                    'peak_checked_out': stats['peak_checked_out'],
+                    'checkouts': stats['checkouts'],
+                    'saturated_checkouts': stats['saturated_checkouts'],
+                    'checkout_timeouts': stats['checkout_timeouts'],
+                    'checkout_wait': stats['checkout_wait'].to_dict()
+                }
+            
+            statements = {}
+            ordered = sorted(
+                self._statements.items(), key=lambda item: item[1]['latency'].total_ms, reverse=True
+            )
+            for statement_name, stats in ordered:
+                statements[statement_name] = {
+                    'calls': stats['calls'],
+                    'rows': stats['rows'],
+                    'total_ms': round(stats['latency'].total_ms, 2),
+                    'engines': dict(stats['engines']),
+                    'latency': stats['latency'].to_dict()
+                }
+            
+            return {
+                'since': self._started_at.isoformat(),
+                'pools': pools,
+                'statements': statements,
+                'slow_query_capture': {
+                    'enabled': self.capture_slow,
+                    'threshold_ms': self.slow_query_ms,
+                    'explain': self.explain_slow,
+                    'captured': len(self._slow_queries),
+                    'explain_dropped': self._explain_dropped
+                }
+            }
+    
+    def reset(self):
+        """Clear all counters, histograms and captured slow queries"""
+        with self._lock:
+            for name in self._pools:
+                self._pools[name] = self._new_pool_stats()
+            self._statements.clear()
+            self._slow_queries.clear()
+            self._explained_at.clear()
+            self._explain_dropped = 0
+            self._started_at = datetime.now()
@@ -0,0 +1,122 @@
+"""
+In-process cache for model, sensor and scaler metadata
+Entries live until the TTL expires; a cheap MAX(updated_at)/COUNT(*) probe
+then decides whether they are still valid, so the prediction path runs no
+metadata queries in steady state
+"""
+import copy
+import functools
+import logging
+import threading
+import time
+from config.settings import METADATA_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Tables whose changes invalidate cached metadata
+PROBE_QUERY = """
+SELECT
+    (SELECT MAX(updated_at) FROM mas_models) AS models_updated_at,
+    (SELECT COUNT(*) FROM mas_models) AS models_count,
+    (SELECT MAX(updated_at) FROM mas_sensors) AS sensors_updated_at,
+    (SELECT COUNT(*) FROM mas_sensors) AS sensors_count,
+    (SELECT MAX(updated_at) FROM mas_scalers) AS scalers_updated_at,
+    (SELECT COUNT(*) FROM mas_scalers) AS scalers_count
+"""
+
+
+class MetadataCache:
+    """TTL cache with probe-based revalidation and explicit invalidation"""
+    
+    def __init__(self, db, ttl=METADATA_CACHE_TTL):
+        self.db = db
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._fingerprint = None
+        self._checked_at = None
+        self._stats = {'hits': 0, 'misses': 0, 'probes': 0, 'invalidations': 0}
+    
+    def _probe(self):
+        """Return a fingerprint of the metadata tables"""
+        result_data, _ = self.db.execute_query(PROBE_QUERY, read_only=True)
+        return tuple(result_data[0])
+    
+    def _revalidate(self):
+        """Probe the metadata tables and drop entries if anything changed"""
+        try:
+            fingerprint = self._probe()
+        except Exception as e:
+            logger.error(f"Metadata cache probe failed, clearing cache: {e}")
+            fingerprint = None
+        
+        with self._lock:
+            self._stats['probes'] += 1
+            if fingerprint is None or fingerprint != self._fingerprint:
+                if self._entries:
+                    logger.info("Metadata changed in database, metadata cache cleared")
+                    self._stats['invalidations'] += 1
+                self._entries.clear()
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+    
+    def get(self, key, loader, copy_value=True):
+        """
+        Get a cached value, loading it on a miss
+        
+        Args:
+            key: Hashable cache key
+            loader: Callable returning the value; empty results are not cached
+            copy_value: Return a deep copy (disable for immutable values)
+        
+        Returns:
+            The cached value, copied unless copy_value is False
+        """
+        if self.ttl <= 0:
+            return loader()
+        
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.ttl:
+            self._revalidate()
+        
+        with self._lock:
+            if key in self._entries:
+                self._stats['hits'] += 1
+                value = self._entries[key]
+                return copy.deepcopy(value) if copy_value else value
+            self._stats['misses'] += 1
+        
+        value = loader()
+        
+        # Loaders return None/[]/{} on errors, which must not stick in the cache
+        if value:
+            with self._lock:
+                self._entries[key] = copy.deepcopy(value) if copy_value else value
+        return value
+    
+    def invalidate(self, key=None):
+        """Drop one entry, or the whole cache when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._fingerprint = None
+                self._checked_at = None
+            else:
+                self._entries.pop(key, None)
+            self._stats['invalidations'] += 1
+        logger.info(f"Metadata cache invalidated: {key or 'all entries'}")
+    
+    def get_stats(self):
+        """Return cache counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['ttl'] = self.ttl
+            return stats
+
+
+def cached_metadata(func):
+    """Cache a DataFetcher metadata method by its name and positional arguments"""
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        return self.metadata_cache.get((func.__name__,) + args, lambda: func(self, *args))
+    return wrapper
@@ -90,7 +90,7 @@ class DataActual(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     mas_sensor_code = Column(String(100), ForeignKey('mas_sensors.code'), nullable=False)
-    value = Column(DECIMAL(12, 4), nullable=False)
+    value = Column(Float, nullable=False)  # DOUBLE in the Laravel migration
     received_at = Column(DateTime, nullable=False)
     threshold_status = Column(Enum('normal', 'watch', 'warning', 'danger', 'unknown'), default='unknown')
     created_at = Column(DateTime, default=datetime.utcnow)
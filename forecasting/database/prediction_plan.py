@@ -0,0 +1,49 @@
+"""
+Immutable prediction plan for the predict-all cycle
+Holds every active model with its active sensors and scaler rows, loaded
+up front so the prediction loop needs no further metadata queries
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+
+
+def freeze(record):
+    """Return a read-only view of a metadata dict"""
+    return MappingProxyType(dict(record))
+
+
+@dataclass(frozen=True)
+class ModelPlan:
+    """One active model with its sensors and scalers"""
+    config: MappingProxyType
+    sensors: tuple
+    scalers: MappingProxyType
+    
+    @property
+    def code(self):
+        return self.config['code']
+    
+    @property
+    def sensor_codes(self):
+        return tuple(sensor['code'] for sensor in self.sensors)
+
+
+@dataclass(frozen=True)
+class PredictionPlan:
+    """All active models for one predict-all cycle"""
+    models: tuple
+    loaded_at: datetime = field(default_factory=datetime.now)
+    
+    def __iter__(self):
+        return iter(self.models)
+    
+    def __len__(self):
+        return len(self.models)
+    
+    def get(self, model_code):
+        """Get the plan of a single model, or None"""
+        for model_plan in self.models:
+            if model_plan.code == model_code:
+                return model_plan
+        return None
@@ -1,26 +1,161 @@
 """
 Database query utilities for fetching sensor data and configurations
 """
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from sqlalchemy import desc, and_, or_
 import logging
 from database.connection import get_db
 from database.models import MasModel, MasSensor, MasDevice, DataActual, MasScaler
+from database.history_cache import SensorHistoryCache, sensor_index_expression
+from database.metadata_cache import MetadataCache, cached_metadata
+from database.prediction_plan import ModelPlan, PredictionPlan, freeze
+from utils.time_grid import align_to_grid
+from config.settings import (
+    SENSOR_HISTORY_CACHE_ENABLED, TIME_GRID_SECONDS, TIME_GRID_AGGREGATION, TIME_GRID_MAX_GAP,
+    LATEST_DATA_QUERY_STRATEGY
+)
 
 logger = logging.getLogger(__name__)
 
+def lookback_seconds(n_rows, freq_seconds=TIME_GRID_SECONDS, max_gap=TIME_GRID_MAX_GAP):
+    """
+    Time span of readings needed for n_rows complete grid rows
+    
+    Counted back from a sensor's newest reading: the rows themselves, the
+    steps that may be forward-filled, and one step for grid rounding and
+    sensors reporting a step ahead of the others.
+    """
+    return (n_rows + max_gap + 1) * freq_seconds
+
+
+def build_latest_readings_query(sensor_codes, n_records, strategy='per_sensor_limit',
+                                table='data_actuals', freq_seconds=TIME_GRID_SECONDS,
+                                max_gap=TIME_GRID_MAX_GAP):
+    """
+    Build the query that fetches the readings behind the latest N grid rows of each sensor
+    
+    Readings are bounded by time, not by count, so sensors reporting more
+    often than the grid (e.g. every 15 minutes on an hourly grid) still
+    yield N grid rows.
+    
+    Args:
+        sensor_codes: List of sensor codes
+        n_records: Number of latest grid rows per sensor, or a dict of
+                   sensor code -> number of grid rows
+        strategy: 'per_sensor_limit' (per sensor, an index range scan back from its
+                  newest reading, served by the (mas_sensor_code, received_at) index) or
+                  'window' (window functions over each sensor's full history)
+        table: Table to read from (overridable for benchmarks)
+        freq_seconds: Grid spacing in seconds
+        max_gap: Grid steps that may be forward-filled
+    
+    Returns:
+        Tuple of (SQL string, parameters dict)
+    """
+    if isinstance(n_records, dict):
+        spans = {code: lookback_seconds(n_records[code], freq_seconds, max_gap) for code in sensor_codes}
+    else:
+        spans = {code: lookback_seconds(n_records, freq_seconds, max_gap) for code in sensor_codes}
+    
+    if strategy == 'window':
+        query = f"""
+        SELECT 
+            id,
+            mas_sensor_code,
+            value,
+            received_at as DateTime
+        FROM (
+            SELECT 
+                id,
+                mas_sensor_code,
+                value,
+                received_at,
+                MAX(received_at) OVER (PARTITION BY mas_sensor_code) as last_received_at
+            FROM {table}
+            WHERE mas_sensor_code IN :sensor_codes
+        ) ranked
+        WHERE received_at >= last_received_at - INTERVAL :span SECOND
+        ORDER BY DateTime ASC
+        """
+        return query, {'sensor_codes': tuple(sensor_codes), 'span': max(spans.values())}
+    
+    if strategy != 'per_sensor_limit':
+        raise ValueError(f"Unknown latest data query strategy: {strategy}")
+    
+    # Each branch finds the newest reading with one index lookup, then range-scans back from it
+    params = {}
+    branches = []
+    for idx, sensor_code in enumerate(sensor_codes):
+        params[f'sensor_{idx}'] = sensor_code
+        params[f'span_{idx}'] = spans[sensor_code]
+        branches.append(
+            f"(SELECT id, mas_sensor_code, value, received_at AS DateTime FROM {table} "
+            f"WHERE mas_sensor_code = :sensor_{idx} "
+            f"AND received_at >= (SELECT MAX(received_at) FROM {table} "
+            f"WHERE mas_sensor_code = :sensor_{idx}) - INTERVAL :span_{idx} SECOND)"
+        )
+    
+    query = "\nUNION ALL\n".join(branches) + "\nORDER BY DateTime ASC"
+    return query, params
+
+
+def build_input_freshness_query(sensor_codes, table='data_actuals'):
+    """
+    Build the query that fetches the newest reading marker of each sensor
+    
+    Each branch reads one entry of the (mas_sensor_code, received_at) index,
+    so the probe costs about as much as one index lookup per sensor.
+    
+    Returns:
+        Tuple of (SQL string, parameters dict)
+    """
+    params = {}
+    branches = []
+    for idx, sensor_code in enumerate(sensor_codes):
+        params[f'sensor_{idx}'] = sensor_code
+        branches.append(
+            f"(SELECT mas_sensor_code, received_at, id FROM {table} "
+            f"WHERE mas_sensor_code = :sensor_{idx} "
+            f"ORDER BY received_at DESC, id DESC LIMIT 1)"
+        )
+    return "\nUNION ALL\n".join(branches), params
+
+
+def latest_reading_markers(df):
+    """
+    Newest (received_at, id) of each sensor in fetched readings
+    
+    Same markers as DataFetcher.get_input_freshness, but describing the rows
+    a window was actually built from (which may come from a lagging replica).
+    
+    Args:
+        df: Long-format readings with id, mas_sensor_code and DateTime columns
+    
+    Returns:
+        Dictionary of sensor code -> (received_at, id)
+    """
+    latest = df.sort_values(['DateTime', 'id']).groupby('mas_sensor_code').tail(1)
+    return {
+        row.mas_sensor_code: (row.DateTime, row.id)
+        for row in latest.itertuples(index=False)
+    }
+
 
 class DataFetcher:
     """Fetch data from database for training and prediction"""
     
     def __init__(self):
         self.db = get_db()
+        self.metadata_cache = MetadataCache(self.db)
+        self.history_cache = SensorHistoryCache(self.db) if SENSOR_HISTORY_CACHE_ENABLED else None
     
+    @cached_metadata
     def get_active_models(self):
         """Get all active forecasting models from database including configs"""
         try:
-            with self.db.session_scope() as session:
+            with self.db.session_scope(read_only=True) as session:
                 models = session.query(MasModel).filter(
                     MasModel.is_active == True
                 ).all()
@@ -40,10 +175,11 @@ class DataFetcher:
             logger.error(f"Error fetching active models: {e}")
             return []
     
+    @cached_metadata
     def get_model_by_code(self, model_code):
         """Get model configuration by code including architecture and training configs"""
         try:
-            with self.db.session_scope() as session:
+            with self.db.session_scope(read_only=True) as session:
                 model = session.query(MasModel).filter(
                     MasModel.code == model_code
                 ).first()
@@ -65,10 +201,11 @@ class DataFetcher:
             logger.error(f"Error fetching model {model_code}: {e}")
             return None
     
+    @cached_metadata
     def get_sensors_for_model(self, model_code):
         """Get all active sensors using a specific model"""
         try:
-            with self.db.session_scope() as session:
+            with self.db.session_scope(read_only=True) as session:
                 sensors = session.query(MasSensor).filter(
                     and_(
                         MasSensor.mas_model_code == model_code,
@@ -90,10 +227,11 @@ class DataFetcher:
             logger.error(f"Error fetching sensors for model {model_code}: {e}")
             return []
     
+    @cached_metadata
     def get_sensor_by_code(self, sensor_code):
         """Get sensor configuration by code"""
         try:
-            with self.db.session_scope() as session:
+            with self.db.session_scope(read_only=True) as session:
                 sensor = session.query(MasSensor).filter(
                     MasSensor.code == sensor_code
                 ).first()
@@ -126,51 +264,97 @@ class DataFetcher:
             DataFrame with columns for each sensor and DateTime
         """
         try:
-            query = """
-            SELECT 
-                mas_sensor_code,
-                value,
-                received_at as DateTime
-            FROM (
-                SELECT 
-                    mas_sensor_code,
-                    value,
-                    received_at,
-                    ROW_NUMBER() OVER (PARTITION BY mas_sensor_code ORDER BY received_at DESC) as rn
-                FROM data_actuals
-                WHERE mas_sensor_code IN :sensor_codes
-            ) ranked
-            WHERE rn <= :limit
-            ORDER BY DateTime ASC
-            """
-            
-            result_data, result_columns = self.db.execute_query(
-                query,
-                {'sensor_codes': tuple(sensor_codes), 'limit': limit}
-            )
+            # Feature columns are ordered by sensor code
+            sensor_order = sorted(sensor_codes)
             
-            # Convert to DataFrame
-            df = pd.DataFrame(result_data, columns=result_columns)
+            if self.history_cache is not None:
+                # Incremental path: only rows newer than the cached high-water mark hit MySQL
+                readings = self.history_cache.get_readings(sensor_order, limit)
+            else:
+                readings = self._stream_training_readings(sensor_order, limit)
             
-            if df.empty:
+            if len(readings['value']) == 0:
                 logger.warning(f"No data found for sensors: {sensor_codes}")
                 return pd.DataFrame()
             
-            # Pivot to have one column per sensor
-            df_pivot = df.pivot(index='DateTime', columns='mas_sensor_code', values='value')
-            df_pivot.reset_index(inplace=True)
-            df_pivot['DateTime'] = pd.to_datetime(df_pivot['DateTime'])
+            # Snap readings onto the model time grid (one column per sensor)
+            grid = align_to_grid(
+                sensor_order, readings['sensor'], readings['ts'], readings['value'],
+                freq_seconds=TIME_GRID_SECONDS,
+                aggregation=TIME_GRID_AGGREGATION,
+                max_gap=TIME_GRID_MAX_GAP
+            )
             
-            # Sort by DateTime
-            df_pivot.sort_values('DateTime', inplace=True)
-            df_pivot.reset_index(drop=True, inplace=True)
+            complete = grid.complete_rows()
+            if not complete.all():
+                logger.warning(
+                    f"Dropping {int((~complete).sum())} of {len(grid)} grid rows with gaps "
+                    f"longer than {TIME_GRID_MAX_GAP} steps"
+                )
             
-            return df_pivot
+            df_aligned = grid.to_dataframe()[complete]
+            df_aligned.reset_index(drop=True, inplace=True)
+            
+            return df_aligned
             
         except Exception as e:
             logger.error(f"Error fetching training data: {e}")
             return pd.DataFrame()
     
+    def _stream_training_readings(self, sensor_codes, limit):
+        """
+        Stream the most recent readings per sensor straight from data_actuals
+        
+        Returns:
+            Dictionary of arrays: 'sensor' (index into sensor_codes),
+            'ts' (datetime64[s]) and 'value' (float64)
+        """
+        sensor_expression, params = sensor_index_expression(sensor_codes)
+        query = f"""
+        SELECT 
+            {sensor_expression} AS sensor,
+            TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', received_at) AS ts,
+            value
+        FROM (
+            SELECT 
+                mas_sensor_code,
+                value,
+                received_at,
+                ROW_NUMBER() OVER (PARTITION BY mas_sensor_code ORDER BY received_at DESC) as rn
+            FROM data_actuals
+            WHERE mas_sensor_code IN :sensor_codes
+        ) ranked
+        WHERE rn <= :limit
+        """
+        params.update({'sensor_codes': tuple(sensor_codes), 'limit': limit})
+        
+        readings = self.db.stream_arrays(
+            query,
+            [('sensor', np.int64), ('ts', np.int64), ('value', np.float64)],
+            params,
+            expected_rows=limit * len(sensor_codes),
+            read_only=True
+        )
+        readings['ts'] = readings['ts'].view('datetime64[s]')
+        return readings
+    
+    def _align_readings(self, df, sensor_codes, column_order=None):
+        """
+        Align long-format readings (mas_sensor_code, value, DateTime) onto the time grid
+        
+        Columns are ordered by sensor code, matching the column order that
+        existing models were trained with, unless column_order is given.
+        """
+        return align_to_grid(
+            column_order or sorted(sensor_codes),
+            df['mas_sensor_code'].to_numpy(dtype=object),
+            pd.to_datetime(df['DateTime']).to_numpy(),
+            df['value'].astype(np.float64).to_numpy(),
+            freq_seconds=TIME_GRID_SECONDS,
+            aggregation=TIME_GRID_AGGREGATION,
+            max_gap=TIME_GRID_MAX_GAP
+        )
+    
     def get_latest_sensor_data(self, sensor_codes, n_records=5):
         """
         Get the latest N records for specified sensors
@@ -182,51 +366,170 @@ class DataFetcher:
         Returns:
             DataFrame with latest sensor readings
         """
+        grid = self.get_latest_sensor_grid(sensor_codes, n_records)
+        if len(grid) == 0:
+            return pd.DataFrame()
+        return grid.to_dataframe()
+    
+    def get_latest_sensor_grid(self, sensor_codes, n_records=5):
+        """
+        Get the latest N grid rows for specified sensors as an aligned matrix
+        
+        Args:
+            sensor_codes: List of sensor codes
+            n_records: Number of latest records to fetch
+        
+        Returns:
+            AlignedGrid with columns ordered by sensor code, ending at the last
+            row where every sensor is valid (empty on error)
+        """
         try:
-            query = """
-            SELECT 
-                mas_sensor_code,
-                value,
-                received_at as DateTime
-            FROM (
-                SELECT 
-                    mas_sensor_code,
-                    value,
-                    received_at,
-                    ROW_NUMBER() OVER (PARTITION BY mas_sensor_code ORDER BY received_at DESC) as rn
-                FROM data_actuals
-                WHERE mas_sensor_code IN :sensor_codes
-            ) ranked
-            WHERE rn <= :n_records
-            ORDER BY DateTime ASC
-            """
-            
-            result_data, result_columns = self.db.execute_query(
-                query,
-                {'sensor_codes': tuple(sensor_codes), 'n_records': n_records}
+            query, params = build_latest_readings_query(
+                sensor_codes, n_records, strategy=LATEST_DATA_QUERY_STRATEGY
             )
+            result_data, result_columns = self.db.execute_query(query, params, read_only=True)
             
             df = pd.DataFrame(result_data, columns=result_columns)
             
             if df.empty:
                 logger.warning(f"No latest data found for sensors: {sensor_codes}")
-                return pd.DataFrame()
+                return align_to_grid(sorted(sensor_codes), [], [], [], TIME_GRID_SECONDS)
+            
+            # Same window as the predict-all path: the latest rows up to the last complete one
+            grid = self._align_readings(df, sensor_codes)
+            grid.latest_readings = latest_reading_markers(df)
+            grid = grid.window(sorted(sensor_codes), n_records)
             
-            # Pivot to have one column per sensor
-            df_pivot = df.pivot(index='DateTime', columns='mas_sensor_code', values='value')
-            df_pivot.reset_index(inplace=True)
-            df_pivot['DateTime'] = pd.to_datetime(df_pivot['DateTime'])
+            if not grid.mask.all():
+                logger.warning(f"Latest data for sensors {sensor_codes} has unfilled gaps")
             
-            return df_pivot
+            return grid
             
         except Exception as e:
             logger.error(f"Error fetching latest sensor data: {e}")
-            return pd.DataFrame()
+            return align_to_grid(sorted(sensor_codes), [], [], [], TIME_GRID_SECONDS)
+    
+    def get_input_freshness(self, sensor_codes):
+        """
+        Get the newest (received_at, id) of each sensor
+        
+        A cheap probe for whether new readings arrived since a prediction
+        was made, without fetching the input window.
+        
+        Args:
+            sensor_codes: List of sensor codes
+        
+        Returns:
+            Dictionary of sensor code -> (received_at, id) for sensors with data,
+            or None on error
+        """
+        if not sensor_codes:
+            return {}
+        try:
+            query, params = build_input_freshness_query(sensor_codes)
+            result_data, _ = self.db.execute_query(query, params, read_only=True)
+            return {row[0]: (row[1], row[2]) for row in result_data}
+        except Exception as e:
+            logger.error(f"Error probing input freshness: {e}")
+            return None
+    
+    def get_latest_sensor_matrix(self, plan):
+        """
+        Fetch prediction input for every model of a plan in a single query
+        
+        Each sensor is read once with the largest n_steps_in of the models
+        using it. Columns are grouped per model (sorted by sensor code within
+        a model) so AlignedGrid.window() can hand each model a view of its
+        block without copying.
+        
+        Args:
+            plan: PredictionPlan from get_prediction_plan()
+        
+        Returns:
+            AlignedGrid shared by all models of the plan (empty on error)
+        """
+        column_order = []
+        lookbacks = {}
+        for model_plan in plan:
+            n_steps_in = model_plan.config['n_steps_in'] or 0
+            for sensor_code in sorted(model_plan.sensor_codes):
+                if sensor_code not in lookbacks:
+                    column_order.append(sensor_code)
+                    lookbacks[sensor_code] = n_steps_in
+                else:
+                    lookbacks[sensor_code] = max(lookbacks[sensor_code], n_steps_in)
+        
+        empty = align_to_grid(column_order, [], [], [], TIME_GRID_SECONDS)
+        if not column_order:
+            return empty
+        
+        try:
+            query, params = build_latest_readings_query(
+                column_order, lookbacks, strategy=LATEST_DATA_QUERY_STRATEGY
+            )
+            result_data, result_columns = self.db.execute_query(query, params, read_only=True)
+            
+            df = pd.DataFrame(result_data, columns=result_columns)
+            if df.empty:
+                logger.warning(f"No latest data found for {len(column_order)} plan sensors")
+                return empty
+            
+            grid = self._align_readings(df, column_order, column_order=column_order)
+            grid.latest_readings = latest_reading_markers(df)
+            logger.info(
+                f"Shared sensor matrix loaded: {len(grid)} rows x {len(column_order)} sensors "
+                f"from {len(df)} readings"
+            )
+            return grid
+            
+        except Exception as e:
+            logger.error(f"Error fetching shared sensor matrix: {e}")
+            return empty
     
+    def check_data_indexes(self):
+        """
+        Check that data_actuals has an index leading with (mas_sensor_code, received_at)
+        
+        The per-sensor LIMIT query path depends on it; without it every
+        latest-data query falls back to scanning each sensor's history.
+        
+        Returns:
+            Dictionary with 'ok' flag and the matching index name (or None)
+        """
+        try:
+            query = """
+            SELECT INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'data_actuals'
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+            """
+            result_data, _ = self.db.execute_query(query)
+            
+            indexes = {}
+            for index_name, _, column_name in result_data:
+                indexes.setdefault(index_name, []).append(column_name)
+            
+            for index_name, columns in indexes.items():
+                if columns[:2] == ['mas_sensor_code', 'received_at']:
+                    logger.info(f"data_actuals index check passed: {index_name} {columns}")
+                    return {'ok': True, 'index': index_name}
+            
+            logger.warning(
+                "data_actuals has no index on (mas_sensor_code, received_at); "
+                "latest-data queries will scan full sensor history. "
+                "Run the backend migrations to add idx_sensor_received."
+            )
+            return {'ok': False, 'index': None}
+        except Exception as e:
+            logger.error(f"Error checking data_actuals indexes: {e}")
+            return {'ok': False, 'index': None, 'error': str(e)}
+    
+    @cached_metadata
     def get_scalers_for_model(self, model_code):
         """Get scaler file paths for a model"""
         try:
-            with self.db.session_scope() as session:
+            with self.db.session_scope(read_only=True) as session:
                 scalers = session.query(MasScaler).filter(
                     MasScaler.mas_model_code == model_code
                 ).all()
@@ -243,10 +546,91 @@ class DataFetcher:
             logger.error(f"Error fetching scalers for model {model_code}: {e}")
             return {}
     
+    def get_prediction_plan(self):
+        """
+        Get every active model with its active sensors and scalers
+        
+        Loaded with one joined query for models and sensors plus one query for
+        scalers, and cached like the other metadata, so a predict-all cycle
+        costs O(1) metadata queries however many models are active.
+        
+        Returns:
+            Immutable PredictionPlan (empty on error)
+        """
+        plan = self.metadata_cache.get('prediction_plan', self._load_prediction_plan, copy_value=False)
+        return plan or PredictionPlan(models=())
+    
+    def _load_prediction_plan(self):
+        """Load the prediction plan from the database"""
+        try:
+            with self.db.session_scope(read_only=True) as session:
+                rows = session.query(MasModel, MasSensor).outerjoin(
+                    MasSensor,
+                    and_(
+                        MasSensor.mas_model_code == MasModel.code,
+                        MasSensor.is_active == True,
+                        MasSensor.status == 'active'
+                    )
+                ).filter(
+                    MasModel.is_active == True
+                ).order_by(MasModel.id, MasSensor.id).all()
+                
+                configs = {}
+                sensors = {}
+                for m, s in rows:
+                    if m.code not in configs:
+                        configs[m.code] = {
+                            'id': m.id,
+                            'code': m.code,
+                            'name': m.name,
+                            'type': m.type,
+                            'n_steps_in': m.n_steps_in,
+                            'n_steps_out': m.n_steps_out,
+                            'file_path': m.file_path,
+                            'architecture_config': m.architecture_config,
+                            'training_config': m.training_config
+                        }
+                        sensors[m.code] = []
+                    if s is not None:
+                        sensors[m.code].append({
+                            'id': s.id,
+                            'code': s.code,
+                            'name': s.name,
+                            'parameter': s.parameter,
+                            'unit': s.unit,
+                            'device_code': s.mas_device_code,
+                            'forecasting_status': s.forecasting_status
+                        })
+                
+                scalers = {code: {} for code in configs}
+                if configs:
+                    scaler_rows = session.query(MasScaler).filter(
+                        MasScaler.mas_model_code.in_(list(configs))
+                    ).all()
+                    for scaler in scaler_rows:
+                        scalers[scaler.mas_model_code][scaler.scaler_type] = freeze({
+                            'file_path': scaler.file_path,
+                            'scaler_class': scaler.scaler_class
+                        })
+                
+                plan = PredictionPlan(models=tuple(
+                    ModelPlan(
+                        config=freeze(configs[code]),
+                        sensors=tuple(freeze(sensor) for sensor in sensors[code]),
+                        scalers=freeze(scalers[code])
+                    )
+                    for code in configs
+                ))
+                logger.info(f"Prediction plan loaded: {len(plan)} models")
+                return plan
+        except Exception as e:
+            logger.error(f"Error loading prediction plan: {e}")
+            return None
+    
     def get_device_by_code(self, device_code):
         """Get device information by code"""
         try:
-            with self.db.session_scope() as session:
+            with self.db.session_scope(read_only=True) as session:
                 device = session.query(MasDevice).filter(
                     MasDevice.code == device_code
                 ).first()
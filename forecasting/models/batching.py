@@ -0,0 +1,113 @@
+"""
+Request micro-batching for FFWS Forecasting System
+Concurrent single-window predictions of the same model are stacked into one
+batch tensor and run in a single forward pass; each caller gets its own row
+of the output back.
+
+A request that finds its model idle runs at once, so a lone request pays no
+added latency. While a forward pass is in flight, new requests queue up and
+the first of them leads the next batch. It waits until the running pass
+finishes, the batch is full or MICRO_BATCH_WINDOW_MS has passed, whichever
+comes first. No background threads are used: the leading request runs the
+batch on its own thread.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from config.settings import MICRO_BATCH_WINDOW_MS, MICRO_BATCH_MAX_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-window forward passes of one model"""
+    
+    def __init__(self, run_batch, window_ms=MICRO_BATCH_WINDOW_MS, max_batch_size=MICRO_BATCH_MAX_SIZE):
+        """
+        Args:
+            run_batch: Callable running the forward pass on an array (batch, n_steps_in, n_features)
+            window_ms: Longest time a batch waits for more requests
+            max_batch_size: Largest number of windows per forward pass
+        """
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max(max_batch_size, 1)
+        
+        self._cond = threading.Condition()
+        self._pending = []
+        self._leader = False
+        self._running = 0
+        self._stats = {'requests': 0, 'batches': 0, 'batched_requests': 0, 'largest_batch': 0}
+    
+    def predict(self, window):
+        """
+        Forward pass of one window
+        
+        Args:
+            window: Scaled input window (n_steps_in, n_features)
+        
+        Returns:
+            Output row of this window (as run_batch returns it for one batch entry)
+        """
+        future = Future()
+        with self._cond:
+            self._pending.append((window, future))
+            self._stats['requests'] += 1
+            lead = not self._leader
+            if lead:
+                self._leader = True
+            elif len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()
+        
+        if lead:
+            self._lead()
+        return future.result()
+    
+    def _lead(self):
+        """Collect the pending requests and run them"""
+        with self._cond:
+            deadline = time.monotonic() + self.window
+            while self._running and len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            
+            pending = self._pending
+            self._pending = []
+            self._leader = False
+            self._running += 1
+        
+        try:
+            for start in range(0, len(pending), self.max_batch_size):
+                self._run(pending[start:start + self.max_batch_size])
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+    
+    def _run(self, requests):
+        """One forward pass over a list of (window, future)"""
+        try:
+            outputs = self.run_batch(np.stack([window for window, _ in requests]))
+        except Exception as e:
+            logger.error(f"Batched forward pass of {len(requests)} windows failed: {e}")
+            for _, future in requests:
+                future.set_exception(e)
+            return
+        
+        for (_, future), output in zip(requests, outputs):
+            future.set_result(output)
+        
+        with self._cond:
+            self._stats['batches'] += 1
+            if len(requests) > 1:
+                self._stats['batched_requests'] += len(requests)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(requests))
+    
+    def get_stats(self):
+        """Request and batch counters"""
+        with self._cond:
+            return dict(self._stats)
@@ -0,0 +1,161 @@
+"""
+Single-file model bundles for FFWS Forecasting System
+A bundle packs everything needed to serve a model into one file: the
+NumPy-engine layer weights, the x/y scaler parameters and the model
+configuration (type, n_steps_in, n_steps_out, n_features).
+
+Layout (safetensors-style, little endian):
+    8 bytes   magic b'FFWSBNDL'
+    8 bytes   header length (uint64)
+    header    JSON: config, layer specs, scaler parameter names, tensor table
+    data      raw tensor buffers, each aligned to 64 bytes
+
+Loading memory-maps the file and exposes every tensor as a read-only
+NumPy view on the mapping: one open() and no pickle, no copy and no
+TensorFlow. Pages are shared between the gunicorn workers through the
+OS page cache.
+"""
+import json
+import mmap
+import struct
+import numpy as np
+from models.numpy_engine import NumpyModel, extract_layers
+from models.scaling import ArrayScaler
+
+MAGIC = b'FFWSBNDL'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# Scaler attributes stored in a bundle (ArrayScaler)
+SCALER_PARAMS = ('mean', 'scale')
+
+
+def write_bundle(path, config, layers, arrays, scalers):
+    """
+    Write a bundle file
+    
+    Args:
+        path: Output path
+        config: Dictionary with model_code, model_type, n_steps_in, n_steps_out, n_features
+        layers: Layer specs (numpy_engine.extract_layers)
+        arrays: Dictionary of layer weight name -> array
+        scalers: Dictionary of scaler name ('x_scaler', 'y_scaler') -> {'mean', 'scale'} arrays
+    
+    Returns:
+        The output path
+    """
+    tensors = dict(arrays)
+    for scaler_name, params in scalers.items():
+        for param in SCALER_PARAMS:
+            tensors[f"{scaler_name}.{param}"] = params[param]
+    
+    table = {}
+    offset = 0
+    for name, array in tensors.items():
+        array = np.ascontiguousarray(array)
+        tensors[name] = array
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        table[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    
+    header = json.dumps({
+        'format_version': FORMAT_VERSION,
+        'config': config,
+        'layers': layers,
+        'scalers': sorted(scalers),
+        'tensors': table
+    }).encode()
+    # Pad the header so the data section starts aligned
+    header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT)
+    
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        data_start = f.tell()
+        for name, array in tensors.items():
+            f.seek(data_start + table[name]['offset'])
+            f.write(array.tobytes())
+    return path
+
+
+def export_bundle(model, path, model_code, model_type, n_steps_in, n_steps_out, n_features, x_scaler, y_scaler):
+    """
+    Write a bundle for a trained Keras LSTM/GRU/Dense model and its scalers
+    
+    x_scaler and y_scaler are ArrayScalers or fitted sklearn StandardScalers.
+    
+    Raises:
+        UnsupportedModelError: If the model cannot run on the NumPy engine (e.g. TCN)
+    """
+    layers, arrays = extract_layers(model)
+    config = {
+        'model_code': model_code,
+        'model_type': model_type,
+        'n_steps_in': n_steps_in,
+        'n_steps_out': n_steps_out,
+        'n_features': n_features
+    }
+    scalers = {}
+    for scaler_name, scaler in (('x_scaler', x_scaler), ('y_scaler', y_scaler)):
+        if not isinstance(scaler, ArrayScaler):
+            scaler = ArrayScaler.from_sklearn(scaler)
+        scalers[scaler_name] = {'mean': scaler.mean, 'scale': scaler.scale}
+    return write_bundle(path, config, layers, arrays, scalers)
+
+
+class ModelBundle:
+    """Read-only, memory-mapped view of a bundle file"""
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: Bundle file written by write_bundle()
+        
+        Raises:
+            ValueError: If the file is not a bundle or has an unknown format version
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        (header_length,) = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        if header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported bundle format version {header['format_version']}")
+        
+        self.config = header['config']
+        self.layers = header['layers']
+        data_start = header_start + header_length
+        self.tensors = {}
+        for name, info in header['tensors'].items():
+            dtype = np.dtype(info['dtype'])
+            count = int(np.prod(info['shape'], dtype=np.int64))
+            self.tensors[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=data_start + info['offset']
+            ).reshape(info['shape'])
+        self._scaler_names = header['scalers']
+    
+    @property
+    def nbytes(self):
+        """Size of all tensors (mapped, not copied)"""
+        return sum(array.nbytes for array in self.tensors.values())
+    
+    def scaler(self, scaler_name):
+        """ArrayScaler ('x_scaler' or 'y_scaler') over the mapped parameters"""
+        if scaler_name not in self._scaler_names:
+            raise KeyError(f"{self.path} has no {scaler_name}")
+        return ArrayScaler(*(self.tensors[f"{scaler_name}.{param}"] for param in SCALER_PARAMS))
+    
+    def build_engine(self):
+        """NumPy forward pass running directly on the mapped weights"""
+        spec = {
+            'n_steps_in': self.config['n_steps_in'],
+            'n_features': self.config['n_features'],
+            'layers': self.layers
+        }
+        weights = {name: array for name, array in self.tensors.items() if name.startswith('layer')}
+        return NumpyModel.from_arrays(spec, weights)
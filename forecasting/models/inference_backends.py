@@ -0,0 +1,401 @@
+"""
+Inference backends for FFWS Forecasting System
+Run a trained model through Keras, TFLite, ONNX Runtime or the NumPy engine
+behind one predict(batch) interface. TensorFlow is only imported by the
+backends that need it, so workers serving TFLite (via tflite-runtime), ONNX
+or NumPy models never load it.
+"""
+import logging
+import threading
+import numpy as np
+from config.settings import MODELS_DIR, MODEL_EXPORT_FORMATS, FAST_INFERENCE_ENABLED
+from models.numpy_engine import NumpyModel, export_npz, UnsupportedModelError
+from models.bundle import ModelBundle
+from utils.helpers import get_model_filename
+
+logger = logging.getLogger(__name__)
+
+# File extension of each backend's model artifact
+BACKEND_EXTENSIONS = {
+    'keras': '.h5',
+    'tflite': '.tflite',
+    'onnx': '.onnx',
+    'numpy': '.npz',
+    'bundle': '.bundle'
+}
+
+
+def root_mean_squared_error(y_true, y_pred):
+    """Custom RMSE metric for Keras"""
+    from keras import backend as K
+    return K.sqrt(K.mean(K.square(y_pred - y_true)))
+
+
+def build_inference_function(model, n_steps_in, n_features):
+    """
+    Wrap a Keras model in a traced tf.function for low-overhead inference
+    
+    model.predict() builds a data adapter and runs a full predict loop on
+    every call, which costs far more than the forward pass of these small
+    networks. The function is traced once with a fixed input signature
+    (any batch size) and reused for every request.
+    
+    Args:
+        model: Loaded Keras model
+        n_steps_in: Number of input timesteps
+        n_features: Number of input features
+    
+    Returns:
+        Callable taking a float32 tensor (batch, n_steps_in, n_features)
+    """
+    import tensorflow as tf
+    
+    @tf.function(input_signature=[
+        tf.TensorSpec(shape=(None, n_steps_in, n_features), dtype=tf.float32)
+    ])
+    def infer(inputs):
+        return model(inputs, training=False)
+    
+    # Trace now so the first request does not pay for it
+    infer(tf.zeros((1, n_steps_in, n_features), dtype=tf.float32))
+    return infer
+
+
+def load_keras_model(model_path):
+    """Load a Keras .h5 model with the custom objects used in training"""
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.layers import LSTM, GRU
+    
+    custom_objects = {
+        'root_mean_squared_error': root_mean_squared_error,
+        'LSTM': LSTM,
+        'GRU': GRU
+    }
+    
+    # Try to import TCN if available
+    try:
+        from keras_tcn import TCN
+        custom_objects['TCN'] = TCN
+    except ImportError:
+        logger.warning("keras_tcn not available, TCN models won't be supported")
+    
+    return load_model(str(model_path), custom_objects=custom_objects)
+
+
+class KerasBackend:
+    """Full TensorFlow/Keras model, optionally through a traced tf.function"""
+    
+    name = 'keras'
+    
+    def __init__(self, model_path, n_steps_in, n_features, fast_inference=FAST_INFERENCE_ENABLED):
+        self.model = load_keras_model(model_path)
+        self._inference_fn = None
+        
+        # model.predict() is not safe to call from several threads at once
+        self._predict_lock = threading.Lock()
+        
+        if fast_inference:
+            try:
+                self._inference_fn = build_inference_function(self.model, n_steps_in, n_features)
+            except Exception as e:
+                logger.warning(f"Fast inference unavailable for {model_path.name}, using model.predict: {e}")
+    
+    def predict(self, batch):
+        """Run the forward pass on a float32 batch (batch, n_steps_in, n_features)"""
+        if self._inference_fn is not None:
+            import tensorflow as tf
+            return self._inference_fn(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+        with self._predict_lock:
+            return self.model.predict(batch, verbose=0)
+    
+    def memory_bytes(self):
+        """Estimated resident size: float32 weights, doubled for the traced graph and optimizer slots"""
+        return self.model.count_params() * 4 * 2
+
+
+class TFLiteBackend:
+    """TFLite interpreters; uses tflite-runtime when installed, else tf.lite"""
+    
+    name = 'tflite'
+    
+    def __init__(self, model_path, n_steps_in, n_features):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        
+        self._interpreter_class = Interpreter
+        self._model_content = model_path.read_bytes()
+        
+        # One allocated interpreter per batch size: resizing a single one on every
+        # change of the micro-batch size would reallocate its tensors each time
+        self._interpreters = {}
+        self._lock = threading.Lock()
+        
+        # Allocate now so a model this runtime cannot run (e.g. TF ops without
+        # the Flex delegate) fails to load instead of failing its first request
+        interpreter, _ = self._get_interpreter(1)
+        self._input_index = interpreter.get_input_details()[0]['index']
+        self._output_index = interpreter.get_output_details()[0]['index']
+    
+    def _get_interpreter(self, batch_size):
+        """(interpreter, lock) allocated for a batch size, created on first use"""
+        with self._lock:
+            entry = self._interpreters.get(batch_size)
+            if entry is None:
+                interpreter = self._interpreter_class(model_content=self._model_content)
+                input_details = interpreter.get_input_details()[0]
+                if int(input_details['shape'][0]) != batch_size:
+                    shape = [batch_size, *input_details['shape'][1:]]
+                    interpreter.resize_tensor_input(input_details['index'], shape)
+                interpreter.allocate_tensors()
+                
+                # An interpreter holds mutable tensor buffers and must not be shared by threads
+                entry = (interpreter, threading.Lock())
+                self._interpreters[batch_size] = entry
+            return entry
+    
+    def predict(self, batch):
+        """Run the forward pass on a float32 batch (batch, n_steps_in, n_features)"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        n_windows = batch.shape[0]
+        
+        # Pad to a power of two so varying micro-batch sizes share a few interpreters
+        batch_size = 1 << (n_windows - 1).bit_length()
+        if batch_size != n_windows:
+            padding = np.zeros((batch_size - n_windows, *batch.shape[1:]), dtype=np.float32)
+            batch = np.concatenate([batch, padding])
+        
+        interpreter, lock = self._get_interpreter(batch_size)
+        with lock:
+            interpreter.set_tensor(self._input_index, batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(self._output_index)[:n_windows].copy()
+    
+    def memory_bytes(self):
+        """Estimated resident size: the flatbuffer plus activation arenas of each interpreter"""
+        with self._lock:
+            return len(self._model_content) * (1 + len(self._interpreters))
+
+
+class ONNXBackend:
+    """ONNX Runtime inference session"""
+    
+    name = 'onnx'
+    
+    def __init__(self, model_path, n_steps_in, n_features):
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self._input_name = self.session.get_inputs()[0].name
+        self._file_size = model_path.stat().st_size
+    
+    def predict(self, batch):
+        """Run the forward pass on a float32 batch (batch, n_steps_in, n_features)"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+    
+    def memory_bytes(self):
+        """Estimated resident size: the model plus optimized graph copies"""
+        return self._file_size * 2
+
+
+class NumpyBackend:
+    """Pure-NumPy LSTM/GRU/Dense engine (no TensorFlow, batches many windows per call)"""
+    
+    name = 'numpy'
+    
+    def __init__(self, model_path, n_steps_in, n_features):
+        self.model = None
+        self.engine = NumpyModel(model_path)
+        if (self.engine.n_steps_in, self.engine.n_features) != (n_steps_in, n_features):
+            raise ValueError(
+                f"{model_path.name} expects ({self.engine.n_steps_in}, {self.engine.n_features}) "
+                f"inputs, model config has ({n_steps_in}, {n_features})"
+            )
+    
+    def predict(self, batch):
+        """Run the forward pass on a float32 batch (batch, n_steps_in, n_features)"""
+        return self.engine.predict(batch)
+    
+    def memory_bytes(self):
+        """Size of the weight arrays"""
+        return self.engine.nbytes
+
+
+class BundleBackend:
+    """NumPy engine over a memory-mapped single-file bundle that also carries the scalers"""
+    
+    name = 'bundle'
+    
+    def __init__(self, model_path, n_steps_in, n_features):
+        self.model = None
+        self.bundle = ModelBundle(model_path)
+        config = self.bundle.config
+        if (config['n_steps_in'], config['n_features']) != (n_steps_in, n_features):
+            raise ValueError(
+                f"{model_path.name} expects ({config['n_steps_in']}, {config['n_features']}) "
+                f"inputs, model config has ({n_steps_in}, {n_features})"
+            )
+        self.engine = self.bundle.build_engine()
+    
+    def predict(self, batch):
+        """Run the forward pass on a float32 batch (batch, n_steps_in, n_features)"""
+        return self.engine.predict(batch)
+    
+    def memory_bytes(self):
+        """Size of the mapped tensors (shared between workers through the page cache)"""
+        return self.bundle.nbytes
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': ONNXBackend,
+    'numpy': NumpyBackend,
+    'bundle': BundleBackend
+}
+
+
+def get_artifact_path(model_code, backend_name, directory=None):
+    """Path of the model artifact a backend loads (from a registry version directory or MODELS_DIR)"""
+    return (directory or MODELS_DIR) / get_model_filename(model_code, BACKEND_EXTENSIONS[backend_name])
+
+
+def artifact_paths(model_code, directory=None):
+    """Every model artifact a backend may load for a model, existing or not"""
+    return [get_artifact_path(model_code, backend_name, directory) for backend_name in BACKEND_EXTENSIONS]
+
+
+def load_backend(backend_name, model_code, n_steps_in, n_features, directory=None, check_artifact=None):
+    """
+    Load a model through the requested backend
+    
+    Falls back to the Keras backend when the requested artifact has not
+    been exported yet, its runtime is not installed or it fails to load.
+    
+    Args:
+        backend_name: 'keras', 'tflite', 'onnx', 'numpy' or 'bundle'
+        model_code: Model code
+        n_steps_in: Number of input timesteps
+        n_features: Number of input features
+        directory: Registry version directory (default: legacy MODELS_DIR)
+        check_artifact: Optional callable(path) run before an artifact is loaded,
+                        e.g. a registry hash check; its errors are not caught
+    
+    Returns:
+        Backend instance with a predict(batch) method
+    """
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend: {backend_name}")
+    
+    if backend_name != 'keras':
+        model_path = get_artifact_path(model_code, backend_name, directory)
+        if model_path.exists():
+            if check_artifact is not None:
+                check_artifact(model_path)
+            try:
+                return BACKENDS[backend_name](model_path, n_steps_in, n_features)
+            except ImportError as e:
+                logger.warning(f"{backend_name} runtime not installed, using keras for {model_code}: {e}")
+            except UnsupportedModelError as e:
+                logger.warning(f"{model_path.name} cannot run on the NumPy engine, using keras: {e}")
+            except Exception as e:
+                logger.warning(f"Could not load {model_path.name} with {backend_name}, using keras: {e}")
+        else:
+            logger.warning(f"{model_path.name} not exported, using keras for {model_code}")
+    
+    model_path = get_artifact_path(model_code, 'keras', directory)
+    if not model_path.exists():
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    if check_artifact is not None:
+        check_artifact(model_path)
+    return KerasBackend(model_path, n_steps_in, n_features)
+
+
+def export_tflite(model, path, n_steps_in, n_features):
+    """Convert a Keras model to a .tflite file"""
+    import tensorflow as tf
+    
+    # A concrete function with a fixed signature lets recurrent layers fuse into TFLite kernels
+    concrete_fn = tf.function(
+        lambda inputs: model(inputs, training=False)
+    ).get_concrete_function(tf.TensorSpec((1, n_steps_in, n_features), tf.float32))
+    
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_fn], model)
+    try:
+        tflite_model = converter.convert()
+    except Exception as e:
+        # Layers without a builtin kernel (e.g. some TCN ops) need the Flex delegate
+        logger.warning(f"Builtin-only TFLite conversion failed for {path.name}, adding TF ops: {e}")
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_fn], model)
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS
+        ]
+        tflite_model = converter.convert()
+    
+    path.write_bytes(tflite_model)
+    return path
+
+
+def export_onnx(model, path, n_steps_in, n_features):
+    """Convert a Keras model to a .onnx file"""
+    import tensorflow as tf
+    import tf2onnx
+    
+    tf2onnx.convert.from_keras(
+        model,
+        input_signature=[tf.TensorSpec((None, n_steps_in, n_features), tf.float32, name='input')],
+        opset=13,
+        output_path=str(path)
+    )
+    return path
+
+
+EXPORTERS = {
+    'tflite': export_tflite,
+    'onnx': export_onnx,
+    'numpy': export_npz
+}
+
+
+def export_model(model, model_code, n_steps_in, n_features, formats=None, directory=None):
+    """
+    Export a trained Keras model for the lighter inference backends
+    
+    Export failures are logged and skipped; the .h5 model stays usable.
+    
+    Args:
+        model: Trained Keras model
+        model_code: Model code
+        n_steps_in: Number of input timesteps
+        n_features: Number of input features
+        formats: List of formats (default: MODEL_EXPORT_FORMATS)
+        directory: Output directory, e.g. a registry staging directory (default: MODELS_DIR)
+    
+    Returns:
+        Dictionary of format -> exported file path
+    """
+    exported = {}
+    for export_format in (MODEL_EXPORT_FORMATS if formats is None else formats):
+        if export_format == 'bundle':
+            # Needs the fitted scalers; written by train_model
+            continue
+        
+        exporter = EXPORTERS.get(export_format)
+        if exporter is None:
+            logger.warning(f"Unknown model export format: {export_format}")
+            continue
+        
+        try:
+            path = get_artifact_path(model_code, export_format, directory)
+            exported[export_format] = str(exporter(model, path, n_steps_in, n_features))
+            logger.info(f"Model exported: {exported[export_format]}")
+        except Exception as e:
+            logger.warning(f"Could not export {model_code} to {export_format}: {e}")
+    return exported
@@ -0,0 +1,326 @@
+"""
+Pure-NumPy inference engine for FFWS Forecasting System
+Serves the LSTM/GRU + Dropout + Dense stacks built in training.py from an
+.npz weight file, without importing TensorFlow. The input projection of
+every timestep is computed in one matrix product and only the recurrent
+part runs step by step, for a whole batch of windows at once.
+"""
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Layers that only matter during training
+PASSTHROUGH_LAYERS = ('InputLayer', 'Dropout')
+
+
+class UnsupportedModelError(ValueError):
+    """The model has a layer, activation or option the NumPy engine cannot run"""
+
+
+def sigmoid(x):
+    """Numerically stable logistic function"""
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def hard_sigmoid(x):
+    """Keras hard_sigmoid"""
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0.0),
+    'tanh': np.tanh,
+    'sigmoid': sigmoid,
+    'hard_sigmoid': hard_sigmoid
+}
+
+
+def get_activation(name):
+    """Look up an activation function by its Keras name"""
+    if name not in ACTIVATIONS:
+        raise UnsupportedModelError(f"Activation not supported by the NumPy engine: {name}")
+    return ACTIVATIONS[name]
+
+
+def extract_layers(model):
+    """
+    Read the layer specs and weights of a Keras LSTM/GRU/Dense stack
+    
+    Args:
+        model: Trained Keras Sequential model
+    
+    Returns:
+        (list of layer specs, dictionary of "layer<i>_<weight>" -> float32 array)
+    
+    Raises:
+        UnsupportedModelError: If the model has a layer the engine cannot run (e.g. TCN)
+    """
+    layers = []
+    arrays = {}
+    
+    for layer in model.layers:
+        layer_type = type(layer).__name__
+        if layer_type in PASSTHROUGH_LAYERS:
+            continue
+        
+        config = layer.get_config()
+        weights = layer.get_weights()
+        prefix = f"layer{len(layers)}"
+        
+        if layer_type == 'LSTM':
+            entry = {
+                'type': 'LSTM',
+                'units': config['units'],
+                'activation': config['activation'],
+                'recurrent_activation': config['recurrent_activation'],
+                'return_sequences': config['return_sequences']
+            }
+            names = ('kernel', 'recurrent_kernel', 'bias')
+        elif layer_type == 'GRU':
+            entry = {
+                'type': 'GRU',
+                'units': config['units'],
+                'activation': config['activation'],
+                'recurrent_activation': config['recurrent_activation'],
+                'return_sequences': config['return_sequences'],
+                'reset_after': config.get('reset_after', True)
+            }
+            names = ('kernel', 'recurrent_kernel', 'bias')
+        elif layer_type == 'Dense':
+            entry = {'type': 'Dense', 'units': config['units'], 'activation': config['activation']}
+            names = ('kernel', 'bias')
+        else:
+            raise UnsupportedModelError(f"Layer not supported by the NumPy engine: {layer_type}")
+        
+        if config.get('go_backwards') or config.get('stateful') or not config.get('use_bias', True):
+            raise UnsupportedModelError(f"Unsupported {layer_type} options in layer {layer.name}")
+        
+        get_activation(entry['activation'])
+        if 'recurrent_activation' in entry:
+            get_activation(entry['recurrent_activation'])
+        
+        for name, weight in zip(names, weights):
+            arrays[f"{prefix}_{name}"] = np.asarray(weight, dtype=np.float32)
+        layers.append(entry)
+    
+    if not layers:
+        raise UnsupportedModelError("Model has no layers the NumPy engine can run")
+    return layers, arrays
+
+
+def export_npz(model, path, n_steps_in=None, n_features=None):
+    """
+    Dump the weights of a Keras LSTM/GRU/Dense stack to an .npz file
+    
+    Args:
+        model: Trained Keras Sequential model
+        path: Output .npz path
+        n_steps_in: Number of input timesteps (default: from the model)
+        n_features: Number of input features (default: from the model)
+    
+    Returns:
+        The output path
+    
+    Raises:
+        UnsupportedModelError: If the model has a layer the engine cannot run (e.g. TCN)
+    """
+    _, model_steps, model_features = model.input_shape
+    layers, arrays = extract_layers(model)
+    spec = {
+        'n_steps_in': n_steps_in or model_steps,
+        'n_features': n_features or model_features,
+        'layers': layers
+    }
+    
+    # The spec is stored as a plain string so the file loads with allow_pickle=False
+    np.savez(path, spec=np.array(json.dumps(spec)), **arrays)
+    return path
+
+
+class NumpyModel:
+    """Forward pass of an exported LSTM/GRU/Dense stack"""
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: .npz file written by export_npz()
+        """
+        with np.load(path, allow_pickle=False) as data:
+            spec = json.loads(str(data['spec']))
+            self._build(spec, {key: data[key] for key in data.files if key != 'spec'})
+    
+    @classmethod
+    def from_arrays(cls, spec, arrays):
+        """
+        Build the engine from a spec and named weight arrays
+        
+        The arrays are used as they are, so read-only memory-mapped views
+        (see models/bundle.py) are never copied.
+        
+        Args:
+            spec: Dictionary with n_steps_in, n_features and layers (as written by export_npz)
+            arrays: Dictionary of "layer<i>_<weight>" -> array
+        """
+        engine = cls.__new__(cls)
+        engine._build(spec, arrays)
+        return engine
+    
+    def _build(self, spec, arrays):
+        """Prepare every layer from its spec and weights"""
+        self.n_steps_in = spec['n_steps_in']
+        self.n_features = spec['n_features']
+        self.layers = []
+        for idx, entry in enumerate(spec['layers']):
+            prefix = f"layer{idx}_"
+            weights = {key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)}
+            self.layers.append(self._prepare_layer(entry, weights))
+    
+    @property
+    def nbytes(self):
+        """Total size of the weight arrays (GRU bias halves are views, not counted)"""
+        return sum(
+            value.nbytes for layer in self.layers for key, value in layer.items()
+            if isinstance(value, np.ndarray) and key not in ('input_bias', 'recurrent_bias')
+        )
+    
+    def _prepare_layer(self, entry, weights):
+        """Attach weights and activation functions to a layer spec"""
+        layer = dict(entry)
+        layer.update(weights)
+        layer['act'] = get_activation(entry['activation'])
+        if 'recurrent_activation' in entry:
+            layer['recurrent_act'] = get_activation(entry['recurrent_activation'])
+        
+        if entry['type'] == 'GRU' and entry['reset_after']:
+            # Keras stores (input bias, recurrent bias) as a (2, 3 * units) array
+            layer['input_bias'] = layer['bias'][0]
+            layer['recurrent_bias'] = layer['bias'][1]
+        return layer
+    
+    def fold_scalers(self, x_scaler=None, y_scaler=None):
+        """
+        Fold standard scaling into the first and last layers
+        
+        (x - mean) / scale is absorbed into the input kernel and bias of the
+        first layer, and the inverse output scaling into a final linear Dense
+        layer, so predict() takes raw values and returns unscaled ones. Only
+        the affected weight arrays are copied. Call at most once per engine.
+        
+        Args:
+            x_scaler: Input scaler with mean/scale arrays (one per feature), or None
+            y_scaler: Output scaler with mean/scale arrays (one per feature,
+                repeated over the flattened output steps), or None
+        
+        Returns:
+            (input folded, output folded)
+        """
+        input_folded = output_folded = False
+        
+        first = self.layers[0]
+        if x_scaler is not None and len(x_scaler.mean) == first['kernel'].shape[0]:
+            kernel = first['kernel'].astype(np.float64)
+            bias_key = 'input_bias' if 'input_bias' in first else 'bias'
+            shift = (x_scaler.mean / x_scaler.scale) @ kernel
+            first[bias_key] = (first[bias_key] - shift).astype(np.float32)
+            first['kernel'] = (kernel / x_scaler.scale[:, np.newaxis]).astype(np.float32)
+            input_folded = True
+        
+        last = self.layers[-1]
+        if (
+            y_scaler is not None and last['type'] == 'Dense' and last['activation'] == 'linear'
+            and last['units'] % len(y_scaler.mean) == 0
+        ):
+            repeats = last['units'] // len(y_scaler.mean)
+            scale = np.tile(y_scaler.scale, repeats)
+            mean = np.tile(y_scaler.mean, repeats)
+            last['kernel'] = (last['kernel'] * scale).astype(np.float32)
+            last['bias'] = (last['bias'] * scale + mean).astype(np.float32)
+            output_folded = True
+        
+        return input_folded, output_folded
+    
+    def _lstm(self, layer, x):
+        """LSTM over (batch, steps, features); Keras gate order i, f, c, o"""
+        batch, steps, _ = x.shape
+        units = layer['units']
+        act, recurrent_act = layer['act'], layer['recurrent_act']
+        recurrent_kernel = layer['recurrent_kernel']
+        
+        projected = x @ layer['kernel'] + layer['bias']
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        outputs = np.empty((batch, steps, units), dtype=np.float32) if layer['return_sequences'] else None
+        
+        for t in range(steps):
+            gates = projected[:, t] + h @ recurrent_kernel
+            i = recurrent_act(gates[:, :units])
+            f = recurrent_act(gates[:, units:2 * units])
+            g = act(gates[:, 2 * units:3 * units])
+            o = recurrent_act(gates[:, 3 * units:])
+            c = f * c + i * g
+            h = o * act(c)
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+    
+    def _gru(self, layer, x):
+        """GRU over (batch, steps, features); Keras gate order z, r, h"""
+        batch, steps, _ = x.shape
+        units = layer['units']
+        act, recurrent_act = layer['act'], layer['recurrent_act']
+        recurrent_kernel = layer['recurrent_kernel']
+        reset_after = layer['reset_after']
+        
+        if reset_after:
+            projected = x @ layer['kernel'] + layer['input_bias']
+            recurrent_bias = layer['recurrent_bias']
+        else:
+            projected = x @ layer['kernel'] + layer['bias']
+            recurrent_zr = recurrent_kernel[:, :2 * units]
+            recurrent_h = recurrent_kernel[:, 2 * units:]
+        
+        h = np.zeros((batch, units), dtype=np.float32)
+        outputs = np.empty((batch, steps, units), dtype=np.float32) if layer['return_sequences'] else None
+        
+        for t in range(steps):
+            x_t = projected[:, t]
+            if reset_after:
+                h_proj = h @ recurrent_kernel + recurrent_bias
+                z = recurrent_act(x_t[:, :units] + h_proj[:, :units])
+                r = recurrent_act(x_t[:, units:2 * units] + h_proj[:, units:2 * units])
+                candidate = act(x_t[:, 2 * units:] + r * h_proj[:, 2 * units:])
+            else:
+                h_proj = h @ recurrent_zr
+                z = recurrent_act(x_t[:, :units] + h_proj[:, :units])
+                r = recurrent_act(x_t[:, units:] + h_proj[:, units:])
+                candidate = act(x_t[:, 2 * units:] + (r * h) @ recurrent_h)
+            h = z * h + (1.0 - z) * candidate
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+    
+    def predict(self, batch):
+        """
+        Run the forward pass
+        
+        Args:
+            batch: Array of shape (batch, n_steps_in, n_features)
+        
+        Returns:
+            float32 array of shape (batch, output units)
+        """
+        x = np.asarray(batch, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[np.newaxis]
+        
+        for layer in self.layers:
+            if layer['type'] == 'LSTM':
+                x = self._lstm(layer, x)
+            elif layer['type'] == 'GRU':
+                x = self._gru(layer, x)
+            else:
+                x = layer['act'](x @ layer['kernel'] + layer['bias'])
+        return x
@@ -0,0 +1,351 @@
+"""
+Versioned model artifact registry for FFWS Forecasting System
+Every training run is published as an immutable version directory,
+storage/registry/<code>/versions/<version>. It holds the model, its exports,
+the scalers and a metadata.json with file hashes. A CURRENT file names the
+live version and is replaced atomically, so a loader never reads a
+half-written model or pairs a model with the scalers of another run.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from config.settings import MODEL_REGISTRY_DIR, MODEL_REGISTRY_KEEP_VERSIONS, MODEL_REGISTRY_VERIFY
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = 'metadata.json'
+CURRENT_FILE = 'CURRENT'
+STAGING_PREFIX = '.staging-'
+
+# Staging directories left behind by crashed training runs are removed after this long
+STALE_STAGING_SECONDS = 24 * 3600
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fsync_path(path):
+    """Flush a file or directory to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ModelVersion:
+    """One published, immutable version of a model"""
+    
+    def __init__(self, model_code, version_id, directory, metadata):
+        self.model_code = model_code
+        self.version_id = version_id
+        self.directory = directory
+        self.metadata = metadata
+    
+    @property
+    def content_hash(self):
+        """Hash over the hashes of every file in the version"""
+        return self.metadata['content_hash']
+    
+    @property
+    def files(self):
+        """Dictionary of file name -> {'sha256', 'size'}"""
+        return self.metadata['files']
+    
+    def path(self, filename):
+        """Path of a file inside the version directory"""
+        return self.directory / filename
+    
+    def to_dict(self):
+        """Summary for logs and API responses"""
+        return {
+            'model_code': self.model_code,
+            'version': self.version_id,
+            'content_hash': self.content_hash,
+            'created_at': self.metadata.get('created_at'),
+            'files': sorted(self.files)
+        }
+
+
+class ModelRegistry:
+    """
+    Publish, resolve and garbage-collect model versions
+    
+    Layout:
+        <root>/<code>/CURRENT                     live version id
+        <root>/<code>/versions/<version>/         model, exports, scalers, metadata.json
+        <root>/<code>/.staging-<id>/              training output before publishing
+    """
+    
+    def __init__(self, root=MODEL_REGISTRY_DIR, keep_versions=MODEL_REGISTRY_KEEP_VERSIONS):
+        """
+        Args:
+            root: Registry root directory
+            keep_versions: Versions kept per model on garbage collection (the current one always is)
+        """
+        self.root = root
+        self.keep_versions = max(keep_versions, 1)
+        
+        # (model_code, version, file name) already checked by this process; versions are immutable
+        self._verified = set()
+        self._verify_stats = {'files': 0, 'bytes': 0, 'seconds': 0.0}
+    
+    def _model_dir(self, model_code):
+        return self.root / model_code
+    
+    def _versions_dir(self, model_code):
+        return self.root / model_code / 'versions'
+    
+    def create_staging(self, model_code):
+        """
+        Create an empty private directory for a training run to write into
+        
+        Returns:
+            Path of the staging directory
+        """
+        staging_dir = self._model_dir(model_code) / f"{STAGING_PREFIX}{uuid.uuid4().hex}"
+        staging_dir.mkdir(parents=True)
+        return staging_dir
+    
+    def discard_staging(self, staging_dir):
+        """Remove a staging directory after a failed training run"""
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    def publish(self, model_code, staging_dir, metadata=None, activate=True):
+        """
+        Turn a staging directory into a new immutable version
+        
+        The files are hashed and flushed to disk, the directory is renamed
+        into versions/ and CURRENT is then swapped to point at it. Readers
+        see either the previous version or the complete new one.
+        
+        Args:
+            model_code: Model code
+            staging_dir: Directory from create_staging() holding the artifacts
+            metadata: Extra metadata stored with the version (training config, metrics)
+            activate: Make the new version current
+        
+        Returns:
+            ModelVersion
+        """
+        files = {}
+        for path in sorted(staging_dir.iterdir()):
+            if path.name == METADATA_FILE or not path.is_file():
+                continue
+            _fsync_path(path)
+            files[path.name] = {'sha256': file_sha256(path), 'size': path.stat().st_size}
+        
+        if not files:
+            raise ValueError(f"Nothing to publish for {model_code}: {staging_dir} is empty")
+        
+        content_hash = hashlib.sha256(
+            ''.join(f"{name}:{info['sha256']}\n" for name, info in sorted(files.items())).encode()
+        ).hexdigest()
+        created_at = datetime.now(timezone.utc)
+        version_id = f"{created_at:%Y%m%dT%H%M%S}Z-{content_hash[:12]}"
+        
+        version_metadata = dict(metadata or {})
+        version_metadata.update({
+            'model_code': model_code,
+            'version': version_id,
+            'created_at': created_at.isoformat(),
+            'content_hash': content_hash,
+            'files': files
+        })
+        with open(staging_dir / METADATA_FILE, 'w') as f:
+            json.dump(version_metadata, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_path(staging_dir)
+        
+        versions_dir = self._versions_dir(model_code)
+        versions_dir.mkdir(parents=True, exist_ok=True)
+        version_dir = versions_dir / version_id
+        if version_dir.exists():
+            # Identical artifacts published twice within a second: keep the first copy
+            self.discard_staging(staging_dir)
+        else:
+            os.rename(staging_dir, version_dir)
+            _fsync_path(versions_dir)
+            logger.info(f"Published {model_code} version {version_id}")
+        
+        if activate:
+            self.activate(model_code, version_id)
+        self.collect_garbage(model_code)
+        return ModelVersion(model_code, version_id, version_dir, version_metadata)
+    
+    def activate(self, model_code, version_id):
+        """
+        Point CURRENT at a published version (also used to roll back)
+        
+        Raises:
+            FileNotFoundError: If the version does not exist
+        """
+        if not (self._versions_dir(model_code) / version_id / METADATA_FILE).exists():
+            raise FileNotFoundError(f"Version {version_id} of model {model_code} not found")
+        
+        model_dir = self._model_dir(model_code)
+        tmp_path = model_dir / f"{CURRENT_FILE}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(version_id)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, model_dir / CURRENT_FILE)
+        _fsync_path(model_dir)
+        logger.info(f"Model {model_code} now serves version {version_id}")
+    
+    def current_version_id(self, model_code):
+        """Version id CURRENT points at, or None if the model was never published"""
+        try:
+            return (self._model_dir(model_code) / CURRENT_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def list_versions(self, model_code):
+        """Published version ids, oldest first"""
+        versions_dir = self._versions_dir(model_code)
+        if not versions_dir.exists():
+            return []
+        return sorted(path.name for path in versions_dir.iterdir() if (path / METADATA_FILE).exists())
+    
+    def resolve(self, model_code, version_id=None):
+        """
+        Look up a version
+        
+        Args:
+            model_code: Model code
+            version_id: Exact version (default: the current one)
+        
+        Returns:
+            ModelVersion, or None if the model has no current version
+        
+        Raises:
+            FileNotFoundError: If an explicitly requested version does not exist
+        """
+        if version_id is None:
+            version_id = self.current_version_id(model_code)
+            if version_id is None:
+                return None
+        
+        version_dir = self._versions_dir(model_code) / version_id
+        try:
+            with open(version_dir / METADATA_FILE) as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Version {version_id} of model {model_code} not found")
+        return ModelVersion(model_code, version_id, version_dir, metadata)
+    
+    def verify(self, version, names=None):
+        """
+        Check files of a version against their recorded hashes
+        
+        Files this process already verified are not hashed again.
+        
+        Args:
+            version: ModelVersion
+            names: File names to check (default: every file of the version)
+        
+        Raises:
+            ValueError: If a file is missing, truncated, modified or not part of the version
+        """
+        for name in (version.files if names is None else names):
+            key = (version.model_code, version.version_id, name)
+            if key in self._verified:
+                continue
+            
+            started = time.perf_counter()
+            info = version.files.get(name)
+            path = version.path(name)
+            if (info is None or not path.exists() or path.stat().st_size != info['size']
+                    or file_sha256(path) != info['sha256']):
+                raise ValueError(f"{version.model_code} version {version.version_id}: {name} is corrupt or missing")
+            self._verified.add(key)
+            
+            self._verify_stats['files'] += 1
+            self._verify_stats['bytes'] += info['size']
+            self._verify_stats['seconds'] += time.perf_counter() - started
+    
+    def get_verify_stats(self):
+        """Files hashed by verify() in this process, their total size and the time it took"""
+        return dict(self._verify_stats)
+    
+    def prefetch(self, model_code, version_id=None, names=None, verify=MODEL_REGISTRY_VERIFY):
+        """
+        Resolve a version and read the files about to be loaded
+        
+        Reading the files pulls them into the OS page cache, so the following
+        load does not wait on disk. With verify, the same pass checks the
+        hashes so a corrupt file is rejected before it is deserialized.
+        
+        Args:
+            model_code: Model code
+            version_id: Exact version (default: the current one)
+            names: File names the loader will open (default: every file);
+                   names the version does not contain are skipped
+            verify: Check the hashes of these files
+        
+        Returns:
+            ModelVersion, or None if the model has no current version
+        """
+        version = self.resolve(model_code, version_id)
+        if version is None:
+            return None
+        
+        names = [name for name in (version.files if names is None else names) if name in version.files]
+        if verify:
+            self.verify(version, names)
+        else:
+            for name in names:
+                with open(version.path(name), 'rb') as f:
+                    while f.read(1024 * 1024):
+                        pass
+        return version
+    
+    def collect_garbage(self, model_code, keep=None):
+        """
+        Delete old versions and abandoned staging directories
+        
+        The newest `keep` versions and the current one are kept.
+        
+        Returns:
+            List of removed version ids
+        """
+        keep = self.keep_versions if keep is None else max(keep, 1)
+        current = self.current_version_id(model_code)
+        versions = self.list_versions(model_code)
+        
+        removed = []
+        for version_id in versions[:-keep]:
+            if version_id == current:
+                continue
+            shutil.rmtree(self._versions_dir(model_code) / version_id, ignore_errors=True)
+            removed.append(version_id)
+        
+        model_dir = self._model_dir(model_code)
+        for path in model_dir.glob(f"{STAGING_PREFIX}*"):
+            if time.time() - path.stat().st_mtime > STALE_STAGING_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        
+        if removed:
+            logger.info(f"Removed old versions of {model_code}: {removed}")
+        return removed
+
+
+# Global registry instance
+model_registry = ModelRegistry()
+
+
+def get_model_registry():
+    """Get model registry instance"""
+    return model_registry
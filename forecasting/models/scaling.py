@@ -0,0 +1,129 @@
+"""
+Array scalers for FFWS Forecasting System
+Standardization parameters kept as plain mean/scale arrays and applied with
+in-place NumPy operations, without sklearn's per-call input validation.
+Scalers are stored as .npz files (no pickle); legacy StandardScaler pickles
+are converted the first time they are loaded.
+"""
+import logging
+import os
+import uuid
+import numpy as np
+from utils.helpers import load_pickle, get_scaler_filename
+
+logger = logging.getLogger(__name__)
+
+SCALER_EXTENSION = '.npz'
+LEGACY_SCALER_EXTENSION = '.pkl'
+
+
+class ArrayScaler:
+    """Standard scaling, (x - mean) / scale, over the last axis"""
+    
+    def __init__(self, mean, scale):
+        """
+        Args:
+            mean: Per-feature mean
+            scale: Per-feature standard deviation (zero-variance features already set to 1)
+        """
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+    
+    @property
+    def n_features(self):
+        """Number of features the scaler was fitted on"""
+        return len(self.mean)
+    
+    @classmethod
+    def from_sklearn(cls, scaler):
+        """Convert a fitted sklearn StandardScaler"""
+        n_features = scaler.n_features_in_
+        mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n_features)
+        return cls(mean, scale)
+    
+    def transform(self, x, copy=True):
+        """
+        Scale x
+        
+        Args:
+            x: Array with features on the last axis
+            copy: With False, a float64 input is scaled in place
+        
+        Returns:
+            Scaled float64 array
+        """
+        out = np.array(x, dtype=np.float64) if copy else np.asarray(x, dtype=np.float64)
+        np.subtract(out, self.mean, out=out)
+        np.divide(out, self.scale, out=out)
+        return out
+    
+    def inverse_transform(self, x, copy=True):
+        """Undo transform(); same arguments"""
+        out = np.array(x, dtype=np.float64) if copy else np.asarray(x, dtype=np.float64)
+        np.multiply(out, self.scale, out=out)
+        np.add(out, self.mean, out=out)
+        return out
+    
+    def save(self, path):
+        """Write the parameters to an .npz file (atomically replaced)"""
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, mean=self.mean, scale=self.scale)
+        os.replace(tmp_path, path)
+        return path
+    
+    @classmethod
+    def load(cls, path):
+        """Read parameters written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['mean'], data['scale'])
+
+
+def load_scaler(directory, model_code, scaler_type, save_converted=True):
+    """
+    Load a model's scaler, converting a legacy pickle on first use
+    
+    The .npz is used unless the legacy .pkl is newer (the pickle was
+    replaced after it was converted), in which case the pickle is converted
+    again.
+    
+    Args:
+        directory: Directory holding the scaler files
+        model_code: Model code
+        scaler_type: 'x_scaler' or 'y_scaler'
+        save_converted: Write the converted .npz next to the pickle; False for
+                        directories that must not change (published registry versions)
+    
+    Returns:
+        ArrayScaler
+    
+    Raises:
+        FileNotFoundError: If neither the .npz nor the legacy .pkl exists
+    """
+    path = directory / get_scaler_filename(model_code, scaler_type, SCALER_EXTENSION)
+    legacy_path = directory / get_scaler_filename(model_code, scaler_type, LEGACY_SCALER_EXTENSION)
+    
+    try:
+        legacy_mtime = legacy_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        legacy_mtime = None
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    
+    if mtime is not None and (legacy_mtime is None or mtime >= legacy_mtime):
+        return ArrayScaler.load(path)
+    if legacy_mtime is None:
+        raise FileNotFoundError(f"Scaler not found: {path}")
+    
+    scaler = ArrayScaler.from_sklearn(load_pickle(legacy_path))
+    if not save_converted:
+        return scaler
+    try:
+        scaler.save(path)
+        logger.info(f"Converted {legacy_path.name} to {path.name}")
+    except OSError as e:
+        logger.warning(f"Could not save converted scaler {path}: {e}")
+    return scaler
@@ -2,23 +2,65 @@
 Time Series Model wrapper for FFWS Forecasting System
 Supports LSTM, GRU, and TCN models dynamically
 """
+import gc
+import os
 import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
-from tensorflow.keras.models import load_model
-from tensorflow.keras.layers import LSTM, GRU
-from keras import backend as K
-from config.settings import MODELS_DIR, SCALERS_DIR
-from utils.helpers import load_pickle, get_model_filename, get_scaler_filename
+from config.settings import (
+    SCALERS_DIR, INFERENCE_BACKEND, SCALER_FOLDING_ENABLED, MODEL_CACHE_MAX_MODELS, MODEL_CACHE_MAX_MB,
+    MODEL_HOT_RELOAD_ENABLED, MODEL_RELOAD_CHECK_INTERVAL, MODEL_RELOAD_SETTLE_SECONDS, MICRO_BATCH_ENABLED,
+    MODEL_REGISTRY_VERIFY
+)
+from models.batching import MicroBatcher
+from models.inference_backends import load_backend, artifact_paths, get_artifact_path
+from models.registry import get_model_registry
+from models.scaling import load_scaler, SCALER_EXTENSION, LEGACY_SCALER_EXTENSION
+from utils.helpers import get_scaler_filename
 
 logger = logging.getLogger(__name__)
 
 
-def root_mean_squared_error(y_true, y_pred):
-    """Custom RMSE metric for Keras"""
-    return K.sqrt(K.mean(K.square(y_pred - y_true)))
+class ModelNotOwnedError(LookupError):
+    """A sharded ModelLoader was asked for a model another process owns"""
+    
+    def __init__(self, model_code, owner):
+        super().__init__(f"Model {model_code} is owned by shard {owner}")
+        self.model_code = model_code
+        self.owner = owner
+
+
+def artifact_signature(model_code):
+    """
+    Cheap fingerprint of the model's artifacts
+    
+    Returns:
+        The current registry version id for published models. For models
+        still in the legacy flat layout, a tuple of (file name, mtime in ns,
+        size) for every existing model and scaler file
+    """
+    version_id = get_model_registry().current_version_id(model_code)
+    if version_id is not None:
+        return version_id
+    
+    paths = artifact_paths(model_code) + [
+        SCALERS_DIR / get_scaler_filename(model_code, 'x_scaler'),
+        SCALERS_DIR / get_scaler_filename(model_code, 'y_scaler')
+    ]
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signature.append((path.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
 
 
 class TimeSeriesModel:
@@ -27,7 +69,8 @@ class TimeSeriesModel:
     Handles model loading, preprocessing, and prediction
     """
     
-    def __init__(self, model_code, model_type, n_steps_in, n_steps_out, n_features):
+    def __init__(self, model_code, model_type, n_steps_in, n_steps_out, n_features, version_id=None,
+                 inference_backend=INFERENCE_BACKEND):
         """
         Initialize time series model
         
@@ -37,69 +80,130 @@ class TimeSeriesModel:
             n_steps_in: Number of input timesteps
             n_steps_out: Number of output timesteps
             n_features: Number of input features
+            version_id: Registry version to load (default: the current one)
+            inference_backend: Backend to serve the model with (default: INFERENCE_BACKEND)
         """
         self.model_code = model_code
         self.model_type = model_type
         self.n_steps_in = n_steps_in
         self.n_steps_out = n_steps_out
         self.n_features = n_features
+        self.inference_backend = inference_backend
         
+        self.backend = None
         self.model = None
         self.x_scaler = None
         self.y_scaler = None
         
+        # Set when the scaling is folded into the NumPy engine weights
+        self.input_folded = False
+        self.output_folded = False
+        
+        # Resolve one registry version so model and scalers come from the same run, and read
+        # (and verify) only the files this backend opens; None for models trained before the registry
+        self.registry = get_model_registry()
+        self.version = self.registry.prefetch(model_code, version_id, names=self._artifact_names())
+        
+        # Taken before loading, so files rewritten during the load are reloaded later
+        self.artifact_signature = self.version.version_id if self.version else artifact_signature(model_code)
+        self.loaded_at = time.time()
+        
         self._load_model()
         self._load_scalers()
+        self._fold_scalers()
+        
+        # Concurrent single-window requests share one forward pass
+        self.batcher = MicroBatcher(self.backend.predict) if MICRO_BATCH_ENABLED else None
+    
+    @property
+    def load_args(self):
+        """Configuration the model was loaded with"""
+        return (self.model_type, self.n_steps_in, self.n_steps_out, self.n_features)
+    
+    @property
+    def version_id(self):
+        """Registry version the model was loaded from (None for legacy files)"""
+        return self.version.version_id if self.version else None
+    
+    def _scaler_names(self):
+        """File names the scalers may be loaded from"""
+        return [
+            get_scaler_filename(self.model_code, scaler_type, extension)
+            for scaler_type in ('x_scaler', 'y_scaler')
+            for extension in (SCALER_EXTENSION, LEGACY_SCALER_EXTENSION)
+        ]
+    
+    def _artifact_names(self):
+        """File names the configured backend loads (a bundle carries its own scalers)"""
+        names = [get_artifact_path(self.model_code, self.inference_backend).name]
+        if self.inference_backend != 'bundle':
+            names += self._scaler_names()
+        return names
+    
+    def _check_artifact(self, path):
+        """Verify a file of the registry version before it is loaded (cached per process)"""
+        if self.version is not None and MODEL_REGISTRY_VERIFY:
+            self.registry.verify(self.version, [path.name])
     
     def _load_model(self):
-        """Load Keras model from file"""
+        """Load the model through the configured inference backend"""
         try:
-            model_path = MODELS_DIR / get_model_filename(self.model_code)
-            
-            if not model_path.exists():
-                raise FileNotFoundError(f"Model file not found: {model_path}")
-            
-            # Load model with custom objects
-            custom_objects = {
-                'root_mean_squared_error': root_mean_squared_error,
-                'LSTM': LSTM,
-                'GRU': GRU
-            }
-            
-            # Try to import TCN if available
-            try:
-                from keras_tcn import TCN
-                custom_objects['TCN'] = TCN
-            except ImportError:
-                logger.warning("keras_tcn not available, TCN models won't be supported")
-            
-            self.model = load_model(str(model_path), custom_objects=custom_objects)
-            logger.info(f"Model loaded successfully: {self.model_code}")
-            
+            self.backend = load_backend(
+                self.inference_backend, self.model_code, self.n_steps_in, self.n_features,
+                directory=self.version.directory if self.version else None,
+                check_artifact=self._check_artifact
+            )
+            # Keras model object, kept for callers that inspect it (None for other backends)
+            self.model = getattr(self.backend, 'model', None)
+            logger.info(
+                f"Model loaded successfully: {self.model_code} "
+                f"({self.backend.name} backend, version {self.version_id or 'legacy'})"
+            )
+        
         except Exception as e:
             logger.error(f"Error loading model {self.model_code}: {e}")
             raise
     
     def _load_scalers(self):
-        """Load X and Y scalers from pickle files"""
+        """Load X and Y scalers from the model bundle, or else from the scaler files"""
         try:
-            x_scaler_path = SCALERS_DIR / get_scaler_filename(self.model_code, 'x_scaler')
-            y_scaler_path = SCALERS_DIR / get_scaler_filename(self.model_code, 'y_scaler')
+            bundle = getattr(self.backend, 'bundle', None)
+            if bundle is not None:
+                self.x_scaler = bundle.scaler('x_scaler')
+                self.y_scaler = bundle.scaler('y_scaler')
+                logger.info(f"Scalers loaded from bundle for model: {self.model_code}")
+                return
             
-            if not x_scaler_path.exists():
-                raise FileNotFoundError(f"X scaler not found: {x_scaler_path}")
-            if not y_scaler_path.exists():
-                raise FileNotFoundError(f"Y scaler not found: {y_scaler_path}")
+            # .npz mean/scale arrays; legacy pickles are converted on first load
+            scalers_dir = self.version.directory if self.version else SCALERS_DIR
+            if self.version is not None and MODEL_REGISTRY_VERIFY:
+                # Not prefetched when a bundle backend fell back to keras
+                self.registry.verify(self.version, [
+                    name for name in self._scaler_names() if name in self.version.files
+                ])
             
-            self.x_scaler = load_pickle(x_scaler_path)
-            self.y_scaler = load_pickle(y_scaler_path)
+            # Published versions are immutable: a pickle in one is converted in memory only
+            save_converted = self.version is None
+            self.x_scaler = load_scaler(scalers_dir, self.model_code, 'x_scaler', save_converted)
+            self.y_scaler = load_scaler(scalers_dir, self.model_code, 'y_scaler', save_converted)
             
             logger.info(f"Scalers loaded successfully for model: {self.model_code}")
-            
+        
         except Exception as e:
             logger.error(f"Error loading scalers for {self.model_code}: {e}")
             raise
     
+    def _fold_scalers(self):
+        """Fold the scalers into the NumPy engine weights so requests skip both scaling passes"""
+        engine = getattr(self.backend, 'engine', None)
+        if engine is None or not SCALER_FOLDING_ENABLED:
+            return
+        
+        self.input_folded, self.output_folded = engine.fold_scalers(self.x_scaler, self.y_scaler)
+        logger.debug(
+            f"Scalers folded into {self.model_code}: input={self.input_folded}, output={self.output_folded}"
+        )
+    
     def preprocess_data(self, df, sensor_columns):
         """
         Preprocess input data for prediction
@@ -116,20 +220,35 @@ class TimeSeriesModel:
             if 'DateTime' in df.columns:
                 df = df.drop(columns=['DateTime'])
             
-            # Select only required sensor columns
-            df_selected = df[sensor_columns].copy()
-            
-            # Convert to numpy array
-            data = df_selected.to_numpy()
-            
-            # Scale the data
-            data_scaled = self.x_scaler.transform(data)
+            # Select only required sensor columns and convert to numpy array
+            return self.preprocess_array(df[sensor_columns].to_numpy())
+        
+        except Exception as e:
+            logger.error(f"Error preprocessing data: {e}")
+            raise
+    
+    def preprocess_array(self, data):
+        """
+        Preprocess an input window given as an array
+        
+        Args:
+            data: Array of shape (n_steps_in, n_features), columns in feature order
+        
+        Returns:
+            Scaled and reshaped data ready for model input
+        """
+        try:
+            # Scale the data (nothing to do when the first layer applies the scaling)
+            if self.input_folded:
+                data_scaled = np.asarray(data, dtype=np.float32)
+            else:
+                data_scaled = self.x_scaler.transform(data)
             
             # Reshape for model input: (batch_size, n_steps_in, n_features)
             data_reshaped = data_scaled.reshape(-1, self.n_steps_in, self.n_features)
             
             return data_reshaped
-            
+        
         except Exception as e:
             logger.error(f"Error preprocessing data: {e}")
             raise
@@ -146,22 +265,45 @@ class TimeSeriesModel:
         """
         try:
             # Make prediction
-            predictions_scaled = self.model.predict(preprocessed_data, verbose=0)
+            predictions = self.run_model(preprocessed_data)
             
-            # Inverse transform predictions
-            predictions = self.y_scaler.inverse_transform(
-                predictions_scaled.reshape(-1, self.n_steps_out)
-            )
+            # Inverse transform predictions: the flattened output is (step, feature),
+            # and y_scaler holds one mean/scale per feature
+            if not self.output_folded:
+                predictions = self.y_scaler.inverse_transform(
+                    predictions.reshape(-1, self.n_features), copy=False
+                )
             
-            # Convert to DataFrame
-            predictions_df = pd.DataFrame(predictions)
+            # Convert to DataFrame (one row per input window)
+            predictions_df = pd.DataFrame(predictions.reshape(len(preprocessed_data), -1))
             
             return predictions_df
-            
+        
         except Exception as e:
             logger.error(f"Error making prediction: {e}")
             raise
     
+    def run_model(self, preprocessed_data):
+        """
+        Run the forward pass on a scaled batch
+        
+        Args:
+            preprocessed_data: Array of shape (batch, n_steps_in, n_features)
+        
+        Returns:
+            Scaled model output as a NumPy array
+        """
+        if self.batcher is not None and len(preprocessed_data) == 1:
+            return self.batcher.predict(preprocessed_data[0])[np.newaxis]
+        return self.backend.predict(preprocessed_data)
+    
+    def memory_bytes(self):
+        """Estimated memory held by this model"""
+        try:
+            return int(self.backend.memory_bytes())
+        except Exception:
+            return 0
+    
     def predict_from_dataframe(self, df, sensor_columns):
         """
         End-to-end prediction from raw DataFrame
@@ -175,39 +317,157 @@ class TimeSeriesModel:
         """
         preprocessed = self.preprocess_data(df, sensor_columns)
         return self.predict(preprocessed)
+    
+    def predict_from_array(self, data):
+        """
+        End-to-end prediction from an input window array
+        
+        Args:
+            data: Array of shape (n_steps_in, n_features)
+        
+        Returns:
+            DataFrame with predictions
+        """
+        preprocessed = self.preprocess_array(data)
+        return self.predict(preprocessed)
 
 
 class ModelLoader:
     """
     Dynamic model loader that loads models based on database configuration
+    
+    Loaded models are kept in least-recently-used order; once the model
+    count or estimated memory budget is exceeded the oldest models are
+    evicted. Safe to share between request threads: concurrent first
+    requests for the same model wait for a single load.
+    
+    In sharded mode (set_shard) the loader only holds the models whose code
+    hashes to its own node on a consistent hash ring; requests for other
+    models raise ModelNotOwnedError and must be routed to the owner.
     """
     
-    def __init__(self):
-        self.loaded_models = {}
+    def __init__(self, max_models=MODEL_CACHE_MAX_MODELS, max_bytes=MODEL_CACHE_MAX_MB * 1024 * 1024):
+        """
+        Args:
+            max_models: Maximum number of cached models (0 = unlimited)
+            max_bytes: Maximum estimated bytes of cached models (0 = unlimited)
+        """
+        self.loaded_models = OrderedDict()
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._model_bytes = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0, 'misses': 0, 'evictions': 0, 'coalesced_loads': 0, 'load_errors': 0,
+            'reloads': 0, 'reload_errors': 0
+        }
+        
+        # Hot reload of retrained artifacts
+        self.hot_reload = MODEL_HOT_RELOAD_ENABLED
+        self._checked_at = {}
+        self._reloading = set()
+        self._reload_executor = None
+        self._reload_listeners = []
+        
+        # Sharding (None: this loader serves every model)
+        self.ring = None
+        self.node = None
+    
+    def set_shard(self, ring, node):
+        """
+        Serve only the models `ring` assigns to `node` (rebalance)
+        
+        Called again whenever the set of inference processes changes; cached
+        models that now belong to another node are unloaded.
+        
+        Args:
+            ring: utils.hash_ring.HashRing over the inference processes, or None to serve every model
+            node: This process's node on the ring
+        
+        Returns:
+            List of model codes unloaded because they moved to another node
+        """
+        with self._lock:
+            self.ring = ring
+            self.node = node
+            moved = [model_code for model_code in self.loaded_models if not self._owns(model_code)]
+            for model_code in moved:
+                self._release(model_code)
+        
+        if moved:
+            gc.collect()
+            logger.info(f"Rebalanced shard {node}: unloaded models now owned elsewhere: {moved}")
+        return moved
+    
+    def _owns(self, model_code):
+        return self.ring is None or self.ring.get_node(model_code) == self.node
+    
+    def owns(self, model_code):
+        """True if this loader's shard serves the model (always, when not sharded)"""
+        with self._lock:
+            return self._owns(model_code)
     
     def load_model(self, model_config, sensor_configs):
         """
         Load a model with its configuration
         
+        Only one thread loads a given model; others asking for it meanwhile
+        wait on the same future and receive the same instance (or error).
+        
         Args:
             model_config: Dictionary with model configuration from database
             sensor_configs: List of sensor configurations for this model
         
         Returns:
             TimeSeriesModel instance
+        
+        Raises:
+            ModelNotOwnedError: In sharded mode, if another node owns the model
         """
         model_code = model_config['code']
         
-        # Check if already loaded
-        if model_code in self.loaded_models:
-            logger.info(f"Model {model_code} already loaded, returning cached instance")
-            return self.loaded_models[model_code]
+        load_args = (
+            model_config['type'], model_config['n_steps_in'], model_config['n_steps_out'], len(sensor_configs)
+        )
+        
+        with self._lock:
+            # Check if already loaded
+            if model_code in self.loaded_models:
+                self.loaded_models.move_to_end(model_code)
+                self._stats['hits'] += 1
+                model = self.loaded_models[model_code]
+                check_due = self._reload_check_due(model_code)
+            else:
+                model = None
+        
+        if model is not None:
+            logger.debug(f"Model {model_code} already loaded, returning cached instance")
+            if check_due and self._needs_reload(model, load_args):
+                self._schedule_reload(model_config, sensor_configs)
+            return model
+        
+        with self._lock:
+            if not self._owns(model_code):
+                raise ModelNotOwnedError(model_code, self.ring.get_node(model_code))
+            future = self._loading.get(model_code)
+            is_loader = future is None
+            if is_loader:
+                future = Future()
+                self._loading[model_code] = future
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced_loads'] += 1
+        
+        if not is_loader:
+            logger.info(f"Model {model_code} is being loaded by another request, waiting")
+            return future.result()
         
         try:
             # Determine number of features based on sensors
             n_features = len(sensor_configs)
             
-            # Create model instance
+            # Create model instance (outside the lock: other models stay available)
             model = TimeSeriesModel(
                 model_code=model_code,
                 model_type=model_config['type'],
@@ -215,31 +475,212 @@ class ModelLoader:
                 n_steps_out=model_config['n_steps_out'],
                 n_features=n_features
             )
-            
-            # Cache the model
-            self.loaded_models[model_code] = model
-            
-            logger.info(f"Model {model_code} loaded and cached successfully")
-            return model
-            
+            model_bytes = model.memory_bytes()
         except Exception as e:
             logger.error(f"Error loading model {model_code}: {e}")
+            with self._lock:
+                self._loading.pop(model_code, None)
+                self._stats['load_errors'] += 1
+            future.set_exception(e)
             raise
+        
+        # Cache the model (unless a rebalance moved it to another node meanwhile)
+        with self._lock:
+            self._loading.pop(model_code, None)
+            evicted = []
+            if self._owns(model_code):
+                self.loaded_models[model_code] = model
+                self._model_bytes[model_code] = model_bytes
+                evicted = self._evict(keep=model_code)
+        future.set_result(model)
+        
+        if evicted:
+            gc.collect()
+            logger.info(f"Evicted least recently used models: {evicted}")
+        logger.info(f"Model {model_code} loaded and cached successfully (~{model_bytes / 1024 / 1024:.1f} MB)")
+        return model
+    
+    def _reload_check_due(self, model_code):
+        """Rate-limit artifact checks per model (lock held)"""
+        if not self.hot_reload or model_code in self._reloading:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at.get(model_code, float('-inf')) < MODEL_RELOAD_CHECK_INTERVAL:
+            return False
+        self._checked_at[model_code] = now
+        return True
+    
+    def _needs_reload(self, model, load_args):
+        """
+        Check whether a cached model is stale
+        
+        A model is stale when its database configuration changed or a new
+        version was published. Legacy files are rewritten in place, so their
+        changes only count once every file has been untouched for
+        MODEL_RELOAD_SETTLE_SECONDS.
+        """
+        if model.load_args != load_args:
+            logger.info(f"Configuration of model {model.model_code} changed, reloading")
+            return True
+        
+        signature = artifact_signature(model.model_code)
+        if signature == model.artifact_signature or not signature:
+            return False
+        
+        if isinstance(signature, tuple):
+            newest_mtime = max(mtime_ns for _, mtime_ns, _ in signature) / 1e9
+            if time.time() - newest_mtime < MODEL_RELOAD_SETTLE_SECONDS:
+                return False
+        
+        logger.info(f"New artifacts found for model {model.model_code}, reloading")
+        return True
+    
+    def _schedule_reload(self, model_config, sensor_configs):
+        """Load a fresh copy of a model in the background"""
+        model_code = model_config['code']
+        with self._lock:
+            if model_code in self._reloading:
+                return
+            self._reloading.add(model_code)
+            if self._reload_executor is None:
+                self._reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-reload')
+            executor = self._reload_executor
+        
+        executor.submit(self._reload, dict(model_config), list(sensor_configs))
+    
+    def _reload(self, model_config, sensor_configs):
+        """Build the new model off the request path and swap it in atomically"""
+        model_code = model_config['code']
+        try:
+            model = TimeSeriesModel(
+                model_code=model_code,
+                model_type=model_config['type'],
+                n_steps_in=model_config['n_steps_in'],
+                n_steps_out=model_config['n_steps_out'],
+                n_features=len(sensor_configs)
+            )
+            model_bytes = model.memory_bytes()
+        except Exception as e:
+            # Keep serving the current model; the next check retries
+            logger.error(f"Background reload of model {model_code} failed: {e}")
+            with self._lock:
+                self._reloading.discard(model_code)
+                self._stats['reload_errors'] += 1
+            return
+        
+        with self._lock:
+            self._reloading.discard(model_code)
+            if model_code not in self.loaded_models:
+                # Evicted or unloaded meanwhile; do not bring it back
+                return
+            
+            # Replace in place: requests holding the old instance finish with it
+            self.loaded_models[model_code] = model
+            self._model_bytes[model_code] = model_bytes
+            self._stats['reloads'] += 1
+            evicted = self._evict(keep=model_code)
+        
+        gc.collect()
+        if evicted:
+            logger.info(f"Evicted least recently used models: {evicted}")
+        logger.info(f"Model {model_code} reloaded from new artifacts")
+        
+        for callback in self._reload_listeners:
+            try:
+                callback(model_code)
+            except Exception as e:
+                logger.error(f"Reload listener failed for model {model_code}: {e}")
+    
+    def add_reload_listener(self, callback):
+        """Call callback(model_code) whenever a cached model is replaced by a reload"""
+        self._reload_listeners.append(callback)
+    
+    def _over_budget(self):
+        """Check whether the cache exceeds its count or memory budget"""
+        if self.max_models and len(self.loaded_models) > self.max_models:
+            return True
+        if self.max_bytes and sum(self._model_bytes.values()) > self.max_bytes:
+            return True
+        return False
+    
+    def _evict(self, keep=None):
+        """
+        Evict least-recently-used models until the cache fits its budget (lock held)
+        
+        Evicted models are only dropped from the cache. Requests still using
+        one keep a reference; its memory is freed once they finish.
+        """
+        evicted = []
+        while self._over_budget():
+            model_code = next((code for code in self.loaded_models if code != keep), None)
+            if model_code is None:
+                break
+            self._release(model_code)
+            self._stats['evictions'] += 1
+            evicted.append(model_code)
+        return evicted
+    
+    def _release(self, model_code):
+        """Remove a model from the cache (lock held)"""
+        self.loaded_models.pop(model_code)
+        self._model_bytes.pop(model_code, None)
+        self._checked_at.pop(model_code, None)
     
     def get_model(self, model_code):
         """Get a loaded model by code"""
-        return self.loaded_models.get(model_code)
+        with self._lock:
+            model = self.loaded_models.get(model_code)
+            if model is not None:
+                self.loaded_models.move_to_end(model_code)
+            return model
     
     def unload_model(self, model_code):
         """Unload a model from cache"""
-        if model_code in self.loaded_models:
-            del self.loaded_models[model_code]
-            logger.info(f"Model {model_code} unloaded from cache")
+        with self._lock:
+            if model_code not in self.loaded_models:
+                return
+            self._release(model_code)
+        gc.collect()
+        logger.info(f"Model {model_code} unloaded from cache")
     
     def clear_cache(self):
         """Clear all loaded models from cache"""
-        self.loaded_models.clear()
+        with self._lock:
+            for model_code in list(self.loaded_models):
+                self._release(model_code)
+        gc.collect()
         logger.info("All models cleared from cache")
+    
+    def _batching_stats(self):
+        """Micro-batching counters summed over the cached models (lock held)"""
+        totals = {'requests': 0, 'batches': 0, 'batched_requests': 0, 'largest_batch': 0}
+        for model in self.loaded_models.values():
+            if getattr(model, 'batcher', None) is None:
+                continue
+            stats = model.batcher.get_stats()
+            for key in ('requests', 'batches', 'batched_requests'):
+                totals[key] += stats[key]
+            totals['largest_batch'] = max(totals['largest_batch'], stats['largest_batch'])
+        return totals
+    
+    def get_stats(self):
+        """Return cache counters, budget and current usage"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'models': len(self.loaded_models),
+                'loading': list(self._loading),
+                'reloading': list(self._reloading),
+                'hot_reload': self.hot_reload,
+                'micro_batching': self._batching_stats(),
+                'shard': self.node,
+                'ring_nodes': self.ring.nodes if self.ring is not None else None,
+                'estimated_bytes': sum(self._model_bytes.values()),
+                'max_models': self.max_models,
+                'max_bytes': self.max_bytes,
+                'lru_order': list(self.loaded_models)
+            })
+            return stats
 
 
 # Global model loader instance
@@ -8,12 +8,17 @@ from sklearn.model_selection import train_test_split
 import logging
 from pathlib import Path
 from config.settings import (
-    MODELS_DIR, SCALERS_DIR, DEFAULT_EPOCHS, DEFAULT_BATCH_SIZE,
+    DEFAULT_EPOCHS, DEFAULT_BATCH_SIZE,
     LSTM_LAYER_1_SIZE, LSTM_LAYER_2_SIZE, DROPOUT_RATE,
-    TCN_NB_FILTERS, TCN_KERNEL_SIZE, TCN_DILATIONS, TEST_SIZE
+    TCN_NB_FILTERS, TCN_KERNEL_SIZE, TCN_DILATIONS, TEST_SIZE, MODEL_EXPORT_FORMATS
 )
-from utils.helpers import save_pickle, get_model_filename, get_scaler_filename
+from utils.helpers import get_model_filename, get_scaler_filename
 from utils.architecture_config import ArchitectureConfig, TrainingConfig, get_architecture_info
+from models.inference_backends import export_model, get_artifact_path
+from models.bundle import export_bundle
+from models.numpy_engine import UnsupportedModelError
+from models.scaling import ArrayScaler, SCALER_EXTENSION
+from models.registry import get_model_registry
 from keras import backend as K
 
 logger = logging.getLogger(__name__)
@@ -293,23 +298,57 @@ def train_model(model_code, model_type, df_data, n_steps_in, n_steps_out,
             verbose=1
         )
         
-        # Save model
-        model_path = MODELS_DIR / get_model_filename(model_code)
-        model.save(str(model_path))
-        logger.info(f"Model saved: {model_path}")
-        
-        # Save scalers
-        x_scaler_path = SCALERS_DIR / get_scaler_filename(model_code, 'x_scaler')
-        y_scaler_path = SCALERS_DIR / get_scaler_filename(model_code, 'y_scaler')
-        
-        save_pickle(x_scaler, x_scaler_path)
-        save_pickle(y_scaler, y_scaler_path)
-        logger.info(f"Scalers saved: {x_scaler_path}, {y_scaler_path}")
-        
         # Get final metrics
         final_loss = history.history['loss'][-1]
         final_val_loss = history.history['val_loss'][-1]
         
+        # Write every artifact into a private staging directory; nothing live is touched yet
+        registry = get_model_registry()
+        staging_dir = registry.create_staging(model_code)
+        try:
+            model.save(str(staging_dir / get_model_filename(model_code)))
+            
+            # Export for the TFLite/ONNX/NumPy inference backends
+            exported = export_model(model, model_code, n_steps_in, n_features, directory=staging_dir)
+            
+            # Scalers are stored as plain mean/scale arrays, not pickles
+            x_scaler = ArrayScaler.from_sklearn(x_scaler)
+            y_scaler = ArrayScaler.from_sklearn(y_scaler)
+            x_scaler.save(staging_dir / get_scaler_filename(model_code, 'x_scaler', SCALER_EXTENSION))
+            y_scaler.save(staging_dir / get_scaler_filename(model_code, 'y_scaler', SCALER_EXTENSION))
+            
+            # Single memory-mappable file with weights, scalers and config for fast cold loads
+            if 'bundle' in MODEL_EXPORT_FORMATS:
+                try:
+                    bundle_path = export_bundle(
+                        model, get_artifact_path(model_code, 'bundle', staging_dir), model_code, model_type,
+                        n_steps_in, n_steps_out, n_features, x_scaler, y_scaler
+                    )
+                    exported['bundle'] = str(bundle_path)
+                except UnsupportedModelError as e:
+                    logger.warning(f"Could not export {model_code} to bundle: {e}")
+            
+            # Publish model, exports and scalers together as one version
+            version = registry.publish(model_code, staging_dir, metadata={
+                'model_type': model_type,
+                'n_steps_in': n_steps_in,
+                'n_steps_out': n_steps_out,
+                'n_features': n_features,
+                'epochs': epochs,
+                'batch_size': batch_size,
+                'final_loss': float(final_loss),
+                'final_val_loss': float(final_val_loss)
+            })
+        except Exception:
+            registry.discard_staging(staging_dir)
+            raise
+        
+        model_path = version.path(get_model_filename(model_code))
+        x_scaler_path = version.path(get_scaler_filename(model_code, 'x_scaler', SCALER_EXTENSION))
+        y_scaler_path = version.path(get_scaler_filename(model_code, 'y_scaler', SCALER_EXTENSION))
+        logger.info(f"Model saved: {model_path}")
+        logger.info(f"Scalers saved: {x_scaler_path}, {y_scaler_path}")
+        
         result = {
             'status': 'success',
             'model_code': model_code,
@@ -317,7 +356,12 @@ def train_model(model_code, model_type, df_data, n_steps_in, n_steps_out,
             'epochs': epochs,
             'final_loss': float(final_loss),
             'final_val_loss': float(final_val_loss),
+            'version': version.version_id,
+            'content_hash': version.content_hash,
             'model_path': str(model_path),
+            'exported_paths': {
+                export_format: str(version.path(Path(path).name)) for export_format, path in exported.items()
+            },
             'x_scaler_path': str(x_scaler_path),
             'y_scaler_path': str(y_scaler_path)
         }
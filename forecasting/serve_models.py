@@ -0,0 +1,61 @@
+"""
+Model server pool for FFWS Forecasting System
+Runs the model-server processes that own the models; start it next to
+gunicorn and set MODEL_SERVER_ENABLED=True for the web workers.
+"""
+import argparse
+import json
+import logging
+import sys
+from services.model_server import run_pool, scale_pool, ModelServerClient
+from config.settings import MODEL_SERVER_PROCESSES, MODEL_SERVER_SOCKET_DIR, LOG_LEVEL
+from utils.helpers import setup_logging
+
+# Setup logging
+setup_logging(log_level=LOG_LEVEL, log_file='logs/model_server.log')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Start the model server pool, or resize or report the status of a running one"""
+    parser = argparse.ArgumentParser(description='Run the FFWS model server pool')
+    
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=MODEL_SERVER_PROCESSES,
+        help=f'Number of model server processes to start with (default: {MODEL_SERVER_PROCESSES})'
+    )
+    
+    parser.add_argument(
+        '--scale',
+        type=int,
+        metavar='N',
+        help='Resize a running pool to N servers; models are rebalanced over the new servers'
+    )
+    
+    parser.add_argument(
+        '--status',
+        action='store_true',
+        help='Print the status of a running pool and exit (1 if a server is not ready)'
+    )
+    
+    args = parser.parse_args()
+    
+    if args.scale is not None:
+        scale_pool(args.scale)
+        logger.info(f"Model server pool resized to {args.scale} servers")
+        return
+    
+    if args.status:
+        client = ModelServerClient()
+        servers = client.get_status()
+        print(json.dumps(servers, indent=2, default=str))
+        sys.exit(0 if all(server.get('ready') for server in servers) else 1)
+    
+    logger.info(f"Starting {args.processes} model servers in {MODEL_SERVER_SOCKET_DIR}")
+    run_pool(n_servers=args.processes)
+
+
+if __name__ == '__main__':
+    main()
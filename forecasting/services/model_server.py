@@ -0,0 +1,579 @@
+"""
+Model server pool for FFWS Forecasting System
+A small pool of model-server processes owns the loaded models and TensorFlow
+runtime; gunicorn web workers only fetch data and send the input window to
+them over a local Unix socket. Every model is served by exactly one server
+process, its owner on a consistent hash ring of the servers, so total model
+memory grows with the number of models and not with the number of workers.
+
+The server set is kept in <socket dir>/pool.json. The supervisor, the servers
+and the clients all follow that file; when the pool is resized
+(`python serve_models.py --scale N`) only about 1/N of the models move, and
+servers unload the models they no longer own.
+
+Run the pool with `python serve_models.py` and set MODEL_SERVER_ENABLED=True
+on the web side. Requests and responses are pickled dictionaries over
+multiprocessing.connection, authenticated with MODEL_SERVER_AUTHKEY or, when
+that is unset, with a random key the pool writes to <socket dir>/authkey:
+    {'op': 'predict', 'model_config': {...}, 'sensor_configs': [...], 'window': array}
+    {'op': 'status'}
+    {'op': 'unload', 'model_code': code}
+"""
+import json
+import logging
+import os
+import queue
+import secrets
+import signal
+import threading
+import time
+import uuid
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Listener
+import pandas as pd
+from config.settings import (
+    MODEL_SERVER_PROCESSES, MODEL_SERVER_SOCKET_DIR, MODEL_SERVER_AUTHKEY,
+    MODEL_SERVER_TIMEOUT, PRELOAD_MODELS, LOG_LEVEL
+)
+from utils.hash_ring import HashRing
+
+logger = logging.getLogger(__name__)
+
+# Seconds between liveness checks of the server processes
+SUPERVISOR_INTERVAL = 1.0
+
+# A server that exits sooner than this after starting is restarted only after the same delay
+RESTART_BACKOFF = 5.0
+
+# Pool membership file in the socket directory, and how often it is re-read
+POOL_FILE = 'pool.json'
+POOL_CHECK_INTERVAL = 1.0
+
+# Per-pool authkey file in the socket directory (used when MODEL_SERVER_AUTHKEY is unset)
+AUTHKEY_FILE = 'authkey'
+
+
+def check_socket_dir(socket_dir, create=False):
+    """
+    Make sure the socket directory is private to this user
+    
+    Another local user who owns or can write to it could replace the
+    sockets, the pool file or the authkey file.
+    
+    Args:
+        socket_dir: Directory holding the server sockets, the pool file and the authkey file
+        create: Create the directory (mode 0700) if it does not exist
+    
+    Raises:
+        PermissionError: If the directory is owned by another user or is group or world writable
+    """
+    if create:
+        socket_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    
+    st = os.stat(socket_dir)
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"Model server socket dir {socket_dir} is owned by uid {st.st_uid}, not {os.getuid()}")
+    if st.st_mode & 0o022:
+        raise PermissionError(
+            f"Model server socket dir {socket_dir} is group or world writable (mode {st.st_mode & 0o777:o})"
+        )
+
+
+def create_authkey(socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """Write a new random authkey for the pool (mode 0600), unless MODEL_SERVER_AUTHKEY is set"""
+    if MODEL_SERVER_AUTHKEY:
+        return
+    
+    check_socket_dir(socket_dir, create=True)
+    tmp_path = socket_dir / f"{AUTHKEY_FILE}.{uuid.uuid4().hex}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    os.replace(tmp_path, socket_dir / AUTHKEY_FILE)
+
+
+def load_authkey(socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """
+    Authkey shared by the servers and clients of a pool
+    
+    Raises:
+        FileNotFoundError: If MODEL_SERVER_AUTHKEY is unset and the pool has not written its key
+        PermissionError: If the socket dir or the key file is not private to this user
+    """
+    if MODEL_SERVER_AUTHKEY:
+        return MODEL_SERVER_AUTHKEY
+    
+    check_socket_dir(socket_dir)
+    path = socket_dir / AUTHKEY_FILE
+    with open(path) as f:
+        if os.fstat(f.fileno()).st_mode & 0o077:
+            raise PermissionError(f"Model server authkey file {path} is readable by other users")
+        return f.read().strip().encode()
+
+
+def server_socket_path(index, socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """Unix socket path of model server `index`"""
+    return socket_dir / f"model-server-{index}.sock"
+
+
+def read_pool(socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """Server indexes listed in the pool file, or None if there is none"""
+    try:
+        with open(socket_dir / POOL_FILE) as f:
+            return sorted(json.load(f)['servers'])
+    except FileNotFoundError:
+        return None
+
+
+def write_pool(servers, socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """Atomically replace the pool file with a new server set"""
+    check_socket_dir(socket_dir, create=True)
+    tmp_path = socket_dir / f"{POOL_FILE}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'servers': sorted(servers), 'updated_at': time.time()}, f)
+    os.replace(tmp_path, socket_dir / POOL_FILE)
+
+
+class PoolMembership:
+    """Current server set and its hash ring, re-read when the pool file changes"""
+    
+    def __init__(self, socket_dir=MODEL_SERVER_SOCKET_DIR, default_servers=MODEL_SERVER_PROCESSES):
+        """
+        Args:
+            socket_dir: Directory holding the pool file
+            default_servers: Pool size assumed until a pool file exists
+        """
+        self.socket_dir = socket_dir
+        self.servers = list(range(default_servers))
+        self.ring = HashRing(self.servers)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+    
+    def refresh(self, force=False):
+        """
+        Re-read the pool file if it changed (at most every POOL_CHECK_INTERVAL)
+        
+        Returns:
+            True if the server set changed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._checked_at < POOL_CHECK_INTERVAL:
+                return False
+            self._checked_at = now
+            
+            try:
+                mtime = (self.socket_dir / POOL_FILE).stat().st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self._mtime:
+                return False
+            
+            servers = read_pool(self.socket_dir)
+            self._mtime = mtime
+            if servers is None or servers == self.servers:
+                return False
+            
+            logger.info(f"Model server pool changed: {self.servers} -> {servers}")
+            self.servers = servers
+            self.ring = HashRing(servers)
+            return True
+    
+    def owner(self, model_code):
+        """Index of the server that owns a model"""
+        self.refresh()
+        return self.ring.get_node(model_code)
+
+
+class ModelServer:
+    """One model-server process: a ModelLoader behind a Unix socket"""
+    
+    def __init__(self, index, socket_dir=MODEL_SERVER_SOCKET_DIR):
+        """
+        Args:
+            index: This server's node on the pool's hash ring
+            socket_dir: Directory holding the server sockets and the pool file
+        """
+        # Imported here so the web workers, which only use the client, never load the model stack
+        from models.time_series_model import get_model_loader
+        from services.warmup_service import WarmupService
+        
+        self.index = index
+        self.socket_dir = socket_dir
+        self.socket_path = server_socket_path(index, socket_dir)
+        self.membership = PoolMembership(socket_dir)
+        self.model_loader = get_model_loader()
+        self.membership.refresh(force=True)
+        self.model_loader.set_shard(self.membership.ring, index)
+        self.warmup = WarmupService(enabled=PRELOAD_MODELS, model_filter=self.model_loader.owns)
+        
+        self._listener = None
+        self._stopping = threading.Event()
+        self._stats = {'requests': 0, 'errors': 0, 'connections': 0}
+        self._stats_lock = threading.Lock()
+    
+    def serve_forever(self):
+        """Accept connections until stop() is called; one thread per connection"""
+        check_socket_dir(self.socket_dir, create=True)
+        authkey = load_authkey(self.socket_dir)
+        if self.socket_path.exists():
+            # Left behind by a server that was killed
+            self.socket_path.unlink()
+        
+        self._listener = Listener(str(self.socket_path), family='AF_UNIX', authkey=authkey)
+        os.chmod(self.socket_path, 0o600)
+        logger.info(
+            f"Model server {self.index} of pool {self.membership.servers} listening on {self.socket_path} "
+            f"(pid {os.getpid()})"
+        )
+        self.warmup.start()
+        threading.Thread(target=self._watch_pool, name='model-server-pool', daemon=True).start()
+        
+        while not self._stopping.is_set():
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError as e:
+                logger.warning(f"Rejected model server connection: {e}")
+                continue
+            except OSError:
+                if self._stopping.is_set():
+                    break
+                raise
+            
+            with self._stats_lock:
+                self._stats['connections'] += 1
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        
+        logger.info(f"Model server {self.index} stopped")
+    
+    def stop(self):
+        """Stop accepting connections and remove the socket"""
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.close()
+    
+    def _rebalance(self):
+        """Follow pool file changes: unload the models that moved to another server"""
+        if self.membership.refresh():
+            self.model_loader.set_shard(self.membership.ring, self.index)
+    
+    def _watch_pool(self):
+        """Rebalance in the background, so idle servers also release moved models"""
+        while not self._stopping.wait(POOL_CHECK_INTERVAL):
+            try:
+                self._rebalance()
+            except Exception as e:
+                logger.error(f"Model server {self.index} rebalance failed: {e}")
+    
+    def _serve_connection(self, conn):
+        """Answer requests on one client connection until it is closed"""
+        with conn:
+            while not self._stopping.is_set():
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                
+                try:
+                    response = self.handle(message)
+                except Exception as e:
+                    logger.error(f"Model server request {message.get('op')} failed: {e}")
+                    with self._stats_lock:
+                        self._stats['errors'] += 1
+                    response = {'ok': False, 'error': str(e), 'error_type': type(e).__name__}
+                
+                try:
+                    conn.send(response)
+                except OSError:
+                    return
+    
+    def handle(self, message):
+        """
+        Execute one request
+        
+        Args:
+            message: Request dictionary (see module docstring)
+        
+        Returns:
+            Response dictionary with 'ok' and the result
+        """
+        op = message.get('op')
+        with self._stats_lock:
+            self._stats['requests'] += 1
+        
+        if op == 'predict':
+            model_code = message['model_config']['code']
+            self._rebalance()
+            if not self.model_loader.owns(model_code):
+                # The client routed with an outdated pool; tell it where the model lives now
+                return {
+                    'ok': False,
+                    'error': f"Model {model_code} is owned by model server {self.membership.owner(model_code)}",
+                    'error_type': 'ModelNotOwnedError',
+                    'owner': self.membership.owner(model_code)
+                }
+            model = self.model_loader.load_model(message['model_config'], message['sensor_configs'])
+            predictions = model.predict_from_array(message['window'])
+            return {'ok': True, 'predictions': predictions.to_numpy(), 'version': model.artifact_signature}
+        
+        if op == 'status':
+            with self._stats_lock:
+                stats = dict(self._stats)
+            return {
+                'ok': True,
+                'index': self.index,
+                'pid': os.getpid(),
+                'ready': self.warmup.is_ready(),
+                'warmup': self.warmup.get_status(),
+                'requests': stats,
+                'models': self.model_loader.get_stats()
+            }
+        
+        if op == 'unload':
+            self.model_loader.unload_model(message['model_code'])
+            return {'ok': True}
+        
+        raise ValueError(f"Unknown model server operation: {op}")
+
+
+def serve(index, socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """Process entry point of one model server"""
+    from utils.helpers import setup_logging
+    setup_logging(log_level=LOG_LEVEL, log_file=f'logs/model_server_{index}.log')
+    
+    server = ModelServer(index, socket_dir)
+    
+    def handle_signal(signum, frame):
+        server.stop()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    try:
+        server.serve_forever()
+    finally:
+        if server.socket_path.exists():
+            server.socket_path.unlink()
+
+
+def scale_pool(n_servers, socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """Resize a running pool to servers 0..n_servers-1 (picked up by run_pool)"""
+    if n_servers < 1:
+        raise ValueError("A model server pool needs at least one server")
+    write_pool(range(n_servers), socket_dir)
+
+
+def run_pool(n_servers=MODEL_SERVER_PROCESSES, socket_dir=MODEL_SERVER_SOCKET_DIR):
+    """
+    Start the model-server processes, restart any that exit and follow resizes
+    
+    The pool file and a fresh authkey are written at startup; afterwards
+    the supervisor starts and stops servers to match the pool file. Blocks until SIGTERM/SIGINT, then stops
+    all servers.
+    
+    Args:
+        n_servers: Initial number of server processes
+        socket_dir: Directory for the server sockets and the pool file
+    """
+    # spawn: every server starts with a fresh interpreter and its own TensorFlow runtime
+    ctx = get_context('spawn')
+    processes = {}
+    started_at = {}
+    stopping = threading.Event()
+    
+    def start(index):
+        process = ctx.Process(target=serve, args=(index, socket_dir), name=f'model-server-{index}')
+        process.start()
+        processes[index] = process
+        started_at[index] = time.monotonic()
+        logger.info(f"Started model server {index} (pid {process.pid})")
+    
+    def handle_signal(signum, frame):
+        stopping.set()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    def stop(index):
+        process = processes.pop(index)
+        process.terminate()
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+        logger.info(f"Stopped model server {index}")
+    
+    create_authkey(socket_dir)
+    scale_pool(n_servers, socket_dir)
+    for index in range(n_servers):
+        start(index)
+    
+    while not stopping.wait(SUPERVISOR_INTERVAL):
+        servers = read_pool(socket_dir)
+        if servers is None:
+            write_pool(processes, socket_dir)
+            servers = list(processes)
+        for index in set(servers) - set(processes):
+            start(index)
+        for index in set(processes) - set(servers):
+            stop(index)
+        
+        for index, process in list(processes.items()):
+            if process.is_alive() or time.monotonic() - started_at[index] < RESTART_BACKOFF:
+                continue
+            logger.error(f"Model server {index} exited with code {process.exitcode}, restarting")
+            start(index)
+    
+    logger.info("Stopping model servers")
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+
+class ModelServerError(RuntimeError):
+    """A model server could not be reached or failed to answer a request"""
+
+
+class ModelServerClient:
+    """
+    Sends prediction requests from a web worker to the model-server pool
+    
+    Connections are kept open and reused; each thread takes an idle
+    connection to the owning server or opens a new one. Requests are
+    routed on the hash ring of the servers in the pool file.
+    """
+    
+    def __init__(self, socket_dir=MODEL_SERVER_SOCKET_DIR, timeout=MODEL_SERVER_TIMEOUT):
+        """
+        Args:
+            socket_dir: Directory holding the server sockets and the pool file
+            timeout: Seconds to wait for a response
+        """
+        self.socket_dir = socket_dir
+        self.timeout = timeout
+        self.membership = PoolMembership(socket_dir)
+        self._idle = {}
+        self._idle_lock = threading.Lock()
+    
+    def server_for(self, model_code):
+        """Index of the server that owns a model"""
+        return self.membership.owner(model_code)
+    
+    def _idle_connections(self, index):
+        with self._idle_lock:
+            return self._idle.setdefault(index, queue.LifoQueue())
+    
+    def _connect(self, index):
+        # Read on every new connection: a restarted pool has a new key
+        authkey = load_authkey(self.socket_dir)
+        return Client(str(server_socket_path(index, self.socket_dir)), family='AF_UNIX', authkey=authkey)
+    
+    def _request(self, index, message):
+        """
+        Send a request to server `index` and wait for its response
+        
+        A pooled connection may have been closed by a restarted server; the
+        request is then retried once on a fresh connection.
+        
+        Raises:
+            ModelServerError: If the server is unreachable or does not answer in time
+        """
+        for attempt in range(2):
+            try:
+                conn = self._idle_connections(index).get_nowait()
+            except queue.Empty:
+                try:
+                    conn = self._connect(index)
+                except (OSError, AuthenticationError) as e:
+                    raise ModelServerError(f"Model server {index} unavailable: {e}")
+            
+            try:
+                conn.send(message)
+                answered = conn.poll(self.timeout)
+                response = conn.recv() if answered else None
+            except (EOFError, OSError) as e:
+                conn.close()
+                if attempt == 0:
+                    continue
+                raise ModelServerError(f"Model server {index} closed the connection: {e}")
+            except Exception as e:
+                # E.g. an unpicklable message; the connection state is unknown, so it is not reused
+                conn.close()
+                raise ModelServerError(f"Request to model server {index} failed: {e}")
+            
+            if not answered:
+                # The response may still arrive later; the connection cannot be reused
+                conn.close()
+                raise ModelServerError(f"Model server {index} did not answer within {self.timeout}s")
+            
+            self._idle_connections(index).put(conn)
+            return response
+    
+    def predict(self, model_config, sensor_configs, window):
+        """
+        Run a model on an input window in its model server
+        
+        Args:
+            model_config: Model configuration dictionary
+            sensor_configs: Input sensors of the model
+            window: Array of shape (n_steps_in, n_features)
+        
+        Returns:
+            Tuple of (DataFrame with predictions as TimeSeriesModel.predict_from_array(),
+            artifact signature of the model version that ran)
+        """
+        model_code = model_config['code']
+        # Plain dicts: the frozen prediction plan holds MappingProxyType views, which cannot be pickled
+        message = {
+            'op': 'predict',
+            'model_config': dict(model_config),
+            'sensor_configs': [dict(sensor) for sensor in sensor_configs],
+            'window': window
+        }
+        response = self._request(self.server_for(model_code), message)
+        if not response['ok'] and 'owner' in response:
+            # The pool was resized and this worker has not seen it yet
+            self.membership.refresh(force=True)
+            response = self._request(response['owner'], message)
+        if not response['ok']:
+            raise ModelServerError(f"Prediction for model {model_code} failed in model server: {response['error']}")
+        return pd.DataFrame(response['predictions']), response['version']
+    
+    def unload_model(self, model_code):
+        """Drop a model from its server's cache"""
+        self._request(self.server_for(model_code), {'op': 'unload', 'model_code': model_code})
+    
+    def get_status(self):
+        """Status of every server; unreachable servers are reported, not raised"""
+        self.membership.refresh()
+        servers = []
+        for index in self.membership.servers:
+            try:
+                servers.append(self._request(index, {'op': 'status'}))
+            except ModelServerError as e:
+                servers.append({'ok': False, 'index': index, 'ready': False, 'error': str(e)})
+        return servers
+    
+    def is_ready(self):
+        """True when every server is reachable and has finished preloading"""
+        return all(server.get('ready') for server in self.get_status())
+    
+    def wait_until_ready(self, timeout=60):
+        """Poll the servers until they are ready; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.is_ready():
+                return True
+            time.sleep(0.5)
+        return False
+
+
+# Global model server client instance
+model_server_client = ModelServerClient()
+
+
+def get_model_server_client():
+    """Get model server client instance"""
+    return model_server_client
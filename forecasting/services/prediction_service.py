@@ -7,9 +7,14 @@ from datetime import datetime, timedelta
 import pandas as pd
 from database.queries import get_data_fetcher
 from database.connection import get_db
-from models.time_series_model import get_model_loader
-from config.settings import DEFAULT_CONFIDENCE_SCORE
+from models.time_series_model import get_model_loader, artifact_signature
+from services.model_server import get_model_server_client
+from services.result_cache import PredictionResultCache
+from config.settings import (
+    DEFAULT_CONFIDENCE_SCORE, MODEL_SERVER_ENABLED, PREDICTION_COALESCE_ENABLED, PREDICTION_COALESCE_TTL
+)
 from utils.helpers import calculate_confidence_score
+from utils.single_flight import SingleFlight, EXECUTED
 
 logger = logging.getLogger(__name__)
 
@@ -20,14 +25,28 @@ class PredictionService:
     def __init__(self):
         self.data_fetcher = get_data_fetcher()
         self.model_loader = get_model_loader()
+        self.model_client = get_model_server_client() if MODEL_SERVER_ENABLED else None
         self.db = get_db()
+        
+        # Runs keyed by (model_code, artifact version, last input timestamp): duplicates share one inference + write
+        self.single_flight = SingleFlight(ttl=PREDICTION_COALESCE_TTL, enabled=PREDICTION_COALESCE_ENABLED)
+        
+        # Last forecast per model, reused while its inputs and artifact version are unchanged
+        self.result_cache = PredictionResultCache()
+        self.model_loader.add_reload_listener(self.result_cache.invalidate)
     
-    def predict_for_model(self, model_code):
+    def predict_for_model(self, model_code, model_plan=None, window=None, freshness=None):
         """
         Make predictions for all sensors using a specific model
         
         Args:
             model_code: Model code to use for prediction
+            model_plan: Optional ModelPlan from the prediction plan; when given,
+                        model and sensor metadata are not looked up again
+            window: Optional AlignedGrid input window sliced from a shared
+                    sensor matrix; when given, no data query is made
+            freshness: Optional newest reading per sensor (get_input_freshness)
+                       already probed for several models at once
         
         Returns:
             Dictionary with prediction results
@@ -35,13 +54,18 @@ class PredictionService:
         try:
             logger.info(f"Starting prediction for model: {model_code}")
             
-            # Get model configuration
-            model_config = self.data_fetcher.get_model_by_code(model_code)
-            if not model_config:
-                raise ValueError(f"Model not found: {model_code}")
+            if model_plan is not None:
+                model_config = model_plan.config
+                sensors = model_plan.sensors
+            else:
+                # Get model configuration
+                model_config = self.data_fetcher.get_model_by_code(model_code)
+                if not model_config:
+                    raise ValueError(f"Model not found: {model_code}")
+                
+                # Get sensors for this model
+                sensors = self.data_fetcher.get_sensors_for_model(model_code)
             
-            # Get sensors for this model
-            sensors = self.data_fetcher.get_sensors_for_model(model_code)
             if not sensors:
                 logger.warning(f"No active sensors found for model: {model_code}")
                 return {'status': 'no_sensors', 'model_code': model_code}
@@ -51,38 +75,45 @@ class PredictionService:
             # Get sensor codes
             sensor_codes = [s['code'] for s in sensors]
             
+            # Nothing new since the last forecast: return it without inference or writes
+            if freshness is None and self.result_cache.enabled:
+                freshness = self.data_fetcher.get_input_freshness(sensor_codes)
+            cached = self.result_cache.get(
+                model_code, self._result_cache_key(model_config, sensor_codes, freshness)
+            )
+            if cached is not None:
+                logger.info(f"Prediction for model {model_code} served from the result cache")
+                return {
+                    'status': 'success',
+                    'model_code': model_code,
+                    'sensors': sensor_codes,
+                    'coalesced': False,
+                    'cached': True,
+                    **cached
+                }
+            
             # Get latest data for prediction
             n_steps_in = model_config['n_steps_in']
-            latest_data = self.data_fetcher.get_latest_sensor_data(
-                sensor_codes, 
-                n_records=n_steps_in
-            )
+            if window is None:
+                window = self.data_fetcher.get_latest_sensor_grid(
+                    sensor_codes, 
+                    n_records=n_steps_in
+                )
             
-            if latest_data.empty:
+            if len(window) == 0:
                 logger.warning(f"No data available for sensors: {sensor_codes}")
                 return {'status': 'no_data', 'model_code': model_code}
             
-            # Load model
-            model = self.model_loader.load_model(model_config, sensors)
-            
-            # Get the last timestamp from data
-            last_timestamp = latest_data['DateTime'].iloc[-1]
-            
-            # Prepare sensor columns (exclude DateTime)
-            sensor_columns = [col for col in latest_data.columns if col != 'DateTime']
+            if len(window) < n_steps_in or not window.mask.all():
+                logger.warning(
+                    f"Only {int(window.complete_rows().sum())} of {n_steps_in} complete input rows "
+                    f"for model {model_code}"
+                )
+                return {'status': 'insufficient_data', 'model_code': model_code}
             
-            # Make prediction
-            predictions = model.predict_from_dataframe(latest_data, sensor_columns)
-            
-            # Save predictions to database
-            prediction_results = self._save_predictions(
-                model_code=model_code,
-                sensor_codes=sensor_codes,
-                predictions=predictions,
-                prediction_run_at=datetime.now(),
-                last_timestamp=last_timestamp,
-                n_steps_out=model_config['n_steps_out']
-            )
+            # Make and save the prediction (shared with identical concurrent or recent requests)
+            run, model_version, how = self._coalesced_run(model_config, sensors, window)
+            self._store_result(model_config, sensor_codes, window, run, model_version)
             
             logger.info(f"Prediction completed for model {model_code}")
             
@@ -90,9 +121,9 @@ class PredictionService:
                 'status': 'success',
                 'model_code': model_code,
                 'sensors': sensor_codes,
-                'prediction_run_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'predicted_from': last_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'predictions': prediction_results
+                'coalesced': how != EXECUTED,
+                'cached': False,
+                **run
             }
             
         except Exception as e:
@@ -134,37 +165,45 @@ class PredictionService:
             all_sensors = self.data_fetcher.get_sensors_for_model(model_code)
             sensor_codes = [s['code'] for s in all_sensors]
             
+            # Nothing new since the last forecast: return it without inference or writes
+            freshness = None
+            if self.result_cache.enabled:
+                freshness = self.data_fetcher.get_input_freshness(sensor_codes)
+            cached = self.result_cache.get(
+                model_code, self._result_cache_key(model_config, sensor_codes, freshness)
+            )
+            if cached is not None:
+                logger.info(f"Prediction for sensor {sensor_code} served from the result cache")
+                return {
+                    'status': 'success',
+                    'sensor_code': sensor_code,
+                    'model_code': model_code,
+                    'coalesced': False,
+                    'cached': True,
+                    **cached
+                }
+            
             # Get latest data
             n_steps_in = model_config['n_steps_in']
-            latest_data = self.data_fetcher.get_latest_sensor_data(
+            window = self.data_fetcher.get_latest_sensor_grid(
                 sensor_codes,
                 n_records=n_steps_in
             )
             
-            if latest_data.empty:
+            if len(window) == 0:
                 return {'status': 'no_data', 'sensor_code': sensor_code}
             
-            # Load model
-            model = self.model_loader.load_model(model_config, all_sensors)
-            
-            # Get the last timestamp
-            last_timestamp = latest_data['DateTime'].iloc[-1]
-            
-            # Prepare sensor columns
-            sensor_columns = [col for col in latest_data.columns if col != 'DateTime']
+            if len(window) < n_steps_in or not window.mask.all():
+                logger.warning(
+                    f"Only {int(window.complete_rows().sum())} of {n_steps_in} complete input rows "
+                    f"for model {model_code}"
+                )
+                return {'status': 'insufficient_data', 'sensor_code': sensor_code}
             
-            # Make prediction
-            predictions = model.predict_from_dataframe(latest_data, sensor_columns)
-            
-            # Save predictions
-            prediction_results = self._save_predictions(
-                model_code=model_code,
-                sensor_codes=sensor_codes,
-                predictions=predictions,
-                prediction_run_at=datetime.now(),
-                last_timestamp=last_timestamp,
-                n_steps_out=model_config['n_steps_out']
-            )
+            # The model predicts every sensor of the model at once, so requests for
+            # sibling sensors on the same input share one run
+            run, model_version, how = self._coalesced_run(model_config, all_sensors, window)
+            self._store_result(model_config, sensor_codes, window, run, model_version)
             
             logger.info(f"Prediction completed for sensor {sensor_code}")
             
@@ -172,9 +211,9 @@ class PredictionService:
                 'status': 'success',
                 'sensor_code': sensor_code,
                 'model_code': model_code,
-                'prediction_run_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'predicted_from': last_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'predictions': prediction_results
+                'coalesced': how != EXECUTED,
+                'cached': False,
+                **run
             }
             
         except Exception as e:
@@ -185,11 +224,142 @@ class PredictionService:
                 'error': str(e)
             }
     
+    def _result_cache_key(self, model_config, sensor_codes, readings):
+        """
+        Key of a model's forecast for the result cache
+        
+        Args:
+            model_config: Model configuration dictionary
+            sensor_codes: Input sensor codes of the model
+            readings: Newest (received_at, id) per sensor, probed with
+                      get_input_freshness or taken from the rows of a window
+        
+        Returns:
+            (artifact version, inputs) tuple, or None if the forecast cannot be
+            cached (cache disabled, probe failed or no readings)
+        """
+        if not self.result_cache.enabled or not readings:
+            return None
+        
+        sensor_codes = sorted(sensor_codes)
+        markers = []
+        for code in sensor_codes:
+            marker = readings.get(code)
+            markers.append(None if marker is None else (pd.Timestamp(marker[0]), int(marker[1])))
+        inputs = (
+            model_config['type'], model_config['n_steps_in'], model_config['n_steps_out'],
+            tuple(sensor_codes), tuple(markers)
+        )
+        return artifact_signature(model_config['code']), inputs
+    
+    def _store_result(self, model_config, sensor_codes, window, run, model_version):
+        """
+        Cache a forecast under the newest readings of the window it was made from
+        
+        The key comes from the fetched rows rather than the earlier freshness
+        probe: a reading that arrived in between, or a read replica lagging
+        behind the one probed, would otherwise file a forecast made from
+        older data under a newer key.
+        
+        Skipped when the model that ran is not the version the key names
+        (a reload is still in progress), so an old model's forecast is never
+        returned for the new version.
+        """
+        cache_key = self._result_cache_key(model_config, sensor_codes, window.latest_readings)
+        if cache_key is not None and cache_key[0] == model_version:
+            self.result_cache.put(model_config['code'], cache_key, run)
+    
+    def _coalesced_run(self, model_config, sensor_configs, window):
+        """
+        Predict and save once per (model_code, artifact version, last input timestamp)
+        
+        Concurrent requests with the same key wait for the running prediction;
+        later ones within PREDICTION_COALESCE_TTL get its stored result. The
+        artifact version in the key keeps a reloaded or promoted model from
+        returning the previous model's forecast.
+        
+        Args:
+            model_config: Model configuration dictionary
+            sensor_configs: Input sensors of the model
+            window: AlignedGrid input window
+        
+        Returns:
+            Tuple of (run dictionary, artifact version of the model that ran,
+            how it was obtained: executed, in_flight or recent)
+        """
+        model_code = model_config['code']
+        last_timestamp = pd.Timestamp(window.timestamps[-1])
+        key = (model_code, artifact_signature(model_code), last_timestamp)
+        
+        (run, model_version), how = self.single_flight.do(
+            key, lambda: self._predict_and_save(model_config, sensor_configs, window, last_timestamp)
+        )
+        if how == EXECUTED and model_version != key[1]:
+            # The previous model ran while the new version was still loading: do not reuse it
+            self.single_flight.forget(lambda stored_key: stored_key == key)
+        if how != EXECUTED:
+            logger.info(f"Prediction for model {model_code} from {last_timestamp} shared with a {how} run")
+        return run, model_version, how
+    
+    def _predict_and_save(self, model_config, sensor_configs, window, last_timestamp):
+        """
+        Run the model on an input window and save its predictions
+        
+        Returns:
+            Tuple of (dictionary with prediction_run_at, predicted_from, predictions
+            and write_stats, artifact version of the model that ran)
+        """
+        prediction_run_at = datetime.now()
+        
+        # Make prediction
+        predictions, model_version = self._run_model(model_config, sensor_configs, window.values)
+        
+        # Save predictions to database (model output follows the input column order)
+        prediction_results, write_stats = self._save_predictions(
+            model_code=model_config['code'],
+            sensor_codes=window.sensor_codes,
+            predictions=predictions,
+            prediction_run_at=prediction_run_at,
+            last_timestamp=last_timestamp,
+            n_steps_out=model_config['n_steps_out']
+        )
+        
+        return {
+            'prediction_run_at': prediction_run_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'predicted_from': last_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'predictions': prediction_results,
+            'write_stats': write_stats
+        }, model_version
+    
+    def _run_model(self, model_config, sensor_configs, values):
+        """
+        Run a model on an input window
+        
+        With MODEL_SERVER_ENABLED the window is sent to the model server that
+        owns the model; otherwise the model is loaded in this worker.
+        
+        Args:
+            model_config: Model configuration dictionary
+            sensor_configs: Input sensors of the model
+            values: Array of shape (n_steps_in, n_features)
+        
+        Returns:
+            Tuple of (DataFrame with predictions, artifact version of the model that ran)
+        """
+        if self.model_client is not None:
+            return self.model_client.predict(model_config, sensor_configs, values)
+        
+        model = self.model_loader.load_model(model_config, sensor_configs)
+        return model.predict_from_array(values), model.artifact_signature
+    
     def _save_predictions(self, model_code, sensor_codes, predictions, 
                          prediction_run_at, last_timestamp, n_steps_out):
         """
         Save predictions to database
         
+        The whole prediction tensor is written as multi-row upserts inside a
+        single transaction instead of one round trip per (step, sensor) pair.
+        
         Args:
             model_code: Model code used for prediction
             sensor_codes: List of sensor codes
@@ -199,60 +369,56 @@ class PredictionService:
             n_steps_out: Number of prediction steps
         
         Returns:
-            Dictionary with saved predictions
+            Tuple of (dictionary with saved predictions, write statistics)
         """
         try:
-            prediction_results = {}
+            n_sensors = len(sensor_codes)
             
-            # Iterate through each prediction timestep
-            for step in range(n_steps_out):
-                # Calculate prediction timestamp (1 hour ahead for each step)
-                prediction_ts = last_timestamp + timedelta(hours=step + 1)
-                
-                # Iterate through each sensor
+            # Model output is flattened as step * n_sensors + sensor index
+            values = predictions.to_numpy(dtype=float)[0, :n_steps_out * n_sensors]
+            values = values.reshape(n_steps_out, n_sensors)
+            
+            # Calculate confidence score (simplified)
+            confidence_score = DEFAULT_CONFIDENCE_SCORE
+            
+            # Prediction timestamps (1 hour ahead for each step)
+            prediction_timestamps = [
+                last_timestamp + timedelta(hours=step + 1) for step in range(n_steps_out)
+            ]
+            written_at = datetime.now()
+            
+            rows = []
+            prediction_results = {sensor_code: {} for sensor_code in sensor_codes}
+            for step, prediction_ts in enumerate(prediction_timestamps):
+                ts_key = prediction_ts.strftime('%Y-%m-%d %H:%M:%S')
                 for idx, sensor_code in enumerate(sensor_codes):
-                    # Get predicted value for this sensor and timestep
-                    predicted_value = float(predictions.iloc[0, step * len(sensor_codes) + idx])
-                    
-                    # Calculate confidence score (simplified)
-                    confidence_score = DEFAULT_CONFIDENCE_SCORE
-                    
-                    # Prepare insert query
-                    insert_query = """
-                    INSERT INTO data_predictions 
-                    (mas_sensor_code, mas_model_code, prediction_run_at, 
-                     prediction_for_ts, predicted_value, confidence_score, 
-                     threshold_status, created_at, updated_at)
-                    VALUES 
-                    (:sensor_code, :model_code, :run_at, :for_ts, 
-                     :value, :confidence, 'unknown', NOW(), NOW())
-                    ON DUPLICATE KEY UPDATE
-                    predicted_value = VALUES(predicted_value),
-                    confidence_score = VALUES(confidence_score),
-                    updated_at = NOW()
-                    """
-                    
-                    # Execute insert
-                    self.db.execute_query(insert_query, {
-                        'sensor_code': sensor_code,
-                        'model_code': model_code,
-                        'run_at': prediction_run_at,
-                        'for_ts': prediction_ts,
-                        'value': predicted_value,
-                        'confidence': confidence_score
-                    })
-                    
-                    # Store in results
-                    if sensor_code not in prediction_results:
-                        prediction_results[sensor_code] = {}
-                    
-                    prediction_results[sensor_code][prediction_ts.strftime('%Y-%m-%d %H:%M:%S')] = {
+                    predicted_value = float(values[step, idx])
+                    rows.append((
+                        sensor_code, model_code, prediction_run_at, prediction_ts,
+                        predicted_value, confidence_score, 'unknown', written_at, written_at
+                    ))
+                    prediction_results[sensor_code][ts_key] = {
                         'value': predicted_value,
                         'confidence': confidence_score
                     }
             
-            logger.info(f"Saved predictions for {len(sensor_codes)} sensors, {n_steps_out} timesteps")
-            return prediction_results
+            write_stats = self.db.bulk_upsert(
+                table='data_predictions',
+                columns=[
+                    'mas_sensor_code', 'mas_model_code', 'prediction_run_at',
+                    'prediction_for_ts', 'predicted_value', 'confidence_score',
+                    'threshold_status', 'created_at', 'updated_at'
+                ],
+                rows=rows,
+                update_columns=['predicted_value', 'confidence_score', 'updated_at']
+            )
+            
+            logger.info(
+                f"Saved predictions for {n_sensors} sensors, {n_steps_out} timesteps "
+                f"({write_stats['rows']} rows, {write_stats['statements']} statements, "
+                f"{write_stats['db_time_ms']} ms)"
+            )
+            return prediction_results, write_stats
             
         except Exception as e:
             logger.error(f"Error saving predictions: {e}")
@@ -266,20 +432,48 @@ class PredictionService:
             List of prediction results for each model
         """
         try:
-            # Get all active models
-            models = self.data_fetcher.get_active_models()
+            # Load all active models, sensors and scalers in one go
+            plan = self.data_fetcher.get_prediction_plan()
             
-            if not models:
+            if not plan.models:
                 logger.warning("No active models found")
                 return []
             
-            logger.info(f"Found {len(models)} active models")
+            logger.info(f"Found {len(plan)} active models")
+            
+            # One probe of the newest reading of every plan sensor, for the result cache
+            # (taken before the shared data fetch, as predict_for_model does)
+            freshness = None
+            if self.result_cache.enabled:
+                freshness = self.data_fetcher.get_input_freshness(
+                    sorted({code for model_plan in plan for code in model_plan.sensor_codes})
+                )
+            
+            # One query for the input of every model; each model gets a view of it
+            matrix = self.data_fetcher.get_latest_sensor_matrix(plan)
             
             results = []
-            for model in models:
-                result = self.predict_for_model(model['code'])
+            for model_plan in plan:
+                window = None
+                if model_plan.sensors and len(matrix) > 0:
+                    window = matrix.window(
+                        sorted(model_plan.sensor_codes), model_plan.config['n_steps_in']
+                    )
+                result = self.predict_for_model(
+                    model_plan.code, model_plan=model_plan, window=window, freshness=freshness
+                )
                 results.append(result)
             
+            # Coalesced and cached results reuse an earlier run and wrote nothing now
+            write_stats = [
+                r['write_stats'] for r in results
+                if 'write_stats' in r and not (r['coalesced'] or r['cached'])
+            ]
+            logger.info(
+                f"Predict-all wrote {sum(w['rows'] for w in write_stats)} rows in "
+                f"{sum(w['db_time_ms'] for w in write_stats):.2f} ms of DB time"
+            )
+            
             return results
             
         except Exception as e:
@@ -0,0 +1,72 @@
+"""
+Prediction result cache for FFWS Forecasting System
+Keeps the last forecast of every model together with what it was computed
+from: the model configuration, the artifact version and the newest reading
+of each input sensor. While none of these change, a prediction request is
+answered from the cache without fetching the window, running the model or
+writing to data_predictions. New readings or a new model version change
+the key, so the stale entry is replaced on the next request; reloads also
+drop the entry right away.
+"""
+import logging
+import threading
+from config.settings import PREDICTION_RESULT_CACHE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionResultCache:
+    """Last forecast per model, valid for one input/version key"""
+    
+    def __init__(self, enabled=PREDICTION_RESULT_CACHE_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+    
+    def get(self, model_code, key):
+        """
+        Stored forecast of a model if it was computed for this key
+        
+        Args:
+            model_code: Model code
+            key: Input/version key (None: not cacheable, always a miss)
+        
+        Returns:
+            The stored run dictionary, or None
+        """
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(model_code)
+            if entry is not None and entry[0] == key:
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+            return None
+    
+    def put(self, model_code, key, run):
+        """Store the forecast of a model, replacing the previous one"""
+        if not self.enabled or key is None:
+            return
+        with self._lock:
+            self._entries[model_code] = (key, run)
+            self._stats['stores'] += 1
+    
+    def invalidate(self, model_code=None):
+        """Drop one model's forecast, or all of them"""
+        with self._lock:
+            if model_code is None:
+                self._entries.clear()
+            elif self._entries.pop(model_code, None) is None:
+                return
+            self._stats['invalidations'] += 1
+        logger.info(f"Prediction result cache invalidated: {model_code or 'all models'}")
+    
+    def get_stats(self):
+        """Return cache counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['enabled'] = self.enabled
+            return stats
@@ -0,0 +1,151 @@
+"""
+Model warm-up service for FFWS Forecasting System
+Loads every active model into the worker's model cache at startup and runs
+one dummy inference per model, so the first real prediction after a deploy
+does not pay for model loading, scaler loading or graph tracing.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from database.queries import get_data_fetcher
+from models.time_series_model import get_model_loader
+from config.settings import PRELOAD_MODELS, PRELOAD_CONCURRENCY, MODEL_CACHE_MAX_MODELS, MODEL_SERVER_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupService:
+    """Preloads active models once per worker and tracks readiness"""
+    
+    def __init__(self, enabled=PRELOAD_MODELS, concurrency=PRELOAD_CONCURRENCY, model_filter=None):
+        """
+        Args:
+            enabled: Preload at startup; when False the worker is ready immediately
+            concurrency: Models loaded in parallel
+            model_filter: Optional callable(model_code) -> bool selecting the models to preload
+        """
+        self.enabled = enabled
+        self.concurrency = max(concurrency, 1)
+        self.model_filter = model_filter
+        self.data_fetcher = get_data_fetcher()
+        self.model_loader = get_model_loader()
+        
+        self._lock = threading.Lock()
+        self._thread = None
+        self._state = 'ready' if not enabled else 'pending'
+        self._started_at = None
+        self._finished_at = None
+        self._models = {}
+    
+    def start(self):
+        """Start the warm-up in a background thread (once)"""
+        with self._lock:
+            if not self.enabled or self._thread is not None:
+                return
+            self._state = 'warming'
+            self._started_at = time.time()
+            self._thread = threading.Thread(target=self.run, name='model-warmup', daemon=True)
+            self._thread.start()
+    
+    def run(self):
+        """Load and warm up every active model"""
+        try:
+            models = self.data_fetcher.get_active_models()
+            if self.model_filter is not None:
+                models = [model for model in models if self.model_filter(model['code'])]
+            logger.info(f"Warming up {len(models)} active models")
+            if MODEL_CACHE_MAX_MODELS and len(models) > MODEL_CACHE_MAX_MODELS:
+                logger.warning(
+                    f"{len(models)} active models but MODEL_CACHE_MAX_MODELS={MODEL_CACHE_MAX_MODELS}; "
+                    f"the least recently warmed models will be evicted"
+                )
+            
+            with self._lock:
+                self._models = {model['code']: {'status': 'pending'} for model in models}
+            
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='model-warmup') as executor:
+                list(executor.map(self._warm_model, models))
+            
+            with self._lock:
+                failed = [code for code, info in self._models.items() if info['status'] == 'failed']
+                ready = sum(1 for info in self._models.values() if info['status'] == 'ready')
+                self._state = 'ready'
+                self._finished_at = time.time()
+            
+            logger.info(
+                f"Model warm-up finished in {self._finished_at - self._started_at:.1f}s "
+                f"({ready} ready, {len(failed)} failed, {len(models) - ready - len(failed)} skipped)"
+            )
+            if failed:
+                logger.warning(f"Models that failed to warm up: {failed}")
+        
+        except Exception as e:
+            logger.error(f"Model warm-up failed: {e}")
+            with self._lock:
+                self._state = 'failed'
+                self._finished_at = time.time()
+    
+    def _warm_model(self, model_config):
+        """Load one model and trace it with a dummy window"""
+        model_code = model_config['code']
+        started = time.perf_counter()
+        try:
+            sensors = self.data_fetcher.get_sensors_for_model(model_code)
+            if not sensors:
+                self._set_model(model_code, {'status': 'skipped', 'reason': 'no active sensors'})
+                return
+            
+            model = self.model_loader.load_model(model_config, sensors)
+            loaded = time.perf_counter()
+            
+            # One inference through the full request path (scaling, backend, inverse scaling)
+            model.predict_from_array(np.zeros((model.n_steps_in, model.n_features), dtype=np.float32))
+            
+            self._set_model(model_code, {
+                'status': 'ready',
+                'backend': model.backend.name,
+                'load_ms': round((loaded - started) * 1000, 1),
+                'warmup_ms': round((time.perf_counter() - loaded) * 1000, 1)
+            })
+        except Exception as e:
+            logger.error(f"Warm-up of model {model_code} failed: {e}")
+            self._set_model(model_code, {'status': 'failed', 'error': str(e)})
+    
+    def _set_model(self, model_code, info):
+        """Record the warm-up result of one model"""
+        with self._lock:
+            self._models[model_code] = info
+    
+    def is_ready(self):
+        """
+        True once the warm-up has finished (or preloading is disabled)
+        
+        Models that failed to warm up do not hold readiness back; they are
+        loaded on their first request as without preloading.
+        """
+        with self._lock:
+            return self._state in ('ready', 'failed')
+    
+    def get_status(self):
+        """Readiness state, timings and per-model results"""
+        with self._lock:
+            finished_at = self._finished_at or time.time()
+            return {
+                'state': self._state,
+                'preload_enabled': self.enabled,
+                'elapsed_seconds': round(finished_at - self._started_at, 1) if self._started_at else None,
+                'models_total': len(self._models),
+                'models_ready': sum(1 for info in self._models.values() if info['status'] == 'ready'),
+                'models': dict(self._models)
+            }
+
+
+# Global warm-up service instance (with MODEL_SERVER_ENABLED the model servers preload instead)
+warmup_service = WarmupService(enabled=PRELOAD_MODELS and not MODEL_SERVER_ENABLED)
+
+
+def get_warmup_service():
+    """Get warm-up service instance"""
+    return warmup_service
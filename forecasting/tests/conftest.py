@@ -0,0 +1,7 @@
+"""
+Test configuration: make the forecasting packages importable from tests/
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,63 @@
+"""
+Latest-window fetch tests with an in-memory stand-in for data_actuals
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from database.queries import DataFetcher
+
+
+class FakeDatabase:
+    """Answers the per-sensor latest-readings query from a list of rows"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+    
+    def execute_query(self, query, params=None, read_only=False):
+        result = []
+        idx = 0
+        while f'sensor_{idx}' in params:
+            code = params[f'sensor_{idx}']
+            readings = [row for row in self.rows if row[1] == code]
+            if readings:
+                since = max(row[3] for row in readings) - timedelta(seconds=params[f'span_{idx}'])
+                result.extend(row for row in readings if row[3] >= since)
+            idx += 1
+        result.sort(key=lambda row: row[3])
+        return result, ['id', 'mas_sensor_code', 'value', 'DateTime']
+
+
+def make_fetcher(rows):
+    data_fetcher = DataFetcher.__new__(DataFetcher)
+    data_fetcher.db = FakeDatabase(rows)
+    return data_fetcher
+
+
+def readings(code, start, step_minutes, count, first_id):
+    return [
+        (first_id + i, code, float(i), start + timedelta(minutes=step_minutes * i))
+        for i in range(count)
+    ]
+
+
+def test_sub_hourly_sensor_fills_the_window():
+    start = datetime(2024, 1, 1)
+    rows = readings('S15', start, 15, 4 * 48, 1) + readings('S60', start, 60, 48, 1000)
+    
+    grid = make_fetcher(rows).get_latest_sensor_grid(['S60', 'S15'], n_records=24)
+    
+    assert len(grid) == 24
+    assert grid.mask.all()
+    assert grid.sensor_codes == ['S15', 'S60']
+    # 23:45 rounds to the next hour, where the hourly sensor is forward-filled
+    assert grid.timestamps[-1] == np.datetime64(start + timedelta(hours=48))
+
+
+def test_window_ends_at_last_complete_row():
+    start = datetime(2024, 1, 1)
+    # S2 stops five hours before S1: beyond the forward-fill limit, so the window ends earlier
+    rows = readings('S1', start, 60, 48, 1) + readings('S2', start, 60, 43, 1000)
+    
+    grid = make_fetcher(rows).get_latest_sensor_grid(['S1', 'S2'], n_records=6)
+    
+    assert len(grid) == 6
+    assert grid.mask.all()
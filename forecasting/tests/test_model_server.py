@@ -0,0 +1,83 @@
+"""
+Model server client tests against an in-process stand-in server
+"""
+import threading
+from multiprocessing.connection import Listener
+import numpy as np
+import pytest
+from database.prediction_plan import ModelPlan, freeze
+from services.model_server import (
+    ModelServerClient, ModelServerError, check_socket_dir, create_authkey, load_authkey,
+    server_socket_path, write_pool
+)
+
+
+@pytest.fixture
+def fake_server(tmp_path):
+    """Server 0 of a one-server pool; answers predict requests and records them"""
+    write_pool([0], tmp_path)
+    create_authkey(tmp_path)
+    listener = Listener(str(server_socket_path(0, tmp_path)), family='AF_UNIX', authkey=load_authkey(tmp_path))
+    received = []
+    
+    def serve():
+        conn = listener.accept()
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            received.append(message)
+            conn.send({'ok': True, 'predictions': {'0': [1.0]}, 'version': 'v1'})
+        conn.close()
+    
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield tmp_path, received
+    listener.close()
+
+
+def make_plan():
+    """ModelPlan as built by DataFetcher.get_prediction_plan (read-only mappings)"""
+    return ModelPlan(
+        config=freeze({'code': 'M1', 'type': 'LSTM', 'n_steps_in': 3, 'n_steps_out': 1}),
+        sensors=(freeze({'code': 'S1'}), freeze({'code': 'S2'})),
+        scalers=freeze({})
+    )
+
+
+def test_predict_sends_model_plan(fake_server):
+    socket_dir, received = fake_server
+    client = ModelServerClient(socket_dir=socket_dir, timeout=5)
+    plan = make_plan()
+    
+    predictions, version = client.predict(plan.config, plan.sensors, np.zeros((3, 2), dtype=np.float32))
+    
+    assert version == 'v1'
+    assert predictions.shape == (1, 1)
+    assert received[0]['model_config'] == dict(plan.config)
+    assert received[0]['sensor_configs'] == [{'code': 'S1'}, {'code': 'S2'}]
+
+
+def test_send_failure_closes_connection(fake_server):
+    socket_dir, _ = fake_server
+    client = ModelServerClient(socket_dir=socket_dir, timeout=5)
+    plan = make_plan()
+    
+    with pytest.raises(ModelServerError):
+        client.predict(plan.config, plan.sensors, lambda: None)
+    
+    assert client._idle_connections(0).empty()
+
+
+def test_shared_socket_dir_is_refused(tmp_path):
+    socket_dir = tmp_path / 'sockets'
+    check_socket_dir(socket_dir, create=True)
+    socket_dir.chmod(0o777)
+    
+    with pytest.raises(PermissionError):
+        write_pool([0], socket_dir)
+    client = ModelServerClient(socket_dir=socket_dir, timeout=5)
+    plan = make_plan()
+    with pytest.raises(ModelServerError):
+        client.predict(plan.config, plan.sensors, None)
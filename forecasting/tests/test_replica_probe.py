@@ -0,0 +1,90 @@
+"""
+Replica lag probe tests against fake engines
+"""
+import threading
+import pytest
+from sqlalchemy.exc import OperationalError
+from database.connection import DatabaseConnection, PRIMARY
+
+
+class FakeConnection:
+    """Connection whose SHOW REPLICA STATUS returns a row or raises"""
+    
+    def __init__(self, row=None, error=None):
+        self.row = row
+        self.error = error
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def execute(self, statement):
+        if self.error is not None:
+            raise self.error
+        return self
+    
+    def mappings(self):
+        return self
+    
+    def first(self):
+        return self.row
+
+
+class FakeEngine:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+    
+    def connect(self):
+        return FakeConnection(**self.kwargs)
+
+
+def make_db(replica_engine):
+    """DatabaseConnection with one fake replica, skipping engine creation"""
+    db = DatabaseConnection.__new__(DatabaseConnection)
+    db._engines = {PRIMARY: FakeEngine(), 'replica_0': replica_engine}
+    db._hosts = {PRIMARY: 'primary-host', 'replica_0': 'replica-host'}
+    db._replicas = ['replica_0']
+    db._health_lock = threading.Lock()
+    db._health = {name: {
+        'healthy': None,
+        'lag_seconds': None,
+        'checked_at': 0.0,
+        'failures': 0,
+        'last_error': None,
+        'lag_probe_denied': False
+    } for name in db._engines}
+    return db
+
+
+def test_denied_lag_probe_stops_startup():
+    denied = OperationalError(
+        'SHOW REPLICA STATUS', {},
+        Exception(1227, 'Access denied; you need (at least one of) the REPLICATION CLIENT privilege(s)')
+    )
+    db = make_db(FakeEngine(error=denied))
+    
+    with pytest.raises(RuntimeError, match='REPLICATION CLIENT'):
+        db.check_replicas()
+    
+    assert db.get_read_routing_status()['lag_probe_denied'] == ['replica-host']
+
+
+def test_unreachable_replica_does_not_stop_startup():
+    unreachable = OperationalError('SHOW REPLICA STATUS', {}, Exception(2003, "Can't connect to MySQL server"))
+    db = make_db(FakeEngine(error=unreachable))
+    
+    db.check_replicas()
+    
+    status = db.get_read_routing_status()
+    assert status['healthy_replicas'] == 0
+    assert status['lag_probe_denied'] == []
+
+
+def test_caught_up_replica_is_healthy():
+    db = make_db(FakeEngine(row={'Seconds_Behind_Source': 0}))
+    
+    db.check_replicas()
+    
+    assert db.get_read_routing_status()['healthy_replicas'] == 1
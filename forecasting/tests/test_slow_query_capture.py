@@ -0,0 +1,19 @@
+"""
+Slow query capture tests
+"""
+import queue
+from database.instrumentation import DatabaseMetrics
+
+
+def test_full_explain_queue_drops_instead_of_blocking():
+    metrics = DatabaseMetrics(slow_query_ms=0, capture_slow=True, explain_slow=True)
+    # Full queue with no worker draining it: a blocking put would hang the query's thread
+    metrics._explain_queue = queue.Queue(maxsize=1)
+    metrics._explain_queue.put_nowait(None)
+    
+    metrics._capture_slow_query('primary', None, 'SELECT data_actuals', 'SELECT 1', {}, 5.0, False)
+    
+    capture = metrics.snapshot()['slow_query_capture']
+    assert capture['captured'] == 1
+    assert capture['explain_dropped'] == 1
+    assert metrics.get_slow_queries()[0]['explain'] == {'error': 'EXPLAIN queue full, plan not captured'}
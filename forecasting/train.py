@@ -6,6 +6,7 @@ import argparse
 import logging
 from database.queries import get_data_fetcher
 from models.training import train_model
+from models.registry import get_model_registry
 from config.settings import TRAINING_DATA_LIMIT, LOG_LEVEL
 from utils.helpers import setup_logging
 
@@ -177,8 +178,36 @@ def main():
         help='Batch size for training (optional, uses default from config)'
     )
     
+    parser.add_argument(
+        '--list-versions',
+        action='store_true',
+        help='List the published versions of --model instead of training'
+    )
+    
+    parser.add_argument(
+        '--activate',
+        type=str,
+        metavar='VERSION',
+        help='Serve an already published version of --model (rollback) instead of training'
+    )
+    
     args = parser.parse_args()
     
+    if (args.list_versions or args.activate) and not args.model:
+        parser.error('--list-versions and --activate require --model')
+    
+    if args.list_versions:
+        registry = get_model_registry()
+        current = registry.current_version_id(args.model)
+        for version_id in registry.list_versions(args.model):
+            print(f"{'*' if version_id == current else ' '} {version_id}")
+        return
+    
+    if args.activate:
+        get_model_registry().activate(args.model, args.activate)
+        logger.info(f"✓ Model {args.model} now serves version {args.activate}")
+        return
+    
     logger.info("="*60)
     logger.info("FFWS Forecasting System - Model Training")
     logger.info("="*60)
@@ -0,0 +1,84 @@
+"""
+Consistent hash ring for FFWS Forecasting System
+Maps keys (model codes) to nodes (inference processes). Every node is placed
+on the ring at many virtual points; a key belongs to the first point at or
+after its own hash. Adding or removing a node only moves the keys next to
+its points, about 1/N of them, where `hash % N` would move almost all.
+"""
+import bisect
+import hashlib
+
+# Virtual points per node; more points spread the keys more evenly
+DEFAULT_REPLICAS = 128
+
+
+def _hash(value):
+    """64-bit position on the ring (stable across processes, unlike hash())"""
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring over a set of nodes"""
+    
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        """
+        Args:
+            nodes: Initial nodes (any values with a stable str())
+            replicas: Virtual points per node
+        """
+        self.replicas = replicas
+        self._nodes = set()
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add_node(node)
+    
+    @property
+    def nodes(self):
+        """Nodes on the ring, sorted"""
+        return sorted(self._nodes, key=str)
+    
+    def __len__(self):
+        return len(self._nodes)
+    
+    def __contains__(self, node):
+        return node in self._nodes
+    
+    def add_node(self, node):
+        """Place a node on the ring (no-op if present)"""
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+    
+    def remove_node(self, node):
+        """Take a node off the ring (no-op if absent)"""
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+    
+    def get_node(self, key):
+        """
+        Node that owns a key
+        
+        Raises:
+            LookupError: If the ring is empty
+        """
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+    
+    def assignments(self, keys):
+        """Dictionary of node -> keys it owns"""
+        owned = {node: [] for node in self._nodes}
+        for key in keys:
+            owned[self.get_node(key)].append(key)
+        return owned
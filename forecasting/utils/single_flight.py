@@ -0,0 +1,118 @@
+"""
+Single-flight call coalescing for FFWS Forecasting System
+Calls with the same key share one execution: while it runs, duplicates wait
+for its result, and for `ttl` seconds afterwards they get the stored result
+without running again. Failures are shared with the waiting calls but not
+stored.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+# How the result of do() was obtained
+EXECUTED = 'executed'
+IN_FLIGHT = 'in_flight'
+RECENT = 'recent'
+
+
+class SingleFlight:
+    """Coalesces concurrent and recent calls by key"""
+    
+    def __init__(self, ttl=0, enabled=True):
+        """
+        Args:
+            ttl: Seconds a finished result is reused (0: only concurrent calls are coalesced)
+            enabled: With False every call executes
+        """
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._recent = {}
+        self._stats = {'calls': 0, 'executed': 0, 'coalesced_in_flight': 0, 'coalesced_recent': 0, 'errors': 0}
+    
+    def do(self, key, func):
+        """
+        Run func() once per key
+        
+        Args:
+            key: Hashable identity of the call
+            func: Callable without arguments
+        
+        Returns:
+            (result, how) where how is EXECUTED, IN_FLIGHT or RECENT
+        
+        Raises:
+            Whatever func() raised, in the executing and every waiting call
+        """
+        if not self.enabled:
+            return func(), EXECUTED
+        
+        now = time.monotonic()
+        with self._lock:
+            self._stats['calls'] += 1
+            self._prune(now)
+            
+            if key in self._recent:
+                self._stats['coalesced_recent'] += 1
+                return self._recent[key][1], RECENT
+            
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+                self._stats['executed'] += 1
+            else:
+                self._stats['coalesced_in_flight'] += 1
+        
+        if not is_leader:
+            return future.result(), IN_FLIGHT
+        
+        try:
+            result = func()
+        except Exception as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                self._stats['errors'] += 1
+            future.set_exception(e)
+            raise
+        
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if self.ttl > 0:
+                self._recent[key] = (time.monotonic() + self.ttl, result)
+        future.set_result(result)
+        return result, EXECUTED
+    
+    def _prune(self, now):
+        """Drop expired results (lock held)"""
+        expired = [key for key, (expires_at, _) in self._recent.items() if expires_at <= now]
+        for key in expired:
+            del self._recent[key]
+    
+    def forget(self, match=None):
+        """
+        Drop stored results so the next call executes again
+        
+        Args:
+            match: Optional callable(key) -> bool; default drops every result
+        """
+        with self._lock:
+            if match is None:
+                self._recent.clear()
+            else:
+                for key in [key for key in self._recent if match(key)]:
+                    del self._recent[key]
+    
+    def get_stats(self):
+        """Call counters, in-flight calls and stored results"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'in_flight': len(self._in_flight),
+                'recent': len(self._recent),
+                'ttl': self.ttl,
+                'enabled': self.enabled
+            })
+            return stats
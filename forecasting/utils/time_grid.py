@@ -0,0 +1,174 @@
+"""
+Time-grid alignment for multi-sensor readings
+Snaps raw readings onto a regular grid so sensors that report a few seconds
+apart share a row, instead of pivoting on the exact received_at value
+"""
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+AGGREGATIONS = ('mean', 'last', 'first', 'max', 'min', 'sum')
+
+
+class AlignedGrid:
+    """Dense float32 sensor matrix on a regular time grid with a validity mask"""
+    
+    def __init__(self, timestamps, values, mask, sensor_codes, latest_readings=None):
+        """
+        Args:
+            timestamps: datetime64[s] array with one entry per grid row
+            values: float32 array (n_rows, n_sensors), NaN where invalid
+            mask: bool array (n_rows, n_sensors), True where the value is usable
+            sensor_codes: Sensor codes in column order
+            latest_readings: Optional sensor code -> (received_at, id) of the newest
+                             reading the grid was built from
+        """
+        self.timestamps = timestamps
+        self.values = values
+        self.mask = mask
+        self.sensor_codes = list(sensor_codes)
+        self.latest_readings = latest_readings
+    
+    def _readings_of(self, sensor_codes):
+        """latest_readings restricted to some sensors"""
+        if self.latest_readings is None:
+            return None
+        return {code: self.latest_readings[code] for code in sensor_codes if code in self.latest_readings}
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def tail(self, n_rows):
+        """Return the last n_rows of the grid (views, no copy)"""
+        return AlignedGrid(
+            self.timestamps[-n_rows:], self.values[-n_rows:],
+            self.mask[-n_rows:], self.sensor_codes, self.latest_readings
+        )
+    
+    def window(self, sensor_codes, n_rows):
+        """
+        Latest n_rows of some sensors, ending at the last row where all of them are valid
+        
+        Returns views into this grid (no copy) when the sensors occupy
+        adjacent columns in the given order, as built by
+        DataFetcher.get_latest_sensor_matrix; otherwise the columns are gathered.
+        
+        Args:
+            sensor_codes: Sensor codes of the window, in model feature order
+            n_rows: Number of grid rows (n_steps_in)
+        
+        Returns:
+            AlignedGrid with at most n_rows rows (empty if no row is complete)
+        """
+        positions = [self.sensor_codes.index(code) for code in sensor_codes]
+        first = positions[0]
+        if positions == list(range(first, first + len(positions))):
+            columns = slice(first, first + len(positions))
+        else:
+            columns = positions
+        
+        complete = np.flatnonzero(self.mask[:, columns].all(axis=1))
+        end = int(complete[-1]) + 1 if len(complete) else 0
+        start = max(0, end - n_rows)
+        return AlignedGrid(
+            self.timestamps[start:end], self.values[start:end, columns],
+            self.mask[start:end, columns], sensor_codes, self._readings_of(sensor_codes)
+        )
+    
+    def complete_rows(self):
+        """Boolean array marking rows where every sensor is valid"""
+        return self.mask.all(axis=1)
+    
+    def to_dataframe(self):
+        """Convert to the DateTime + one-column-per-sensor frame used by callers"""
+        df = pd.DataFrame(self.values, columns=self.sensor_codes)
+        df.insert(0, 'DateTime', pd.to_datetime(self.timestamps))
+        return df
+
+
+def align_to_grid(sensor_codes, codes, timestamps, values, freq_seconds,
+                  aggregation='mean', max_gap=0):
+    """
+    Snap readings onto a regular time grid
+    
+    Args:
+        sensor_codes: Sensor codes that become the matrix columns, in order
+        codes: Array with the sensor code of each reading, or an integer
+               array with its position in sensor_codes
+        timestamps: datetime64 array with the timestamp of each reading
+        values: Array with the value of each reading
+        freq_seconds: Grid spacing in seconds
+        aggregation: How to combine readings in one cell (mean, last, first, max, min, sum)
+        max_gap: Number of empty grid steps that may be forward-filled per sensor
+    
+    Returns:
+        AlignedGrid covering the first to the last reading
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation: {aggregation}")
+    
+    n_sensors = len(sensor_codes)
+    codes = np.asarray(codes)
+    if np.issubdtype(codes.dtype, np.integer):
+        col = codes.astype(np.int64)
+        col[col >= n_sensors] = -1
+    else:
+        col = pd.Index(sensor_codes).get_indexer(codes.astype(object))
+    ts = np.asarray(timestamps, dtype='datetime64[s]').astype(np.int64)
+    vals = np.asarray(values, dtype=np.float64)
+    
+    keep = (col >= 0) & ~np.isnan(vals)
+    col, ts, vals = col[keep], ts[keep], vals[keep]
+    
+    if len(vals) == 0:
+        return AlignedGrid(
+            np.empty(0, dtype='datetime64[s]'),
+            np.empty((0, n_sensors), dtype=np.float32),
+            np.empty((0, n_sensors), dtype=bool),
+            sensor_codes
+        )
+    
+    # Round to the nearest grid point so 09:59:58 and 10:00:03 share a row
+    bucket = (ts + freq_seconds // 2) // freq_seconds
+    first_bucket = bucket.min()
+    n_rows = int(bucket.max() - first_bucket + 1)
+    cell = (bucket - first_bucket) * n_sensors + col
+    
+    # Group readings per cell, ordered by time inside each cell
+    order = np.lexsort((ts, cell))
+    cell, vals = cell[order], vals[order]
+    starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+    ends = np.r_[starts[1:], len(cell)]
+    
+    if aggregation == 'mean':
+        reduced = np.add.reduceat(vals, starts) / (ends - starts)
+    elif aggregation == 'sum':
+        reduced = np.add.reduceat(vals, starts)
+    elif aggregation == 'max':
+        reduced = np.maximum.reduceat(vals, starts)
+    elif aggregation == 'min':
+        reduced = np.minimum.reduceat(vals, starts)
+    elif aggregation == 'first':
+        reduced = vals[starts]
+    else:
+        reduced = vals[ends - 1]
+    
+    matrix = np.full(n_rows * n_sensors, np.nan, dtype=np.float32)
+    matrix[cell[starts]] = reduced
+    matrix = matrix.reshape(n_rows, n_sensors)
+    mask = ~np.isnan(matrix)
+    
+    if max_gap > 0:
+        # Index of the last observed row per sensor, carried forward
+        rows = np.arange(n_rows)[:, None]
+        last_seen = np.maximum.accumulate(np.where(mask, rows, -1), axis=0)
+        fillable = ~mask & (last_seen >= 0) & (rows - last_seen <= max_gap)
+        if fillable.any():
+            fill_rows, fill_cols = np.nonzero(fillable)
+            matrix[fill_rows, fill_cols] = matrix[last_seen[fill_rows, fill_cols], fill_cols]
+            mask |= fillable
+    
+    grid = (np.arange(n_rows, dtype=np.int64) + first_bucket) * freq_seconds
+    return AlignedGrid(grid.astype('datetime64[s]'), matrix, mask, sensor_codes)
@@ -0,0 +1,150 @@
+"""
+Numeric-equivalence check of the inference backends for FFWS Forecasting System
+Builds LSTM, GRU and TCN models with the training architecture, exports them
+and compares every backend's output (TFLite, ONNX, NumPy, bundle) with the Keras
+output on random windows
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+from models.inference_backends import BACKENDS, EXPORTERS, BACKEND_EXTENSIONS
+from models.bundle import write_bundle
+from models.numpy_engine import extract_layers, UnsupportedModelError
+from models.training import build_lstm_model, build_gru_model, build_tcn_model
+from utils.helpers import setup_logging
+
+# Setup logging
+setup_logging(log_level='WARNING')
+
+BUILDERS = {
+    'LSTM': build_lstm_model,
+    'GRU': build_gru_model,
+    'TCN': build_tcn_model
+}
+
+
+def print_header(title):
+    """Print a formatted header"""
+    print("\n" + "="*70)
+    print(f"  {title}")
+    print("="*70)
+
+
+def print_success(message):
+    """Print success message"""
+    print(f"✓ {message}")
+
+
+def print_warning(message):
+    """Print warning message"""
+    print(f"⚠ {message}")
+
+
+def print_error(message):
+    """Print error message"""
+    print(f"✗ {message}")
+
+
+def check_architecture(model_type, backend_names, args, work_dir):
+    """
+    Compare each backend with Keras for one architecture
+    
+    Returns:
+        List of (model_type, backend, passed or None when skipped, max abs diff)
+    """
+    print_header(f"{model_type}: {args.n_steps_in} steps in, {args.n_steps_out} out, {args.features} features")
+    
+    try:
+        architecture_config = {'activation': args.activation} if args.activation else None
+        model = BUILDERS[model_type](args.n_steps_in, args.n_steps_out, args.features, architecture_config)
+    except ImportError as e:
+        print_warning(f"Skipped, could not build {model_type}: {e}")
+        return [(model_type, name, None, None) for name in backend_names]
+    
+    rng = np.random.default_rng(args.seed)
+    windows = rng.standard_normal((args.batch, args.n_steps_in, args.features)).astype(np.float32)
+    expected = model(windows, training=False).numpy()
+    
+    # Bundles also carry scalers; identity ones keep the comparison on the model output
+    config = {
+        'model_code': model_type.lower(), 'model_type': model_type,
+        'n_steps_in': args.n_steps_in, 'n_steps_out': args.n_steps_out, 'n_features': args.features
+    }
+    identity = {'mean': np.zeros(args.features), 'scale': np.ones(args.features)}
+    
+    results = []
+    for name in backend_names:
+        path = Path(work_dir) / f"{model_type.lower()}{BACKEND_EXTENSIONS[name]}"
+        try:
+            if name == 'keras':
+                model.save(str(path))
+            elif name == 'bundle':
+                write_bundle(path, config, *extract_layers(model), {'x_scaler': identity, 'y_scaler': identity})
+            else:
+                EXPORTERS[name](model, path, args.n_steps_in, args.features)
+            backend = BACKENDS[name](path, args.n_steps_in, args.features)
+        except ImportError as e:
+            print_warning(f"{name}: skipped, runtime not installed ({e})")
+            results.append((model_type, name, None, None))
+            continue
+        except UnsupportedModelError as e:
+            print_warning(f"{name}: skipped, architecture not supported ({e})")
+            results.append((model_type, name, None, None))
+            continue
+        except Exception as e:
+            print_error(f"{name}: export/load failed: {e}")
+            results.append((model_type, name, False, None))
+            continue
+        
+        # One window at a time (the prediction path) and a full batch (input resizing)
+        single = np.concatenate([backend.predict(windows[idx:idx + 1]) for idx in range(len(windows))])
+        batched = backend.predict(windows)
+        max_diff = float(max(np.max(np.abs(single - expected)), np.max(np.abs(batched - expected))))
+        passed = bool(
+            np.allclose(single, expected, rtol=args.rtol, atol=args.atol)
+            and np.allclose(batched, expected, rtol=args.rtol, atol=args.atol)
+        )
+        
+        if passed:
+            print_success(f"{name}: max |diff| {max_diff:.2e}")
+        else:
+            print_error(f"{name}: max |diff| {max_diff:.2e} exceeds rtol={args.rtol}, atol={args.atol}")
+        results.append((model_type, name, passed, max_diff))
+    return results
+
+
+def main():
+    """Run the backend equivalence checks"""
+    parser = argparse.ArgumentParser(description='Compare inference backends against Keras')
+    parser.add_argument('--architectures', nargs='+', choices=list(BUILDERS), default=list(BUILDERS))
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--n-steps-in', type=int, default=24)
+    parser.add_argument('--n-steps-out', type=int, default=24)
+    parser.add_argument('--features', type=int, default=5)
+    parser.add_argument('--activation', default=None,
+                        help='Recurrent layer activation (default: training default, relu)')
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rtol', type=float, default=1e-4)
+    parser.add_argument('--atol', type=float, default=1e-5)
+    args = parser.parse_args()
+    
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for model_type in args.architectures:
+            results.extend(check_architecture(model_type, args.backends, args, work_dir))
+    
+    print_header("SUMMARY")
+    print(f"{'model':<8}{'backend':<10}{'result':<10}{'max |diff|':>12}")
+    for model_type, name, passed, max_diff in results:
+        status = 'skipped' if passed is None else ('pass' if passed else 'FAIL')
+        diff = '-' if max_diff is None else f"{max_diff:.2e}"
+        print(f"{model_type:<8}{name:<10}{status:<10}{diff:>12}")
+    
+    return 1 if any(passed is False for _, _, passed, _ in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -172,6 +172,7 @@ def test_trained_models():
     try:
         import os
         from config.settings import MODELS_DIR, SCALERS_DIR
+        from models.registry import get_model_registry
         
         data_fetcher = get_data_fetcher()
         models = data_fetcher.get_active_models()
@@ -183,9 +184,18 @@ def test_trained_models():
         all_trained = True
         
         for model in models:
-            model_file = MODELS_DIR / f"{model['code']}.h5"
-            x_scaler_file = SCALERS_DIR / f"{model['code']}_x_scaler.pkl"
-            y_scaler_file = SCALERS_DIR / f"{model['code']}_y_scaler.pkl"
+            version = get_model_registry().resolve(model['code'])
+            models_dir = version.directory if version else MODELS_DIR
+            scalers_dir = version.directory if version else SCALERS_DIR
+            model_file = models_dir / f"{model['code']}.h5"
+            x_scaler_file = scalers_dir / f"{model['code']}_x_scaler.npz"
+            y_scaler_file = scalers_dir / f"{model['code']}_y_scaler.npz"
+            
+            # Scalers of models trained before the switch to .npz are still pickles
+            if not x_scaler_file.exists():
+                x_scaler_file = x_scaler_file.with_suffix('.pkl')
+            if not y_scaler_file.exists():
+                y_scaler_file = y_scaler_file.with_suffix('.pkl')
             
             model_exists = model_file.exists()
             x_scaler_exists = x_scaler_file.exists()
@@ -193,6 +203,7 @@ def test_trained_models():
             
             if model_exists and x_scaler_exists and y_scaler_exists:
                 print_success(f"Model '{model['code']}' is trained:")
+                print(f"  • Version: {version.version_id if version else 'legacy (unversioned files)'}")
                 print(f"  • Model file: {model_file.name}")
                 print(f"  • X scaler: {x_scaler_file.name}")
                 print(f"  • Y scaler: {y_scaler_file.name}")
@@ -2,10 +2,15 @@
 WSGI entry point for production deployment
 """
 from app import create_app
+from services.warmup_service import get_warmup_service
 
 # Create application instance
 gunicorn_app = create_app()
 
+# With PRELOAD_MODELS, every worker loads and warms up all active models in the
+# background after importing this module; /ready answers 503 until that is done.
+# Do not combine with gunicorn --preload: the warm-up thread must start in the worker.
+get_warmup_service().start()
+
 if __name__ == "__main__":
     gunicorn_app.run()
-